@@ -0,0 +1,37 @@
+"""
+Row lookups of wide folders
+
+Times TreeItem.childNumber, which TreeModel.parent calls for every index
+the view maps, on one folder with 10k to 1M children, then an insert at
+the top followed by 1000 lookups.
+
+    python bench/child_number.py
+
+"""
+
+import time
+
+from schema import parse_args
+
+args = parse_args(__doc__, lookups=(int, 1000, "children looked up per folder"))
+
+from model.tree_item import TreeItem
+
+for count in (10000, 100000, 1000000):
+    root = TreeItem({"title": "root"})
+    folder = TreeItem({"title": "folder", "dataType": "List"}, root)
+    root.appendChild(folder)
+    for row in range(count):
+        folder.appendChild(TreeItem({"title": str(row), "dataType": "Text"}, folder))
+    sample = folder.childItems[::max(1, count // args.lookups)]
+    start = time.perf_counter()
+    for child in sample:
+        child.childNumber()
+    lookup = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter()
+    folder.insertChild(0, TreeItem({"title": "new"}, folder))
+    for child in sample:
+        child.childNumber()
+    insert = time.perf_counter() - start
+    print("{:>8} children: childNumber {:10.2f} us, insert at 0 and {} lookups {:9.1f} ms".format(
+        count, lookup * 1e6, len(sample), insert * 1e3))
@@ -0,0 +1,84 @@
+"""
+Duplicating subtrees
+
+Times the duplicate of a subtree with the "copy_of_" varIds and the new
+flag set on every copy, as the Duplicate action makes it, and reports the
+memory the copy retains under tracemalloc.
+
+    python bench/duplicate.py
+
+"""
+
+import gc
+import inspect
+import time
+import tracemalloc
+
+from schema import parse_args
+
+args = parse_args(__doc__)
+
+from PyQt5 import QtWidgets
+from model.tree_model import TreeModel
+from model.tree_item import TreeItem
+
+counter = [0]
+
+
+def leaf():
+    counter[0] += 1
+    number = counter[0]
+    return {"title": "leaf", "varId": "v{}".format(number), "dataType": "Text",
+            "sources": ["s{}".format(number)], "metadata": {"m": "x{}".format(number)}}
+
+
+def wide(depth, width):
+    if depth == 0:
+        return leaf()
+    counter[0] += 1
+    return {"title": "folder", "varId": "f{}".format(counter[0]), "dataType": "Folder",
+            "children": [wide(depth - 1, width) for _ in range(width)]}
+
+
+def deep(depth, leaves):
+    node = {"title": "folder", "varId": "d0", "dataType": "Folder", "children": [leaf() for _ in range(leaves)]}
+    for level in range(1, depth):
+        node = {"title": "folder", "varId": "d{}".format(level), "dataType": "Folder",
+                "children": [node] + [leaf() for _ in range(leaves)]}
+    return node
+
+
+def duplicate(item, parent):
+    if 'var_id_prefix' in inspect.signature(TreeItem.create_duplicate).parameters:
+        return item.create_duplicate(parent, "copy_of_")
+    # before the prefix was applied in the same pass
+    copy = item.create_duplicate(parent)
+    stack = [copy]
+    while stack:
+        node = stack.pop()
+        node.setVarId("copy_of_" + node.getVarId())
+        node.setNewAdded(True)
+        stack.extend(node.childItems)
+    return copy
+
+
+app = QtWidgets.QApplication([])
+model = TreeModel()
+for label, data in (("depth 4, width 10", wide(4, 10)), ("depth 5, width 10", wide(5, 10)),
+                    ("depth 300, 30 leaves", deep(300, 30))):
+    item = model.build_item(data)
+    item.parentItem = model.root_item
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    copy = duplicate(item, model.root_item)
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    count = 0
+    stack = [copy]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.childItems)
+    print("{:<22} {:7} items {:9.1f} ms, {:5.1f} MB retained".format(label, count, elapsed * 1e3, retained / 1e6))
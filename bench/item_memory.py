@@ -0,0 +1,84 @@
+"""
+Memory of the TreeItem graph
+
+Builds TreeItems straight from parsed json and reports what they retain
+under tracemalloc, the parsed json itself excluded. --mode stream builds
+them through JsonStreamReader from a file instead, the way the app loads
+one; what it reports includes the titles, sources and metadata read.
+
+    python bench/item_memory.py --nodes 260000
+    python bench/item_memory.py --mode stream
+
+"""
+
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from schema import parse_args, make_schema, write_schema
+
+args = parse_args(__doc__, nodes=(int, 260000, "nodes in the tree"),
+                  mode=(str, 'json', "json or stream"))
+
+from model.tree_item import TreeItem
+
+
+def build(data, parent):
+    stack = [(element, parent) for element in reversed(data)]
+    while stack:
+        element, parent = stack.pop()
+        item = TreeItem(element, parent)
+        parent.appendChild(item)
+        stack.extend((child, item) for child in reversed(element.get("children", ())))
+
+
+def build_item(data, children):
+    # children come built when the node did not fit the read buffer
+    item = TreeItem(data)
+    if children is None:
+        build(data.get("children", ()), item)
+    for child in children or ():
+        child.parentItem = item
+        item.appendChild(child)
+    return item
+
+
+def stream(path, parent):
+    from model.json_stream_reader import JsonStreamReader
+    with open(path) as f:
+        for item in JsonStreamReader(f).iter_items(build_item):
+            item.parentItem = parent
+            parent.appendChild(item)
+
+
+if args.mode == 'stream':
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    write_schema(path, args.nodes)
+else:
+    data = make_schema(args.nodes)
+gc.collect()
+tracemalloc.start()
+start = time.perf_counter()
+root = TreeItem({"title": "root"})
+if args.mode == 'stream':
+    try:
+        stream(path, root)
+    finally:
+        os.remove(path)
+else:
+    build(data, root)
+elapsed = time.perf_counter() - start
+gc.collect()
+retained = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+count = 0
+stack = [root]
+while stack:
+    item = stack.pop()
+    count += 1
+    stack.extend(item.childItems)
+print("{} items: {:.1f} MiB retained, {:.0f} B per item, built in {:.2f} s".format(
+    count, retained / 2 ** 20, retained / count, elapsed))
@@ -0,0 +1,93 @@
+"""
+Loading a schema file
+
+--mode json and --mode stream build the tree of a generated file without a
+view, through json.load and through JsonStreamReader, and report the time
+and the memory of the process; run one mode per process. --mode app loads
+the file through the controller with the window shown and reports the
+longest stall of the event loop.
+
+    python bench/load.py --mode json
+    python bench/load.py --mode stream
+    python bench/load.py --mode app
+
+"""
+
+import importlib
+import json
+import os
+import resource
+import tempfile
+import time
+
+from schema import parse_args, write_schema
+
+args = parse_args(__doc__, nodes=(int, 260000, "nodes in the file"),
+                  mode=(str, 'stream', "json, stream or app"))
+
+from PyQt5 import QtCore, QtWidgets
+
+
+def rss_mib():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def build(path):
+    from model.tree_model import TreeModel
+    model = TreeModel()
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if args.mode == 'json':
+        with open(path) as f:
+            data = json.load(f)
+        model.load_data(data)
+        del data
+    else:
+        from model.json_stream_reader import JsonStreamReader
+        with open(path) as f:
+            items = JsonStreamReader(f).iter_items(model.build_item)
+            model.append_items([item for item in items if item is not None])
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("{}: {:.2f} s, peak RSS +{:.0f} MiB, RSS after the load {:.0f} MiB".format(
+        args.mode, elapsed, (peak - base) / 1024, rss_mib()))
+
+
+def load_in_app(path):
+    from model import json_file_manager
+    # the file dialog is skipped
+    json_file_manager.JsonFileManager.select_file = lambda manager: setattr(manager, 'file_path', path)
+    start = time.perf_counter()
+    controller = importlib.import_module('сontroller.main_controller').MainController()
+    controller.main_view.show()
+    app = controller._app
+    ticks = {'last': time.perf_counter(), 'longest': 0.0}
+
+    def tick():
+        now = time.perf_counter()
+        ticks['longest'] = max(ticks['longest'], now - ticks['last'])
+        ticks['last'] = now
+        if controller.loader is None:
+            app.quit()
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(tick)
+    timer.start(0)
+    app.exec_()
+    print("app: loaded in {:.1f} s, longest event loop stall {:.2f} s".format(
+        time.perf_counter() - start, ticks['longest']))
+
+
+fd, path = tempfile.mkstemp(suffix='.json')
+os.close(fd)
+try:
+    write_schema(path, args.nodes)
+    if args.mode == 'app':
+        load_in_app(path)
+    else:
+        # the models need one, kept until the end of the script
+        app = QtWidgets.QApplication([])
+        build(path)
+finally:
+    os.remove(path)
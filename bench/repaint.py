@@ -0,0 +1,71 @@
+"""
+Repainting the tree and the side tables
+
+Pages through the expanded sample tree repeated 400 times, with some
+items marked new or changed, and through a table of 2000 sources and one
+of 2000 metadata rows. Every page is scrolled to and repainted
+synchronously; the best of three runs is reported, in ms per page.
+
+    python bench/repaint.py
+
+"""
+
+import json
+import random
+import time
+
+from schema import parse_args, SAMPLE
+
+args = parse_args(__doc__, copies=(int, 400, "copies of sample.json in the tree"),
+                  rows=(int, 2000, "rows of the tables"))
+
+from PyQt5 import QtWidgets
+from view.tree_view import TreeView
+from model.source_table_model import SourceTableModel
+from model.metadata_table_model import MetadataTableModel
+
+
+def ms_per_page(view, pages):
+    scroll_bar = view.verticalScrollBar()
+    start = time.perf_counter()
+    for page in range(pages):
+        scroll_bar.setValue(page * scroll_bar.pageStep())
+        view.viewport().repaint()
+    return (time.perf_counter() - start) / pages * 1e3
+
+
+def report(label, view, pages):
+    ms_per_page(view, 5)
+    print("{}: {:.2f} ms per page".format(label, min(ms_per_page(view, pages) for _ in range(3))))
+
+
+app = QtWidgets.QApplication([])
+with open(SAMPLE) as f:
+    data = json.load(f) * args.copies
+tree_view = TreeView(False)
+tree_view.load_data(data)
+random.seed(1)
+stack = list(tree_view.tree_model.root_item.childItems)
+while stack:
+    item = stack.pop()
+    stack.extend(item.childItems)
+    draw = random.random()
+    if draw < 0.05:
+        item.newAdded = True
+    elif draw < 0.15:
+        item.valueChanged = True
+tree_view.resize(900, 1000)
+tree_view.show()
+tree_view.expandAll()
+app.processEvents()
+report("tree", tree_view, 100)
+
+table = QtWidgets.QTableView()
+table.resize(500, 1000)
+table.show()
+table.setModel(SourceTableModel(['s{}'.format(row) for row in range(args.rows)]))
+app.processEvents()
+report("source table", table, 50)
+table.setModel(MetadataTableModel({'k{}'.format(row): 'v{}'.format(row) for row in range(args.rows)}))
+app.processEvents()
+report("metadata table", table, 50)
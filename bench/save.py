@@ -0,0 +1,63 @@
+"""
+Saving the tree
+
+Times a save to disk through JsonFileManager.save_tree: the first one, which
+fills the fragment cache, one without changes, and one after each kind of
+single edit. Re-saves copy the unchanged bytes from the last file, so the
+bench also times a bare copy of the file with fsync and replace, the part of
+a save that does not depend on the writer.
+
+    python bench/save.py --nodes 1000000
+
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+from schema import parse_args, make_schema
+
+args = parse_args(__doc__, nodes=(int, 1000000, "nodes in the tree"))
+
+from PyQt5 import QtCore, QtWidgets
+from model.tree_model import TreeModel
+from model.json_file_manager import JsonFileManager
+
+app = QtWidgets.QApplication([])
+model = TreeModel()
+model.load_data(make_schema(args.nodes))
+manager = JsonFileManager()
+fd, manager.file_path = tempfile.mkstemp(suffix='.json')
+os.close(fd)
+root = QtCore.QModelIndex()
+
+
+def timed(label, edit=None):
+    if edit is not None:
+        edit()
+    start = time.perf_counter()
+    manager.save_tree(model.root_item)
+    print("{:<24} {:9.1f} ms".format(label, (time.perf_counter() - start) * 1e3))
+
+
+deep = model.root_item.child(model.rowCount(root) // 2).child(0)
+try:
+    print("{} nodes".format(args.nodes))
+    timed("first save")
+    timed("no changes")
+    timed("one metadata edit", lambda: model.set_metadata(deep, {"k": "v"}))
+    timed("one rename", lambda: model.setData(model.index(5, 0, root), "renamed"))
+    timed("one row removed", lambda: model.removeRow(7, root))
+    timed("one row inserted", lambda: model.insert_item(3, deep.create_duplicate(model.root_item, "copy_"), root))
+    start = time.perf_counter()
+    shutil.copyfile(manager.file_path, manager.file_path + '.copy')
+    with open(manager.file_path + '.copy', 'rb') as copy:
+        os.fsync(copy.fileno())
+    os.replace(manager.file_path + '.copy', manager.file_path)
+    print("{:<24} {:9.1f} ms".format("copy, fsync, replace", (time.perf_counter() - start) * 1e3))
+    blocks = [len(part[0]) for part in model.root_item.fragment[1] if type(part) is tuple]
+    if blocks:
+        print("top-level blocks {}, children per block: max {}, first {}".format(len(blocks), max(blocks), blocks[:8]))
+finally:
+    os.remove(manager.file_path)
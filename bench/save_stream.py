@@ -0,0 +1,67 @@
+"""
+Writing the tree to disk
+
+--mode tree saves through JsonFileManager.save_tree, --mode dump through
+json.dump of create_new_item(), the way saves were written before. Reports
+the time of one save, or with --trace the peak of the memory it allocates
+under tracemalloc, the tree itself excluded.
+
+    python bench/save_stream.py --mode dump
+    python bench/save_stream.py --mode tree --indent 2 --trace 1
+
+"""
+
+import inspect
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from schema import parse_args, make_schema
+
+args = parse_args(__doc__, nodes=(int, 260000, "nodes in the tree"),
+                  mode=(str, 'tree', "tree or dump"),
+                  indent=(int, None, "indent of the output"),
+                  trace=(int, 0, "1 to report the peak of the allocations instead of the time"))
+
+from PyQt5 import QtWidgets
+from model.tree_model import TreeModel
+from model.json_file_manager import JsonFileManager
+
+
+def save_tree(manager, root):
+    if 'items' in inspect.signature(manager.save_tree).parameters:
+        # before save_tree took the root item
+        return manager.save_tree(root.childItems)
+    return manager.save_tree(root)
+
+
+app = QtWidgets.QApplication([])
+model = TreeModel()
+model.load_data(make_schema(args.nodes))
+fd, path = tempfile.mkstemp(suffix='.json')
+os.close(fd)
+try:
+    if args.trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if args.mode == 'dump':
+        with open(path, 'w') as f:
+            json.dump([child.create_new_item() for child in model.root_item.childItems], f, indent=args.indent)
+    else:
+        manager = JsonFileManager()
+        manager.file_path = path
+        manager.indent = args.indent
+        save_tree(manager, model.root_item)
+    elapsed = time.perf_counter() - start
+    written = os.path.getsize(path) / 1e6
+    if args.trace:
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("{}, indent {}: peak {:.1f} MiB, {:.1f} MiB retained, {:.0f} MB written".format(
+            args.mode, args.indent, peak / 2 ** 20, retained / 2 ** 20, written))
+    else:
+        print("{}, indent {}: {:.2f} s, {:.0f} MB written".format(args.mode, args.indent, elapsed, written))
+finally:
+    os.remove(path)
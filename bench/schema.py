@@ -0,0 +1,66 @@
+"""
+Synthetic schemas for the benchmarks
+
+sample.json repeated until the tree holds about the number of nodes asked
+for. Every copy gets its own varIds, titles get one of 997 suffixes so they
+repeat the way they do in real schemas.
+
+Each benchmark imports the checkout it is run from; --tree points it at
+another one, e.g. a worktree of an older commit, for the before numbers.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(REPO, 'sample.json')
+
+
+def parse_args(description, **arguments):
+    """
+    Parses --tree and the arguments given as name=(type, default, help),
+    and puts the checkout on sys.path.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--tree', default=REPO, help="checkout to benchmark (default: this one)")
+    for name, (kind, default, help) in arguments.items():
+        parser.add_argument('--' + name, type=kind, default=default, help=help)
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.abspath(args.tree))
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return args
+
+
+def count_nodes(elements):
+    count = 0
+    stack = list(elements)
+    while stack:
+        element = stack.pop()
+        count += 1
+        stack.extend(element.get('children', ()))
+    return count
+
+
+def make_schema(nodes):
+    with open(SAMPLE) as f:
+        sample = json.load(f)
+    copies = max(1, nodes // count_nodes(sample))
+    return [_copy(element, copy) for copy in range(copies) for element in sample]
+
+
+def write_schema(path, nodes, ensure_ascii=True):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(make_schema(nodes), f, ensure_ascii=ensure_ascii)
+
+
+def _copy(element, copy, row=0):
+    element = dict(element)
+    element['title'] = '{}_{}'.format(element['title'], (copy * 7 + row) % 997)
+    if element.get('varId') is not None:
+        element['varId'] = '{}_{}'.format(element['varId'], copy)
+    if 'children' in element:
+        element['children'] = [_copy(child, copy, index) for index, child in enumerate(element['children'])]
+    return element
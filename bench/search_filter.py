@@ -0,0 +1,61 @@
+"""
+Search filter apply and clear
+
+Times a search from the request to the filtered rows painted, then the
+clear back to the whole tree, on a shown TreeView.
+
+    python bench/search_filter.py --nodes 100000
+    python bench/search_filter.py --nodes 1000000
+
+"""
+
+import time
+
+from schema import parse_args, make_schema
+
+args = parse_args(__doc__, nodes=(int, 100000, "nodes in the tree"))
+
+from PyQt5 import QtWidgets
+from view.tree_view import TreeView
+
+QUERIES = ['some_text_9', 'some_text_99', 'list_1', 'zzz_no_match']
+
+app = QtWidgets.QApplication([])
+view = TreeView()
+view.resize(400, 800)
+view.show()
+view.load_data(make_schema(args.nodes))
+app.processEvents()
+finished = set()
+view._search_worker.finished.connect(lambda seq, *result: finished.add(seq))
+
+
+def paint():
+    app.processEvents()
+    view.viewport().repaint()
+
+
+def search(text):
+    view._start_search(text)
+    # a stale result starts the search again under a new seq
+    while view._search_seq not in finished:
+        app.processEvents()
+    paint()
+
+
+def clear():
+    view._start_search('')
+    paint()
+
+
+def timed(label, function):
+    start = time.perf_counter()
+    function()
+    print("{:<24} {:9.1f} ms".format(label, (time.perf_counter() - start) * 1e3))
+
+
+print("{} nodes".format(args.nodes))
+for text in QUERIES:
+    timed("search " + text, lambda: search(text))
+    timed("clear", clear)
+view.stop_search()
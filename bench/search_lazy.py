@@ -0,0 +1,87 @@
+"""
+Searching and duplicating in a lazily loaded tree
+
+Times searches from the request to the filtered rows painted, then
+duplicating a top-level folder that holds a quarter of the nodes as raw
+json, twice: the first duplicate also counts the raw varIds. Next to each,
+the longest stretch the GUI thread spent without handling events.
+
+    python bench/search_lazy.py --nodes 260000
+
+"""
+
+import time
+
+from schema import parse_args, make_schema
+
+args = parse_args(__doc__, nodes=(int, 260000, "nodes in the tree"))
+
+from PyQt5 import QtCore, QtWidgets
+from view.tree_view import TreeView
+
+QUERIES = ['some_text', 'some_text_99', 'varId:*_7 list', 'zzz_no_match']
+
+app = QtWidgets.QApplication([])
+view = TreeView(True)
+view.resize(400, 800)
+view.show()
+view.load_data(make_schema(args.nodes))
+app.processEvents()
+finished = set()
+# checkouts from before the search worker search on the GUI thread
+worker = getattr(view, '_search_worker', None)
+if worker is not None:
+    worker.finished.connect(lambda seq, *result: finished.add(seq))
+ticks = [0.0, 0.0]
+
+
+def tick():
+    now = time.perf_counter()
+    ticks[0] = max(ticks[0], now - ticks[1])
+    ticks[1] = now
+
+
+timer = QtCore.QTimer()
+timer.timeout.connect(tick)
+timer.start(5)
+
+
+def timed(label, function):
+    app.processEvents()
+    ticks[0], ticks[1] = 0.0, time.perf_counter()
+    start = time.perf_counter()
+    function()
+    app.processEvents()
+    view.viewport().repaint()
+    tick()
+    print("{:<28} {:9.1f} ms, GUI thread blocked for {:7.1f} ms at most".format(
+        label, (time.perf_counter() - start) * 1e3, ticks[0] * 1e3))
+
+
+def search(text):
+    view._start_search(text)
+    # a stale result starts the search again under a new seq
+    while worker is not None and view._search_seq not in finished:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def duplicate(item):
+    view.index_selected = view.tree_model.index_of(item)
+    view._curItem = item
+    view._clone_slot()
+
+
+for text in QUERIES:
+    timed("search " + text, lambda: search(text))
+    timed("clear", lambda: view._start_search(''))
+model = view.tree_model
+view.append_items([model.build_item({"title": "folder", "dataType": "Folder",
+                                     "children": make_schema(args.nodes // 4)})])
+folder = model.root_item.childItems[-1]
+timed("duplicate a folder", lambda: duplicate(folder))
+timed("duplicate it again", lambda: duplicate(folder))
+if worker is not None:
+    view.stop_search()
+if hasattr(view, 'stop_validation'):
+    view.stop_validation()
@@ -0,0 +1,88 @@
+"""
+Selecting items with large side panels
+
+Loads a folder of items with 20 or 3000 metadata keys and none or 40
+sources through the controller with the window shown, then selects 60 of
+them in turn and times each selection up to the repaint of the panels,
+then MainController.tree_selection_changed alone.
+
+    python bench/side_panel.py
+
+"""
+
+import importlib
+import json
+import os
+import tempfile
+import time
+
+from schema import parse_args
+
+args = parse_args(__doc__, items=(int, 300, "items in the folder"),
+                  selections=(int, 60, "items selected in turn"))
+
+from PyQt5 import QtCore
+
+
+def make_items(count):
+    children = []
+    for row in range(count):
+        children.append({
+            "title": "t{}".format(row), "varId": "v{}".format(row),
+            "dataType": "Folder" if row % 3 == 0 else "Text",
+            "sources": [] if row % 3 == 0 else ["src_{}_{}".format(row, k) for k in range(40)],
+            "metadata": {"key_{}".format(k): "value {} {}".format(row, k) for k in range(20 if row % 2 == 0 else 3000)}})
+    return [{"title": "folder", "varId": "folder", "dataType": "Folder", "children": children}]
+
+
+def report(label, times):
+    times = sorted(times)
+    print("{}: mean {:.2f} ms, median {:.2f} ms, p95 {:.2f} ms".format(
+        label, sum(times) / len(times) * 1e3, times[len(times) // 2] * 1e3, times[int(len(times) * .95)] * 1e3))
+
+
+def run(controller):
+    if controller.loader is not None:
+        QtCore.QTimer.singleShot(50, lambda: run(controller))
+        return
+    app = controller._app
+    tree_view = controller.main_view.tree_view
+    model = tree_view.tree_model
+    folder = model.index(0, 0)
+    # before the view showed the tree model directly outside of searches
+    if hasattr(tree_view, 'view_index'):
+        tree_view.expand(tree_view.view_index(folder))
+    else:
+        tree_view.expand(tree_view.filter_model.mapFromSource(folder))
+    items = [model.get_item(model.index(row, 0, folder)) for row in range(args.selections)]
+    # the first round warms up the panels
+    for label in ("select and repaint, first round", "select and repaint"):
+        times = []
+        for item in items:
+            start = time.perf_counter()
+            tree_view.select_item(item)
+            app.processEvents()
+            times.append(time.perf_counter() - start)
+        report(label, times)
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        controller.tree_selection_changed(item)
+        times.append(time.perf_counter() - start)
+    report("tree_selection_changed", times)
+    app.quit()
+
+
+fd, path = tempfile.mkstemp(suffix='.json')
+with os.fdopen(fd, 'w') as f:
+    json.dump(make_items(args.items), f)
+try:
+    from model import json_file_manager
+    # the file dialog is skipped
+    json_file_manager.JsonFileManager.select_file = lambda manager: setattr(manager, 'file_path', path)
+    controller = importlib.import_module('сontroller.main_controller').MainController()
+    QtCore.QTimer.singleShot(50, lambda: run(controller))
+    controller.main_view.show()
+    controller._app.exec_()
+finally:
+    os.remove(path)
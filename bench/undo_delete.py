@@ -0,0 +1,89 @@
+"""
+Undoing a large delete
+
+Deletes a folder holding about --subtree nodes from a shown TreeView, then
+undoes and redoes the delete, each up to the repaint that follows. Next to
+the total, the time spent in the upkeep of the search index (varIds and
+the journal) and of the validator; most of the rest is the layout of the
+view. With --inside 1 the folder sits in an open top-level folder.
+
+    python bench/undo_delete.py --nodes 1000000 --subtree 52000
+    python bench/undo_delete.py --nodes 1000000 --subtree 500 --inside 1
+
+"""
+
+import time
+
+from schema import parse_args, make_schema, count_nodes
+
+args = parse_args(__doc__, nodes=(int, 1000000, "nodes in the tree"),
+                  subtree=(int, 52000, "nodes in the deleted folder"),
+                  inside=(int, 0, "1 to put the folder in an open folder"))
+
+from PyQt5 import QtCore, QtWidgets
+from view.tree_view import TreeView
+
+data = make_schema(args.nodes)
+# the first top-level elements go into one folder of the size asked for
+count = 0
+for size, element in enumerate(data):
+    if count >= args.subtree - 1:
+        break
+    count += count_nodes([element])
+data[:size] = [{"title": "folder", "varId": "folder", "children": data[:size]}]
+if args.inside:
+    data[:2] = [{"title": "outer", "varId": "outer", "children": data[:2]}]
+
+app = QtWidgets.QApplication([])
+view = TreeView()
+view.resize(400, 800)
+view.show()
+view.load_data(data)
+app.processEvents()
+model = view.tree_model
+parent = model.index(0, 0, QtCore.QModelIndex()) if args.inside else QtCore.QModelIndex()
+view.expand(parent)
+# the search worker indexes the load in the background and a full check
+# turns on the validator for the edits, both done before timing
+model.search_index.replay()
+view.validate()
+while model.validator.running():
+    app.processEvents()
+spent = {}
+
+
+def measured(label, function):
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            spent[label] = spent.get(label, 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+search_index, validator = model.search_index, model.validator
+for name in ('add_subtree', 'attach', 'detach'):
+    setattr(search_index, name, measured("search index", getattr(search_index, name)))
+validator.inserted = measured("validator", validator.inserted)
+validator.removed = measured("validator", validator.removed)
+
+
+def timed(label, action):
+    spent.clear()
+    start = time.perf_counter()
+    action()
+    app.processEvents()
+    view.viewport().repaint()
+    parts = ", ".join("{} {:.1f} ms".format(name, seconds * 1e3) for name, seconds in sorted(spent.items()))
+    print("{:<10} {:9.1f} ms   {}".format(label, (time.perf_counter() - start) * 1e3, parts))
+
+
+folder = data[0]["children"][0] if args.inside else data[0]
+print("{} nodes, deleting a folder of {}".format(count_nodes(data), count_nodes([folder])))
+timed("delete", lambda: model.removeRow(0, parent))
+for _ in range(3):
+    timed("undo", model.undo_stack.undo)
+    timed("redo", model.undo_stack.redo)
+view.stop_search()
+view.stop_validation()
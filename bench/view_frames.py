@@ -0,0 +1,139 @@
+"""
+Frame times of the tree view on a large tree
+
+Loads a generated tree of about 1M nodes into the view and times
+scrolling, expanding, collapsing, selecting and searching, each up to the
+repaint that follows. The time is given next to a budget: one frame for
+scrolling, longer for the actions that change the whole tree, and next to
+the longest the GUI thread went without handling events meanwhile.
+Expand all opens the folders a slice per event, it runs for 10 s at most
+and its budget is for the longest stall. Pass --lazy 1 for a lazily
+loaded model.
+
+    python bench/view_frames.py
+    python bench/view_frames.py --lazy 1
+
+"""
+
+import gc
+import random
+import time
+
+from schema import parse_args, make_schema, count_nodes
+
+args = parse_args(__doc__, nodes=(int, 1000000, "nodes in the tree"),
+                  lazy=(int, 0, "1 for a lazily loaded model"))
+
+from PyQt5 import QtCore, QtWidgets
+from view.tree_view import TreeView
+
+app = QtWidgets.QApplication([])
+data = make_schema(args.nodes)
+view = TreeView(bool(args.lazy))
+view.resize(1000, 800)
+view.show()
+app.processEvents()
+model = view.tree_model
+scroll_bar = view.verticalScrollBar()
+
+
+def view_index(index):
+    # before the view showed the tree model directly outside of searches
+    if hasattr(view, 'view_index'):
+        return view.view_index(index)
+    return view.filter_model.mapFromSource(index)
+
+
+ticks = [0.0, 0.0]
+
+
+def tick():
+    now = time.perf_counter()
+    ticks[0] = max(ticks[0], now - ticks[1])
+    ticks[1] = now
+
+
+timer = QtCore.QTimer()
+timer.timeout.connect(tick)
+timer.start(5)
+
+
+def report(label, ms, budget, blocked=None, judged=None):
+    judged = ms if judged is None else judged
+    print("{:<34} {:8.1f} ms   budget {:5} ms  {:4}{}".format(
+        label, ms, budget, "ok" if judged <= budget else "OVER",
+        "" if blocked is None else "  GUI blocked {:8.1f} ms at most".format(blocked)))
+
+
+def timed(label, action, budget, stall=False):
+    # stall: the action goes on a slice per event, the budget is for the
+    # longest the GUI thread was blocked instead of the whole time
+    app.processEvents()
+    ticks[0], ticks[1] = 0.0, time.perf_counter()
+    start = time.perf_counter()
+    action()
+    app.processEvents()
+    view.viewport().repaint()
+    tick()
+    report(label, (time.perf_counter() - start) * 1e3, budget, ticks[0] * 1e3, ticks[0] * 1e3 if stall else None)
+
+
+def worst_scroll(label, pages=50):
+    worst = 0
+    for _ in range(pages):
+        start = time.perf_counter()
+        scroll_bar.setValue(random.randint(0, scroll_bar.maximum()))
+        view.viewport().repaint()
+        worst = max(worst, time.perf_counter() - start)
+    report(label, worst * 1e3, 16)
+
+
+def search(text):
+    done = []
+    view._search_worker.finished.connect(lambda *result: done.append(True))
+    view._start_search(text)
+    start = time.time()
+    while not done and time.time() - start < 60:
+        app.processEvents()
+    app.processEvents()
+    expanding(60)
+
+
+def expanding(seconds):
+    # the folders left to open are opened a slice per event
+    start = time.time()
+    while getattr(view, '_to_expand', None) and time.time() - start < seconds:
+        app.processEvents()
+
+
+def expand_all():
+    view.expandAll()
+    expanding(10)
+    if getattr(view, '_to_expand', None):
+        print("expand all still opening folders after 10 s, {} open".format(len(view._expanded_items)))
+
+
+start = time.perf_counter()
+view.load_data(data)
+app.processEvents()
+print("{} mode, {} nodes, loaded in {:.1f} s".format(
+    "lazy" if args.lazy else "eager", count_nodes(data), time.perf_counter() - start))
+del data
+gc.collect()
+random.seed(1)
+worst_scroll("scroll frame, collapsed (worst)")
+timed("expand all, 10 s at most", expand_all, 100, stall=True)
+worst_scroll("scroll frame, expanded (worst)")
+items = model.root_item.childItems
+deep = items[len(items) * 3 // 4]
+while deep.childItems:
+    deep = deep.childItems[-1]
+timed("select a deep row", lambda: view.setCurrentIndex(view_index(model.index_of(deep))), 50)
+timed("collapse all", view.collapseAll, 100)
+timed("expand one folder", lambda: view.expand(view_index(model.index_of(items[100]))), 16)
+timed("search 'some_text' and expand", lambda: search('some_text'), 3000)
+worst_scroll("scroll frame, filtered (worst)")
+timed("clear search", lambda: view._start_search(''), 500)
+model.setData(model.index_of(deep), "needle_unique")
+timed("search one match and expand", lambda: search('needle_unique'), 1500)
+timed("clear search", lambda: view._start_search(''), 500)
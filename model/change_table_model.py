@@ -0,0 +1,41 @@
+from PyQt5 import QtCore
+import json
+import traceback
+
+
+class ChangeTableModel(QtCore.QAbstractTableModel):
+    headers = ("Change", "Path", "Variable ID", "Old", "New")
+
+    def __init__(self, changes=None, parent=None):
+        super().__init__(parent)
+        self.changes = changes if changes is not None else []
+
+    """
+       The methods below are overridden methods of the base abstract class QAbstractItemModel
+    """
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.changes)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        try:
+            if not index.isValid() or role != QtCore.Qt.DisplayRole:
+                return None
+            change = self.changes[index.row()]
+            value = (change.kind, change.path, change.varId, change.old, change.new)[index.column()]
+            if value is None or isinstance(value, str):
+                return value
+            return json.dumps(value)
+        except Exception as e:
+            print("data failed: {}".format(e))
+            print(traceback.format_exc())
@@ -0,0 +1,71 @@
+"""
+Background schema comparison
+
+The worker reads a schema file as raw json and hashes it and the tree in
+its own thread. Nothing is written to the items: the digests of the items
+it hashed go back to the GUI thread, which keeps them unless the tree was
+edited meanwhile.
+
+"""
+
+import io
+import traceback
+
+from PyQt5 import QtCore
+from model.json_stream_reader import JsonStreamReader
+from model.tree_diff import collector_paused
+from model.tree_hash import compare_schema
+
+
+class CompareWorker(QtCore.QObject):
+    # branches (None when the path is on neither side), digests of the
+    # items hashed, edits of the model the comparison started from
+    finished = QtCore.pyqtSignal(object, object, int)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, file_path, tree_model, path=''):
+        super().__init__()
+        self.file_path = file_path
+        self.tree_model = tree_model
+        self.path = path
+        # read on the GUI thread, the result is stale once it moved on
+        self.edits = tree_model.edits
+
+    def run(self):
+        # raw json holds no cycles, and collections walking the millions of
+        # objects of a large file would stall the GUI thread for seconds;
+        # the pause ends only once the nodes are gone
+        try:
+            with collector_paused():
+                # the file stays raw json, nothing is built; the children
+                # are streamed so that no single decode holds the GIL for long
+                with io.TextIOWrapper(open(self.file_path, 'rb')) as f:
+                    nodes = [data for data in JsonStreamReader(f).iter_items(self._raw_node) if len(data)]
+                digests = {}
+                branches = compare_schema(self.tree_model.root_item, nodes, self.path, digests,
+                                          self.tree_model.rows_lock)
+                self._release(nodes)
+        except ValueError as e:
+            self.failed.emit("{} is not a valid schema file: {}".format(self.file_path, e))
+            return
+        except Exception as e:
+            print("CompareWorker failed: {}".format(e))
+            print(traceback.format_exc())
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(branches, digests, self.edits)
+
+    @staticmethod
+    def _release(nodes):
+        # freed in one go, the nodes of a large file would hold the GIL for
+        # seconds; one at a time the GUI thread gets its turns
+        while nodes:
+            children = nodes.pop().get("children")
+            if children:
+                nodes.extend(children)
+
+    @staticmethod
+    def _raw_node(data, children):
+        if children is not None:
+            data["children"] = children
+        return data
@@ -0,0 +1,67 @@
+"""
+Icons and brushes of the models
+
+qtawesome builds a new icon on every call and its icons draw the font glyph
+on every paint, while the views ask for the decoration of each visible cell
+on every repaint. The icons of every type and state are rendered once, the
+first time a model is created, into pixmaps that Qt draws as they are; the
+same QIcon and QBrush objects are handed out from then on.
+
+"""
+
+import qtawesome as qta
+from PyQt5 import QtCore, QtGui, QtWidgets
+from model.type_manager import TypeManager
+
+# states of a tree item, as shown in its colors
+PLAIN = None
+CHANGED = 'changed'
+NEW = 'new'
+STATE_COLORS = {PLAIN: 'black', CHANGED: 'blue', NEW: 'green'}
+
+
+class IconCache(object):
+    # (dataType, state) -> QIcon
+    type_icons = {}
+    # state -> QBrush of the title, none for PLAIN
+    brushes = {}
+    add_icon = None
+    remove_icon = None
+
+    @staticmethod
+    def warm():
+        # needs the QApplication, so it runs when the first model is created
+        if IconCache.add_icon is not None:
+            return
+        for data_type, name in TypeManager.type_icon_dictionary.items():
+            for state, color in STATE_COLORS.items():
+                IconCache.type_icons[(data_type, state)] = IconCache.render(name, color=color)
+        IconCache.brushes = {CHANGED: QtGui.QBrush(QtCore.Qt.blue), NEW: QtGui.QBrush(QtCore.Qt.darkGreen)}
+        IconCache.add_icon = IconCache.render('fa5s.plus-circle')
+        IconCache.remove_icon = IconCache.render('fa5s.minus-circle')
+
+    @staticmethod
+    def render(name, **options):
+        # the views draw small icons, a pixmap per device pixel ratio; other
+        # sizes are scaled from the nearest one. Every mode is rendered, Qt
+        # would tint the selected one otherwise
+        font_icon = qta.icon(name, options=[options])
+        size = QtWidgets.QApplication.style().pixelMetric(QtWidgets.QStyle.PM_SmallIconSize)
+        icon = QtGui.QIcon()
+        for extent in (size, size * 2):
+            for mode in (QtGui.QIcon.Normal, QtGui.QIcon.Disabled, QtGui.QIcon.Active, QtGui.QIcon.Selected):
+                icon.addPixmap(font_icon.pixmap(QtCore.QSize(extent, extent), mode), mode)
+        return icon
+
+    @staticmethod
+    def state(item):
+        if item.newAdded:
+            return NEW
+        if item.valueChanged:
+            return CHANGED
+        return PLAIN
+
+    @staticmethod
+    def type_icon(data_type, state=PLAIN):
+        # None for a dataType without an icon
+        return IconCache.type_icons.get((data_type, state))
@@ -0,0 +1,133 @@
+from PyQt5 import QtCore
+from model.tree_validation import KINDS
+import traceback
+
+
+class IssueTableModel(QtCore.QAbstractTableModel):
+    headers = ("Problem", "Path", "Variable ID", "Details")
+    # edits changing more rows than this rebuild the list at once
+    rebuild_size = 256
+
+    def __init__(self, validator, parent=None):
+        super().__init__(parent)
+        self.validator = validator
+        self.issues = []
+        # rows per kind, the rows are grouped by kind in the order of KINDS
+        self.counts = dict.fromkeys(KINDS, 0)
+        # while no view shows the rows, the edits are not followed and the
+        # rows are rebuilt once shown again
+        self.following = True
+        self.stale = False
+        self.update()
+        validator.issuesReset.connect(self.reset)
+        validator.issuesUpdated.connect(self.apply)
+
+    def update(self):
+        # grouped by kind, paths are only worked out for the rows shown
+        self.beginResetModel()
+        self.issues = []
+        self.counts = dict.fromkeys(KINDS, 0)
+        groups = {kind: [] for kind in KINDS}
+        for issue in self.validator.issues.values():
+            groups[issue.kind].append(issue)
+        for kind in KINDS:
+            self.issues.extend(groups[kind])
+            self.counts[kind] = len(groups[kind])
+        self.stale = False
+        self.endResetModel()
+
+    def follow(self, following):
+        self.following = following
+        if following and self.stale:
+            self.update()
+
+    def reset(self):
+        if self.following:
+            self.update()
+        else:
+            self.stale = True
+
+    def apply(self, removed, added):
+        # one edit: removed rows are taken out and new ones go at the end of
+        # their kind, an issue replaced by one with the same key keeps its row
+        if not self.following or self.stale:
+            self.stale = True
+            return
+        if len(removed) + len(added) > self.rebuild_size:
+            self.update()
+            return
+        replacements = {issue.key(): issue for issue in added}
+        for issue in removed:
+            row = self._row(issue)
+            if row is None:
+                continue
+            replacement = replacements.pop(issue.key(), None)
+            if replacement is not None:
+                self.issues[row] = replacement
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.headers) - 1))
+                continue
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self.issues[row]
+            self.counts[issue.kind] -= 1
+            self.endRemoveRows()
+        for issue in replacements.values():
+            if self.validator.issues.get(issue.key()) is not issue:
+                # added and removed again in the same edit
+                continue
+            row = self._end(issue.kind)
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.issues.insert(row, issue)
+            self.counts[issue.kind] += 1
+            self.endInsertRows()
+
+    def _end(self, kind):
+        # the row after the last issue of kind
+        end = 0
+        for other in KINDS:
+            end += self.counts[other]
+            if other == kind:
+                return end
+
+    def _row(self, issue):
+        end = self._end(issue.kind)
+        try:
+            return self.issues.index(issue, end - self.counts[issue.kind], end)
+        except ValueError:
+            return None
+
+    def issue(self, row):
+        return self.issues[row]
+
+    """
+       The methods below are overridden methods of the base abstract class QAbstractItemModel
+    """
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.issues)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        try:
+            if not index.isValid() or role != QtCore.Qt.DisplayRole:
+                return None
+            issue = self.issues[index.row()]
+            column = index.column()
+            if column == 0:
+                return issue.kind
+            if column == 1:
+                return issue.path()
+            if column == 2:
+                return issue.var_id()
+            return issue.message()
+        except Exception as e:
+            print("data failed: {}".format(e))
+            print(traceback.format_exc())
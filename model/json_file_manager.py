@@ -1,40 +1,115 @@
 """
 JSON I/O
 
+Saves go to a temporary file next to the target which is fsynced and then
+renamed over it, so a failed or interrupted save leaves the previous file
+intact. Without indent the next save copies the unchanged bytes from the file
+written last, as long as nothing else wrote to it since.
+
 """
 
-import sys
-import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+from model.json_stream_writer import JsonStreamWriter
 
 from PyQt5 import  QtWidgets
 
 
 class JsonFileManager(QtWidgets.QWidget):
+    # files from this size on are loaded lazily, their rows are created as
+    # the view shows them
+    lazy_load_size = 32 * 1024 * 1024
+
     def __init__(self):
         super().__init__()
         self.file_path = ""
-        self.json_data = []
+        # output layout, as for json.dump; None keeps everything on one line
+        self.indent = None
+        self.separators = None
+        # separators the fragments cached on the items were encoded with
+        self._fragment_separators = None
+        # (path, size, mtime) of the last file written from the cached
+        # fragments, and the root fragment it holds
+        self._saved = None
+
+    def select_file(self):
+        if self.file_path == "":
+            options = QtWidgets.QFileDialog.Options()
+            options |= QtWidgets.QFileDialog.DontUseNativeDialog
+            self.file_path, _ = QtWidgets.QFileDialog.getOpenFileName(QtWidgets.QFileDialog(), "Open", "", "Json Files (*.json);;All Files (*)",
+                                                                options=options)
+        return self.file_path
+
+    def is_large_file(self):
+        return os.path.getsize(self.file_path) >= self.lazy_load_size
+
+    def save_tree(self, root_item):
+        # streams the tree without building the dicts of create_new_item;
+        # without indent, subtrees unchanged since the last save are copied
+        # from their cached fragments, or from the bytes of the last save
+        previous = self._previous_file(root_item)
+        self._saved = None
+        try:
+            with self._atomic_write() as file:
+                writer = JsonStreamWriter(file, self.indent, self.separators)
+                if self.indent is None and self.separators != self._fragment_separators:
+                    JsonStreamWriter.clear_fragments(root_item)
+                    self._fragment_separators = self.separators
+                writer.write_tree(root_item, previous)
+        finally:
+            if previous is not None:
+                previous.close()
+        if self.indent is None:
+            stat = os.stat(self.file_path)
+            self._saved = (self.file_path, stat.st_size, stat.st_mtime_ns, root_item.fragment)
+
+    def _previous_file(self, root_item):
+        # the offsets of the cached fragments count characters, so they
+        # only match the bytes of an ASCII output
+        if self._saved is None or self.indent is not None or not ''.join(self.separators or ()).isascii():
+            return None
+        path, size, mtime, fragment = self._saved
+        if root_item.fragment is not fragment:
+            return None
+        try:
+            stat = os.stat(path)
+            if stat.st_size != size or stat.st_mtime_ns != mtime:
+                return None
+            return open(path, 'rb')
+        except OSError:
+            return None
 
-    def get_json_data(self):
-        print(self.file_path)
+    @contextmanager
+    def _atomic_write(self):
+        directory, name = os.path.split(os.path.abspath(self.file_path))
+        fd, temp_path = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                yield file
+                file.flush()
+                os.fsync(file.fileno())
+            if os.path.exists(self.file_path):
+                # mkstemp creates the file readable by the owner only
+                os.chmod(temp_path, os.stat(self.file_path).st_mode & 0o7777)
+            os.replace(temp_path, self.file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._fsync_directory(directory)
+
+    @staticmethod
+    def _fsync_directory(directory):
+        # makes the rename itself durable, not available on Windows
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
         try:
-            if self.file_path == "":
-                options = QtWidgets.QFileDialog.Options()
-                options |= QtWidgets.QFileDialog.DontUseNativeDialog
-                self.file_path, _ = QtWidgets.QFileDialog.getOpenFileName(QtWidgets.QFileDialog(), "Open", "", "Json Files (*.json);;All Files (*)",
-                                                                    options=options)
-            if self.file_path:
-                with open(self.file_path) as f:
-                    try:
-                        self.json_data = json.load(f)
-                    except ValueError:
-                        QtWidgets.QMessageBox.critical(QtWidgets.QMessageBox(), "Json Error", "Json TypeError")
-                        sys.exit()
-        except Exception as e:
-            print(str(e))
-            QtWidgets.QMessageBox.critical(QtWidgets.QMessageBox(), "Json Error", "Json TypeError")
-            sys.exit()
-
-    def save_json_file(self, result_file):
-        with open(self.file_path, 'w') as file:
-            json.dump(result_file, file)
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -0,0 +1,151 @@
+"""
+Streaming schema reader
+
+Walks the top-level array and each node's "children" incrementally and hands
+every node to a builder as soon as it is complete, so the parsed dicts are
+freed while the file is read instead of living next to the whole tree.
+
+Nodes that fit in the read buffer are decoded in one go by the C decoder,
+only the ones crossing the buffer boundary are walked key by key.
+
+"""
+
+import json
+
+
+class JsonStreamReader(object):
+    whitespace = ' \t\n\r'
+
+    def __init__(self, file, chunk_size=1 << 20):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        # the decoder's own key memo only lasts one raw_decode, that is one
+        # node; this one lasts the whole file, so equal keys share a string
+        # as they do under json.load
+        self.keys = {}
+        share_key = self.keys.setdefault
+        self.decoder = json.JSONDecoder(
+            object_pairs_hook=lambda pairs: {share_key(key, key): value for key, value in pairs})
+
+    def iter_items(self, build_item, stream_children=True):
+        """
+        Yields build_item(data, children) for every top-level node. With
+        stream_children the children are built first and passed as a list,
+        otherwise data keeps its raw "children".
+        """
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            if stream_children:
+                yield self._read_node(build_item)
+            else:
+                yield build_item(self._read_value(), None)
+            char = self._next()
+            if char == ']':
+                return
+            if char != ',':
+                self._error("Expecting ',' delimiter")
+
+    def _read_node(self, build_item):
+        if self._peek() != '{':
+            return build_item(self._read_value(), None)
+        data = self._try_read_value()
+        if data is not None:
+            return build_item(data, None)
+        # the node is larger than what is buffered, walk its keys
+        self.pos += 1
+        data = {}
+        children = None
+        if self._peek() == '}':
+            self.pos += 1
+            return build_item(data, None)
+        while True:
+            if self._peek() != '"':
+                self._error("Expecting property name enclosed in double quotes")
+            key = self._read_value()
+            key = self.keys.setdefault(key, key)
+            self._expect(':')
+            if key == "children" and self._peek() == '[':
+                children = self._read_children(build_item)
+            else:
+                data[key] = self._read_value()
+            char = self._next()
+            if char == '}':
+                return build_item(data, children)
+            if char != ',':
+                self._error("Expecting ',' delimiter")
+
+    def _read_children(self, build_item):
+        self._expect('[')
+        children = []
+        if self._peek() == ']':
+            self.pos += 1
+            return children
+        while True:
+            children.append(self._read_node(build_item))
+            char = self._next()
+            if char == ']':
+                return children
+            if char != ',':
+                self._error("Expecting ',' delimiter")
+
+    def _try_read_value(self):
+        # decodes the value only if it is complete inside the buffer
+        try:
+            value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            return None
+        self.pos = end
+        return value
+
+    def _read_value(self):
+        self._peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # grow the reads so a long value is not re-decoded too often
+            self._fill(size)
+            size *= 2
+
+    def _fill(self, size=None):
+        chunk = self.file.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.whitespace:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _next(self):
+        char = self._peek()
+        self.pos += 1
+        return char
+
+    def _expect(self, char):
+        if self._next() != char:
+            self._error("Expecting '{}'".format(char))
+
+    def _error(self, message):
+        raise json.JSONDecodeError(message, self.buffer, max(self.pos - 1, 0))
@@ -0,0 +1,434 @@
+"""
+Streaming schema writer
+
+Writes the TreeItem graph straight to a file, node by node, so saving never
+holds a second copy of the tree as dicts. The output is the same as
+json.dump() of create_new_item() with the same indent and separators.
+
+Without indent the text of a subtree does not depend on its depth, so it can
+be kept on the items between saves: every item keeps its encoded fragment
+until it or a descendant is marked dirty. Small subtrees keep one string,
+larger ones a node of their own text and blocks of their children's text,
+so the cache holds each byte of the output once and a save re-encodes only
+the dirty items and the blocks holding them.
+
+A node is a tuple (keys, content, size): the children of a block, or None
+for the node of an item, its text or list of parts, and its length. Given
+the file the cached fragments were last written to, a save copies the bytes
+of every node it keeps from there and writes only the text on the dirty
+paths.
+
+"""
+
+import json
+import os
+import zlib
+from bisect import bisect_right
+from itertools import accumulate, chain
+from json.encoder import encode_basestring_ascii
+
+from model.tree_item import TreeItem
+
+
+class JsonStreamWriter(object):
+
+    def __init__(self, file, indent=None, separators=None, buffer_size=1 << 12, fragment_size=1 << 12, block_size=32):
+        # file is binary, the output is ASCII unless the separators are not
+        self.file = file
+        self.indent = indent
+        if separators is None:
+            separators = (', ', ': ') if indent is None else (',', ': ')
+        self.item_separator, self.key_separator = separators
+        self.encoder = json.JSONEncoder(indent=indent, separators=separators)
+        self.buffer_size = buffer_size
+        self.fragment_size = fragment_size
+        self.block_size = block_size
+        self.parts = []
+        self.headers = []
+        # item nodes built by this save -> the nodes they replace
+        self.replaced = {}
+        self.previous = None
+        # offset in previous -> the text written there, of the nodes spliced
+        self.texts = {}
+        # (offset, size) in previous of the bytes to copy next
+        self.copy = None
+        self.kernel_copy = hasattr(os, 'copy_file_range')
+
+    def write_items(self, items):
+        self._write_list(items, 0)
+        self.flush()
+
+    def write_tree(self, root_item, previous=None):
+        """
+        Writes the children of root_item, loaded or not. Without indent the
+        cached fragments are reused and refreshed; previous is the binary
+        file they were last written to, or None to write every byte.
+        """
+        if self.indent is not None:
+            self.write_items(self._children(root_item))
+            return
+        old = root_item.fragment
+        if root_item.dirty or old is None:
+            root_item.fragment = self._node(None, self._list_fragment(root_item))
+            root_item.dirty = False
+        if previous is not None and old is not None:
+            self.previous = previous
+            self._splice(root_item.fragment, old, 0)
+        else:
+            self._write_fragment(root_item.fragment)
+        self.flush()
+
+    @staticmethod
+    def clear_fragments(root_item):
+        # after a change of separators every cached fragment is wrong
+        stack = [root_item]
+        while stack:
+            item = stack.pop()
+            item.fragment = None
+            item.dirty = True
+            stack.extend(item.childItems)
+
+    def _write_fragment(self, fragment):
+        stack = [fragment]
+        while stack:
+            fragment = stack.pop()
+            if type(fragment) is tuple:
+                fragment = fragment[1]
+                if type(fragment) is not str:
+                    stack.extend(reversed(fragment))
+                    continue
+            self.parts.append(fragment)
+            if len(self.parts) >= self.buffer_size:
+                self.flush()
+
+    def _splice(self, node, old, offset):
+        # old is the node that node replaces, written at offset in previous;
+        # the nodes they share are copied from there, and so are the
+        # fragments of children moving from a rebuilt block to a new one
+        kept = set(id(part) for part in node[1] if type(part) is tuple)
+        positions = {}
+        for part in old[1]:
+            if type(part) is str:
+                self.texts[offset] = part
+                offset += len(part)
+                continue
+            positions[id(part)] = (part, offset)
+            if id(part) not in kept and type(part[1]) is list:
+                inner = offset
+                for child in part[1]:
+                    if type(child) is str:
+                        self.texts[inner] = child
+                        inner += len(child)
+                    else:
+                        positions[id(child)] = (child, inner)
+                        inner += child[2]
+            offset += part[2]
+        for part in node[1]:
+            self._splice_part(part, positions)
+
+    def _splice_part(self, part, positions):
+        if type(part) is str:
+            # a separator between two copied nodes joins their copies
+            if self.copy is not None and self.texts.get(self.copy[0] + self.copy[1]) == part:
+                self._copy(self.copy[0] + self.copy[1], len(part))
+            else:
+                self._write(part)
+            return
+        position = positions.get(id(part))
+        if position is not None and position[0] is part:
+            self._copy(position[1], part[2])
+            return
+        old = self.replaced.get(id(part))
+        if old is not None:
+            position = positions.get(id(old))
+            if position is not None and position[0] is old:
+                self._splice(part, old, position[1])
+                return
+        if type(part[1]) is str:
+            self._write(part[1])
+            return
+        for child in part[1]:
+            self._splice_part(child, positions)
+
+    def _copy(self, offset, size):
+        # adjacent ranges go out as one copy
+        if self.copy is not None:
+            start, length = self.copy
+            if start + length == offset:
+                self.copy = (start, length + size)
+                return
+            self._flush_copy()
+        self.flush()
+        self.copy = (offset, size)
+
+    def _flush_copy(self):
+        offset, size = self.copy
+        self.copy = None
+        self.file.flush()
+        while size:
+            copied = 0
+            if self.kernel_copy:
+                # the bytes never pass through Python, and a filesystem
+                # that shares extents does not even copy them
+                try:
+                    copied = os.copy_file_range(self.previous.fileno(), self.file.fileno(), size, offset)
+                except OSError:
+                    self.kernel_copy = False
+                    continue
+            else:
+                self.previous.seek(offset)
+                data = self.previous.read(min(size, 1 << 20))
+                self.file.write(data)
+                copied = len(data)
+            if not copied:
+                raise OSError("{} ends before the bytes to copy".format(self.previous.name))
+            offset += copied
+            size -= copied
+
+    def _fragment(self, item):
+        if not item.dirty and item.fragment is not None:
+            return item.fragment
+        old = item.fragment
+        parts = [self._header(0) % (self._encode(item.itemData, 0),
+                                    self._encode(item.varId, 0),
+                                    self._encode(item.dataType, 0))]
+        if len(item.sources):
+            parts.append(self.item_separator + '"sources"' + self.key_separator + self._encode(item.sources, 0))
+        if len(item.metadata):
+            parts.append(self.item_separator + '"metadata"' + self.key_separator + self._encode(item.metadata, 0))
+        if item.childCount() or item.hasPendingChildren():
+            parts.append(self.item_separator + '"children"' + self.key_separator)
+            parts.extend(self._list_fragment(item))
+        parts.append('}')
+        item.fragment = self._finish(parts)
+        if type(old) is tuple and type(item.fragment) is tuple:
+            self.replaced[id(item.fragment)] = old
+        item.dirty = False
+        return item.fragment
+
+    def _list_fragment(self, item):
+        # children are grouped in blocks that end at children picked by a
+        # hash of their varId, so an insert or removal only changes the
+        # blocks around it and the same children give the same blocks in
+        # every run; only the blocks holding rows that came, went or are
+        # dirty are cut again, the others are kept as they are
+        keys = list(item.childItems)
+        if item.hasPendingChildren():
+            keys.extend(data for data in item.pendingChildren[item.pendingRow:] if len(data))
+        blocks = []
+        if type(item.fragment) is tuple:
+            blocks = [part for part in item.fragment[1] if type(part) is tuple and part[0] is not None]
+        if not blocks:
+            parts = ['[']
+            self._cut_blocks(parts, keys, {})
+            parts.append(']')
+            return parts
+        old_keys = list(chain.from_iterable(block[0] for block in blocks))
+        # rows [first, old_end) of old_keys became [first, new_end) of keys
+        first = self._common_prefix(keys, old_keys)
+        same = 0
+        if first < max(len(keys), len(old_keys)):
+            same = self._common_prefix(keys[first:][::-1], old_keys[first:][::-1])
+        shift = len(keys) - len(old_keys)
+        old_end = len(old_keys) - same
+        new_end = old_end + shift
+        ends = list(accumulate(len(block[0]) for block in blocks))
+        changed = set()
+        if first < old_end or first < new_end:
+            # rows only inserted change the block they are inserted into
+            last = max(old_end, first + 1)
+            changed.update(range(bisect_right(ends, min(first, ends[-1] - 1)),
+                                 bisect_right(ends, min(last, ends[-1]) - 1) + 1))
+        for row in [row for row, child in enumerate(item.childItems) if child.dirty]:
+            if row < first:
+                changed.add(bisect_right(ends, row))
+            elif row >= new_end:
+                changed.add(bisect_right(ends, row - shift))
+        parts = ['[']
+        index = 0
+        while index < len(blocks):
+            if index not in changed:
+                if len(parts) > 1:
+                    parts.append(self.item_separator)
+                parts.append(blocks[index])
+                index += 1
+                continue
+            start = index
+            while index < len(blocks) and index in changed:
+                index += 1
+            # the run of blocks [start, index) is cut again from its rows
+            begin = ends[start - 1] if start else 0
+            end = ends[index - 1]
+            old_blocks = dict((id(block[0][0]), block) for block in blocks[start:index])
+            self._cut_blocks(parts, keys[begin if begin <= first else begin + shift:
+                                         end + shift if end >= old_end else end], old_blocks)
+        parts.append(']')
+        return parts
+
+    @staticmethod
+    def _common_prefix(keys, old_keys, step=1 << 10):
+        # list equality runs in C and takes the same object as equal first
+        size = min(len(keys), len(old_keys))
+        row = 0
+        while row < size and keys[row:row + step] == old_keys[row:row + step]:
+            row += step
+        while row < size and keys[row] == old_keys[row]:
+            row += 1
+        return min(row, size)
+
+    def _cut_blocks(self, parts, keys, old_blocks):
+        block = []
+        for key in keys:
+            block.append(key)
+            if self._ends_block(key) or len(block) >= 4 * self.block_size:
+                self._append_block(parts, block, old_blocks)
+                block = []
+        if block:
+            self._append_block(parts, block, old_blocks)
+
+    def _ends_block(self, key):
+        # the title stands in for a missing varId; crc32, unlike hash(), is
+        # the same in every run
+        if type(key) is TreeItem:
+            name = key.varId if key.varId is not None else key.itemData
+        else:
+            name = key.get("varId") if key.get("varId") is not None else key["title"]
+        return zlib.crc32(str(name).encode()) % self.block_size == 0
+
+    def _append_block(self, parts, keys, old_blocks):
+        keys = tuple(keys)
+        if len(parts) > 1:
+            parts.append(self.item_separator)
+        block = old_blocks.get(id(keys[0]))
+        if block is None or block[0] != keys or not self._clean(keys):
+            block = self._node(keys, self._block_content(keys))
+        parts.append(block)
+
+    def _block_content(self, keys):
+        content = []
+        for key in keys:
+            if content:
+                content.append(self.item_separator)
+            content.append(self._fragment(key if type(key) is TreeItem else _RawItem(key)))
+        for part in content:
+            if type(part) is not str:
+                return content
+        # the block text replaces the fragments of its children
+        for key in keys:
+            if type(key) is TreeItem:
+                key.fragment = None
+        return ''.join(content)
+
+    @staticmethod
+    def _clean(keys):
+        for key in keys:
+            if type(key) is TreeItem and key.dirty:
+                return False
+        return True
+
+    @staticmethod
+    def _node(keys, content):
+        if type(content) is str:
+            return keys, content, len(content)
+        return keys, content, sum(len(part) if type(part) is str else part[2] for part in content)
+
+    def _finish(self, parts):
+        # small subtrees are kept as a single string
+        size = 0
+        for part in parts:
+            if type(part) is tuple:
+                part = part[1]
+            if type(part) is not str:
+                return self._node(None, parts)
+            size += len(part)
+        if size >= self.fragment_size:
+            return self._node(None, parts)
+        return ''.join(part[1] if type(part) is tuple else part for part in parts)
+
+    def flush(self):
+        if self.copy is not None:
+            self._flush_copy()
+        self.file.write(''.join(self.parts).encode())
+        self.parts = []
+
+    def _write(self, text):
+        if self.copy is not None:
+            self._flush_copy()
+        self.parts.append(text)
+        if len(self.parts) >= self.buffer_size:
+            self.flush()
+
+    def _write_list(self, items, level):
+        first = True
+        for item in items:
+            self._write(('[' if first else self.item_separator) + self._newline(level + 1))
+            first = False
+            self._write_item(item, level + 1)
+        self._write('[]' if first else self._newline(level) + ']')
+
+    def _write_item(self, item, level):
+        key_level = level + 1
+        self._write(self._header(level) % (self._encode(item.itemData, key_level),
+                                           self._encode(item.varId, key_level),
+                                           self._encode(item.dataType, key_level)))
+        prefix = self.item_separator + self._newline(key_level)
+        if len(item.sources):
+            self._write(prefix + '"sources"' + self.key_separator + self._encode(item.sources, key_level))
+        if len(item.metadata):
+            self._write(prefix + '"metadata"' + self.key_separator + self._encode(item.metadata, key_level))
+        if item.childCount() or item.hasPendingChildren():
+            self._write(prefix + '"children"' + self.key_separator)
+            self._write_list(self._children(item), key_level)
+        self._write(self._newline(level) + '}')
+
+    def _children(self, item):
+        for child in item.childItems:
+            yield child
+        if item.hasPendingChildren():
+            for data in item.pendingChildren[item.pendingRow:]:
+                if len(data):
+                    yield _RawItem(data)
+
+    def _header(self, level):
+        # '{"title": %s, "varId": %s, "dataType": %s' laid out for the level
+        while len(self.headers) <= level:
+            prefix = self._newline(len(self.headers) + 1)
+            keys = [prefix + '"{}"'.format(key) + self.key_separator + '%s' for key in ("title", "varId", "dataType")]
+            self.headers.append('{' + self.item_separator.join(keys))
+        return self.headers[level]
+
+    def _newline(self, level):
+        if self.indent is None:
+            return ''
+        return '\n' + ' ' * (self.indent * level)
+
+    def _encode(self, value, level):
+        if type(value) is str:
+            return encode_basestring_ascii(value)
+        text = self.encoder.encode(value)
+        if self.indent is not None and level:
+            text = text.replace('\n', self._newline(level))
+        return text
+
+
+class _RawItem(object):
+    # raw json of a child never loaded (lazy mode) seen through the TreeItem
+    # fields the writer reads, normalized the way TreeItem.create_new_data is
+
+    def __init__(self, data):
+        self.itemData = data["title"]
+        self.varId = data.get("varId")
+        self.dataType = data.get("dataType")
+        self.sources = data.get("sources") or ()
+        self.metadata = data.get("metadata") or {}
+        self.childItems = ()
+        self.pendingChildren = data.get("children") or ()
+        self.pendingRow = 0
+        self.dirty = True
+        self.fragment = None
+
+    def childCount(self):
+        return 0
+
+    def hasPendingChildren(self):
+        return len(self.pendingChildren) > 0
@@ -1,5 +1,5 @@
 from PyQt5 import QtCore, QtWidgets
-import qtawesome as qta
+from model.icon_cache import IconCache
 import traceback
 
 
@@ -7,32 +7,57 @@ class MetadataTableModel(QtCore.QAbstractTableModel):
     def __init__(self, metadata=None, parent=None):
         super().__init__(parent)
         try:
-            if metadata is None:
-                self.metadata = None
-                return
-            else:
-                self.initialize_table(metadata)
+            self.metadata = None
+            self.mapping = None
+            self._keys = None
+            self.set_metadata(metadata)
+            IconCache.warm()
         except Exception as e:
             print("Initialization failed: {}".format(e))
             print(traceback.format_exc())
 
+    def set_metadata(self, metadata):
+        # the model is kept and shows the metadata of the selected item; the
+        # item's dict is read in place until the first edit turns it into
+        # rows, items share it and never change it
+        self.beginResetModel()
+        self.mapping = metadata
+        self.metadata = None
+        self._keys = None
+        self.endResetModel()
+
     def initialize_table(self, metadata):
         self.metadata = []
         for key, value in metadata.items():
             if key != "":
                 self.metadata.append({"key": key, "value": value})
 
+    def _edit(self):
+        if self.metadata is None and self.mapping is not None:
+            self.initialize_table(self.mapping)
+
+    def _row_count(self):
+        if self.metadata is not None:
+            return len(self.metadata)
+        return len(self.mapping) - ("" in self.mapping)
+
+    def _row(self, row):
+        # (key, value) of a row, the keys of the dict are listed on first use
+        if self.metadata is not None:
+            return self.metadata[row]["key"], self.metadata[row]["value"]
+        if self._keys is None:
+            self._keys = [key for key in self.mapping if key != ""]
+        key = self._keys[row]
+        return key, self.mapping[key]
+
     """
        The methods below are overridden methods of the base abstract class QAbstractItemModel
     """
 
     def rowCount(self, parent=QtCore.QModelIndex()):
-        if self.metadata == None:
+        if self.metadata is None and self.mapping is None:
             return 0
-        elif len(self.metadata) == 0:
-            return 1
-        else:
-            return len(self.metadata)
+        return self._row_count() or 1
 
     def columnCount(self, parent=QtCore.QModelIndex()):
         return 4
@@ -48,24 +73,24 @@ class MetadataTableModel(QtCore.QAbstractTableModel):
                 return None
             column = index.column()
             row = index.row()
-            if role == QtCore.Qt.DisplayRole:
-                if len(self.metadata) == 0:
+            if role in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+                if self._row_count() == 0:
                     return None
-                metadata = self.metadata[row]
+                key, value = self._row(row)
                 if column == 0:
-                    if(metadata["key"] == "#real_empty#"):
+                    if(key == "#real_empty#"):
                         return ""
-                    return metadata["key"]
+                    return key
                 elif column == 1:
-                    return metadata["value"]
+                    return value
                 else:
                     return None
 
             if role == QtCore.Qt.DecorationRole:
                 if column == 2:
-                    return qta.icon('fa5s.plus-circle')
+                    return IconCache.add_icon
                 if  column == 3:
-                    return qta.icon('fa5s.minus-circle')
+                    return IconCache.remove_icon
         except Exception as e:
             print("data failed: {}".format(e))
             print(traceback.format_exc())
@@ -77,6 +102,7 @@ class MetadataTableModel(QtCore.QAbstractTableModel):
                 return False
             column = index.column()
             row = index.row()
+            self._edit()
             if column == 0:
                 for e in self.metadata:
                     if e["key"] == value or value == '' and row > 0:
@@ -116,6 +142,7 @@ class MetadataTableModel(QtCore.QAbstractTableModel):
 
     def insertRow(self, row):
         try:
+            self._edit()
             self.beginInsertRows(QtCore.QModelIndex(), row, row)
             self.metadata.insert(row + 1, {"key":"#real_empty#", "value":""})
             self.endInsertRows()
@@ -126,6 +153,7 @@ class MetadataTableModel(QtCore.QAbstractTableModel):
 
     def removeRow(self, row):
         try:
+            self._edit()
             if len(self.metadata) == 1:
                 self.metadata = []
                 self.beginRemoveRows(QtCore.QModelIndex(), 0, 0)
@@ -148,6 +176,9 @@ class MetadataTableModel(QtCore.QAbstractTableModel):
             print(traceback.format_exc())
 
     def getMetaData(self):
+        if self.metadata is None:
+            # without the empty key, as initialize_table leaves it out
+            return {key: value for key, value in self.mapping.items() if key != ""}
         metadata = {}
         for e in self.metadata:
             key = e["key"]
@@ -0,0 +1,56 @@
+"""
+Path index
+
+Finds the item at an absolute path such as /i_folder/some_text. A path is
+resolved one title at a time from the root, through a title -> children
+map of each parent it goes through; the map is built on the first lookup
+and dropped when the children of the parent change, so a lookup costs one
+dict access per level. Titles are not unique among siblings, every child
+carrying the title is tried in turn.
+
+"""
+
+
+class PathIndex(object):
+
+    def __init__(self):
+        # parent item -> {title: child, or the list of them when repeated}
+        self.children = {}
+
+    def clear(self):
+        self.children = {}
+
+    def forget(self, parent_item):
+        # must run whenever a child of parent_item is added, removed,
+        # moved or renamed
+        self.children.pop(parent_item, None)
+
+    def find(self, parent_item, title):
+        children = self.children.get(parent_item)
+        if children is None:
+            children = {}
+            for child in parent_item.childItems:
+                existing = children.get(child.itemData)
+                if existing is None:
+                    children[child.itemData] = child
+                elif isinstance(existing, list):
+                    existing.append(child)
+                else:
+                    children[child.itemData] = [existing, child]
+            self.children[parent_item] = children
+        found = children.get(title)
+        if found is None:
+            return ()
+        # the lists are never changed once built, a new map gets new ones
+        if isinstance(found, list):
+            return found
+        return (found,)
+
+    @staticmethod
+    def split(path):
+        # titles of the path, None for something that is not one
+        if not path.startswith('/') or path == '/':
+            return None
+        if path.endswith('/'):
+            path = path[:-1]
+        return path[1:].split('/')
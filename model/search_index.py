@@ -0,0 +1,628 @@
+"""
+Search index
+
+Keeps every distinct lowercase title once, with the items carrying it, and a
+trigram index over the distinct titles. Schemas repeat the same titles a lot
+(every List element has the same children), so the trigram sets stay much
+smaller than the tree.
+
+Field-scoped terms are answered from inverted indexes:
+
+    varId:foo  type:Currency  source:irs_*  meta.key:value  meta."some key":*
+
+Terms are and-ed together, the remaining text is matched against titles.
+Values are case-insensitive and may use fnmatch wildcards.
+
+Queries run in the search worker, which also matches the raw json of a
+lazy model the index has not seen yet.
+
+The exact varIds are kept apart, with the ones still in raw json (lazy
+mode), so that taken ids and the item carrying one are found without a
+walk over the tree.
+
+A subtree taken out by an edit that can be undone is detached rather than
+removed: its entries stay, the lookups and queries leave it out, and an
+undo attaches it back without a walk. Its entries go once the edit can no
+longer be undone.
+
+"""
+
+import bisect
+import re
+import sys
+import threading
+from fnmatch import fnmatchcase
+from itertools import chain
+
+QUERY_TERM = re.compile(r'(?:^|\s)(varId|type|source|meta\.(?:"[^"]*"|[^\s:]+)):("[^"]*"|\S*)', re.IGNORECASE)
+WILDCARDS = '*?['
+
+
+class FieldIndex(object):
+    """
+    Inverted index value -> items of one field. A value held by a single
+    item (most varIds and sources) stores the item itself instead of a set.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self._sorted_keys = None
+
+    def __len__(self):
+        return len(self.postings)
+
+    def add(self, key, item):
+        existing = self.postings.get(key)
+        if existing is None:
+            self.postings[key] = item
+            self._sorted_keys = None
+        elif isinstance(existing, set):
+            existing.add(item)
+        elif existing is not item:
+            self.postings[key] = {existing, item}
+
+    def remove(self, key, item):
+        existing = self.postings.get(key)
+        if existing is None:
+            return
+        if isinstance(existing, set):
+            existing.discard(item)
+            if len(existing) == 1:
+                self.postings[key] = existing.pop()
+        elif existing is item:
+            del self.postings[key]
+            self._sorted_keys = None
+
+    def items(self, key):
+        existing = self.postings.get(key)
+        if existing is None:
+            return ()
+        if isinstance(existing, set):
+            return existing
+        return (existing,)
+
+    def keys(self, pattern):
+        if not any(char in pattern for char in WILDCARDS):
+            return [pattern] if pattern in self.postings else []
+        # the literal prefix of the pattern narrows the keys by bisection
+        prefix = re.split(r'[*?\[]', pattern, 1)[0]
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self.postings)
+        keys = self._sorted_keys
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\U0010ffff') if prefix else len(keys)
+        return [key for key in keys[start:end] if fnmatchcase(key, pattern)]
+
+    def match(self, pattern):
+        result = set()
+        for key in self.keys(pattern):
+            result.update(self.items(key))
+        return result
+
+
+class VarIdIndex(object):
+    """
+    Exact varId -> loaded items, and the number of items with each varId
+    still in raw json. Raw children are counted on the first question after
+    they are attached below an item, so a lazy load stays instant; a fetch
+    only moves the varIds of the fetched rows from the raw counts to the
+    items, whatever is below them.
+    """
+
+    def __init__(self):
+        self.items = FieldIndex()
+        self.pending = {}
+        # item -> (raw children, first row) counted in pending
+        self.counted = {}
+        # same, for the ones not counted yet
+        self.uncounted = {}
+        # root of a detached subtree -> the registry entries below it, taken
+        # out of the counts
+        self.detached = {}
+
+    def add(self, item):
+        if item.getVarId() is not None:
+            self.items.add(item.getVarId(), item)
+
+    def remove(self, item):
+        if item.getVarId() is not None:
+            self.items.remove(item.getVarId(), item)
+
+    def add_pending(self, item):
+        if item in self.counted or item in self.uncounted or not item.hasPendingChildren():
+            return
+        self.uncounted[item] = (item.pendingChildren, item.pendingRow)
+
+    def remove_pending(self, item):
+        # what was counted for item, its raw children may have changed since
+        if self.uncounted.pop(item, None) is not None:
+            return
+        counted = self.counted.pop(item, None)
+        if counted is not None:
+            self._count(counted[0][counted[1]:], -1)
+
+    def loaded(self, parent_item, items):
+        # items were just built from raw children of parent_item
+        if parent_item in self.uncounted:
+            registry = self.uncounted
+        elif parent_item in self.counted:
+            registry = self.counted
+            for item in items:
+                if item.getVarId() is not None:
+                    self._add_pending(item.getVarId(), -1)
+        else:
+            return
+        del registry[parent_item]
+        if parent_item.hasPendingChildren():
+            registry[parent_item] = (parent_item.pendingChildren, parent_item.pendingRow)
+        for item in items:
+            if item.hasPendingChildren():
+                registry[item] = (item.pendingChildren, item.pendingRow)
+
+    def detach(self, item):
+        # the items below item stay in the postings, skipped by the lookups,
+        # and the raw json below them leaves the counts
+        held = []
+        for registry in (self.counted, self.uncounted):
+            for other in [other for other in registry if self._inside(other, item)]:
+                children, row = registry.pop(other)
+                if registry is self.counted:
+                    self._count(children[row:], -1)
+                held.append((other, (children, row)))
+        self.detached[item] = held
+
+    def attach(self, item):
+        # the raw json below item is counted again on the next question
+        for other, entry in self.detached.pop(item):
+            self.uncounted[other] = entry
+
+    def release(self, item):
+        # item will not be attached again, the caller removed its items
+        self.detached.pop(item, None)
+
+    def attached(self, item):
+        # False for the items of a detached subtree
+        if self.detached:
+            while item is not None:
+                if item in self.detached:
+                    return False
+                item = item.parent()
+        return True
+
+    def contains(self, var_id):
+        if any(self.attached(item) for item in self.items.items(var_id)):
+            return True
+        self._count_uncounted()
+        return var_id in self.pending
+
+    def find(self, var_id):
+        if self.detached:
+            return [item for item in self.items.items(var_id) if self.attached(item)]
+        return self.items.items(var_id)
+
+    def count(self, var_id):
+        # items and raw json carrying var_id
+        self._count_uncounted()
+        return len(self.find(var_id)) + self.pending.get(var_id, 0)
+
+    def is_pending(self, var_id):
+        self._count_uncounted()
+        return var_id in self.pending
+
+    def pending_path(self, var_id):
+        """
+        The item whose raw children hold var_id, with the row of the raw
+        json leading to it in each level of children, or None.
+        """
+        for item, (children, row) in chain(self.counted.items(), self.uncounted.items()):
+            stack = [(children, index, None) for index in range(len(children) - 1, row - 1, -1)]
+            while stack:
+                children, index, path = stack.pop()
+                data = children[index]
+                if len(data) == 0:
+                    continue
+                path = (index, path)
+                if data.get("varId") == var_id:
+                    rows = []
+                    while path is not None:
+                        rows.append(path[0])
+                        path = path[1]
+                    return item, rows[::-1]
+                children = data.get("children")
+                if children:
+                    stack.extend((children, index, path) for index in range(len(children) - 1, -1, -1))
+        return None
+
+    def free_prefix(self, var_ids, prefix):
+        # prefix, else prefix numbered from 2, under which none of var_ids is taken
+        candidate = prefix
+        number = 1
+        while any(self.contains(candidate + var_id) for var_id in var_ids):
+            number += 1
+            candidate = '{}{}_'.format(prefix, number)
+        return candidate
+
+    def _count_uncounted(self):
+        if self.uncounted:
+            for children, row in self.uncounted.values():
+                self._count(children[row:], 1)
+            self.counted.update(self.uncounted)
+            self.uncounted = {}
+
+    def _count(self, children, step):
+        stack = list(children)
+        while stack:
+            data = stack.pop()
+            if len(data) == 0:
+                continue
+            var_id = data.get("varId")
+            if var_id is not None:
+                self._add_pending(var_id, step)
+            if data.get("children"):
+                stack.extend(data["children"])
+
+    def _add_pending(self, var_id, step):
+        count = self.pending.get(var_id, 0) + step
+        if count:
+            self.pending[var_id] = count
+        else:
+            del self.pending[var_id]
+
+    @staticmethod
+    def _inside(item, root):
+        while item is not None:
+            if item is root:
+                return True
+            item = item.parent()
+        return False
+
+
+class SearchIndex(object):
+    """
+    The GUI thread keeps the varIds exact and journals every other change;
+    the search worker replays the journal before each query, so only it
+    touches the title and field indexes. Removed items are journaled with
+    the keys they are indexed under, added ones are read when replayed:
+    an edit after that journals the keys it replaces, so the index ends up
+    right whatever the order in which the worker sees the edits.
+    """
+
+    def __init__(self):
+        self.var_id_index = VarIdIndex()
+        self.journal = []
+        self.journal_lock = threading.Lock()
+        # held by the replay and the query
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.items_by_title = {}
+        self.trigrams = {}
+        self.var_ids = FieldIndex()
+        self.data_types = FieldIndex()
+        self.sources = FieldIndex()
+        self.metadata = {}
+        # root of a detached subtree -> its items, left out of the results
+        self.detached = {}
+        # bumped by every replay that changed the index
+        self.version = 0
+        # titles matched by the previous query, refined while the user keeps
+        # typing; any change to the index drops them
+        self.last_query = None
+        self.last_titles = None
+        self.last_version = None
+
+    """
+    GUI thread
+    """
+
+    def clear(self):
+        self.var_id_index = VarIdIndex()
+        with self.journal_lock:
+            self.journal = [(self._reset, ())]
+
+    def add_item(self, item):
+        self.var_id_index.add(item)
+        self._log(self._index_items, (item,))
+
+    def add_fields(self, item):
+        self.add_item(item)
+
+    def remove_fields(self, item):
+        # must run before the item's fields are changed
+        self.var_id_index.remove(item)
+        self._log(self._unindex_keys, item, None, self._field_keys(item))
+
+    def remove_item(self, item):
+        self.var_id_index.remove(item)
+        self._log(self._unindex_keys, item, self._key(item.data()), self._field_keys(item))
+
+    def add_loaded(self, parent_item, items):
+        # items were just fetched from the raw children of parent_item
+        for item in items:
+            self.var_id_index.add(item)
+        self.var_id_index.loaded(parent_item, items)
+        self._log(self._index_items, items)
+
+    def add_subtree(self, item):
+        items = []
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            items.append(item)
+            self.var_id_index.add(item)
+            self.var_id_index.add_pending(item)
+            stack.extend(item.childItems)
+        self._log(self._index_items, items)
+
+    def remove_subtree(self, item):
+        items = []
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            items.append(item)
+            self.var_id_index.remove(item)
+            self.var_id_index.remove_pending(item)
+            stack.extend(item.childItems)
+        self._log(self._unindex_items, items)
+
+    def detach(self, item):
+        # item was taken out by an edit that can be undone, its entries stay
+        # until attach() or release()
+        self.var_id_index.detach(item)
+        self._log(self._detach, item)
+
+    def attach(self, item):
+        self.var_id_index.attach(item)
+        self._log(self._attach, item)
+
+    def release(self, root):
+        # the detached root will not come back, its entries go
+        items = []
+        stack = [root]
+        while stack:
+            item = stack.pop()
+            items.append(item)
+            self.var_id_index.remove(item)
+            stack.extend(item.childItems)
+        self.var_id_index.release(root)
+        self._log(self._release, root, items)
+
+    def pending_children(self):
+        # (item, raw children, first raw row) of every item with raw children,
+        # for raw_matches; the lists of raw json are never changed in place
+        var_id_index = self.var_id_index
+        return [(item, children, row) for item, (children, row) in
+                chain(var_id_index.counted.items(), var_id_index.uncounted.items())]
+
+    def _log(self, function, *arguments):
+        with self.journal_lock:
+            self.journal.append((function, arguments))
+
+    """
+    Search worker thread
+    """
+
+    def replay(self):
+        with self.lock:
+            self._replay()
+
+    def _replay(self):
+        with self.journal_lock:
+            journal, self.journal = self.journal, []
+        if journal:
+            self.version += 1
+        for function, arguments in journal:
+            function(*arguments)
+
+    def _index_items(self, items):
+        for item in items:
+            title = self._key(item.data())
+            titled = self.items_by_title.get(title)
+            if titled is None:
+                titled = self.items_by_title[title] = set()
+                for trigram in self._trigrams(title):
+                    self.trigrams.setdefault(trigram, set()).add(title)
+            titled.add(item)
+            var_id, data_type, sources, metadata = self._field_keys(item)
+            if var_id is not None:
+                self.var_ids.add(var_id, item)
+            if data_type is not None:
+                self.data_types.add(data_type, item)
+            for source in sources:
+                self.sources.add(source, item)
+            for key, value in metadata:
+                values = self.metadata.get(key)
+                if values is None:
+                    values = self.metadata[key] = FieldIndex()
+                values.add(value, item)
+
+    def _detach(self, root):
+        # nothing below a detached item changes until it is attached again
+        items = set()
+        stack = [root]
+        while stack:
+            item = stack.pop()
+            items.add(item)
+            stack.extend(item.childItems)
+        self.detached[root] = items
+
+    def _attach(self, item):
+        self.detached.pop(item, None)
+
+    def _release(self, root, items):
+        self.detached.pop(root, None)
+        self._unindex_items(items)
+
+    def _unindex_items(self, items):
+        for item in items:
+            self._unindex_keys(item, self._key(item.data()), self._field_keys(item))
+
+    def _unindex_keys(self, item, title, field_keys):
+        var_id, data_type, sources, metadata = field_keys
+        if var_id is not None:
+            self.var_ids.remove(var_id, item)
+        if data_type is not None:
+            self.data_types.remove(data_type, item)
+        for source in sources:
+            self.sources.remove(source, item)
+        for key, value in metadata:
+            values = self.metadata.get(key)
+            if values is not None:
+                values.remove(value, item)
+                if not len(values):
+                    del self.metadata[key]
+        if title is None:
+            return
+        titled = self.items_by_title.get(title)
+        if titled is None:
+            return
+        titled.discard(item)
+        if not titled:
+            del self.items_by_title[title]
+            for trigram in self._trigrams(title):
+                titles = self.trigrams.get(trigram)
+                if titles is not None:
+                    titles.discard(title)
+                    if not titles:
+                        del self.trigrams[trigram]
+
+    def query(self, text):
+        """
+        Returns the set of items matching every field term of text and whose
+        title contains the rest of it, case-insensitive.
+        """
+        with self.lock:
+            self._replay()
+            terms, text = self._parse(text)
+            result = None
+            for field, pattern in terms:
+                matches = self._field_query(field, pattern)
+                result = matches if result is None else result & matches
+                if not result:
+                    return set()
+            if text or result is None:
+                matches = self._title_query(text)
+                result = matches if result is None else result & matches
+            for items in self.detached.values():
+                result = result - items
+            return result
+
+    def raw_matches(self, pending, text, cancelled=None, check_interval=4096):
+        """
+        The raw json matching text below the items of pending_children(),
+        as (item, raw children, rows): rows lead from the raw children of
+        item down to the match, in the order of the rows. None when
+        cancelled() turned true.
+        """
+        terms, text = self._parse(text)
+        matches = []
+        count = 0
+        for item, children, first in pending:
+            stack = [(children, row, ()) for row in range(len(children) - 1, first - 1, -1)]
+            while stack:
+                count += 1
+                if cancelled is not None and count % check_interval == 0 and cancelled():
+                    return None
+                level, row, rows = stack.pop()
+                data = level[row]
+                if len(data) == 0:
+                    continue
+                rows = rows + (row,)
+                if self._raw_match(data, terms, text):
+                    matches.append((item, children, rows))
+                below = data.get("children")
+                if below:
+                    stack.extend((below, index, rows) for index in range(len(below) - 1, -1, -1))
+        return matches
+
+    def _parse(self, text):
+        # field terms as (field, pattern), and the lowercase rest of text
+        terms = [(field.lower(), self._key(value.strip('"'))) for field, value in QUERY_TERM.findall(text)]
+        return terms, QUERY_TERM.sub(' ', text).strip().lower()
+
+    def _raw_match(self, data, terms, text):
+        if text and text not in str(data["title"]).lower():
+            return False
+        for field, pattern in terms:
+            if field == 'varid':
+                values = () if data.get("varId") is None else (data["varId"],)
+            elif field == 'type':
+                values = () if data.get("dataType") is None else (data["dataType"],)
+            elif field == 'source':
+                values = data.get("sources") or ()
+            else:
+                key = self._key(field[len('meta.'):].strip('"'))
+                values = [value for name, value in (data.get("metadata") or {}).items()
+                          if self._match(str(name).lower(), key)]
+            if not any(self._match(str(value).lower(), pattern) for value in values):
+                return False
+        return True
+
+    def _field_query(self, field, pattern):
+        if field == 'varid':
+            return self.var_ids.match(pattern)
+        if field == 'type':
+            return self.data_types.match(pattern)
+        if field == 'source':
+            return self.sources.match(pattern)
+        key = self._key(field[len('meta.'):].strip('"'))
+        result = set()
+        if any(char in key for char in WILDCARDS):
+            keys = [name for name in self.metadata if fnmatchcase(name, key)]
+        else:
+            keys = [key] if key in self.metadata else []
+        for key in keys:
+            result.update(self.metadata[key].match(pattern))
+        return result
+
+    def _title_query(self, text):
+        if self.last_version == self.version and self.last_query in text:
+            # a longer query can only match a subset of the previous titles
+            titles = [title for title in self.last_titles if text in title]
+        else:
+            titles = self._matching_titles(text)
+        self.last_query = text
+        self.last_titles = titles
+        self.last_version = self.version
+        matches = set()
+        for title in titles:
+            matches.update(self.items_by_title[title])
+        return matches
+
+    def _matching_titles(self, text):
+        trigrams = self._trigrams(text)
+        if not trigrams:
+            return [title for title in self.items_by_title if text in title]
+        candidates = sorted((self.trigrams.get(trigram, ()) for trigram in trigrams), key=len)
+        if not candidates[0]:
+            return []
+        titles = set(candidates[0])
+        for other in candidates[1:]:
+            titles.intersection_update(other)
+            if not titles:
+                return []
+        # trigrams match in any order, confirm the substring
+        return [title for title in titles if text in title]
+
+    def _field_keys(self, item):
+        metadata = item.getMetaData() or {}
+        return (None if item.getVarId() is None else self._key(item.getVarId()),
+                None if item.getDataType() is None else self._key(item.getDataType()),
+                [self._key(source) for source in item.getSources() or ()],
+                [(self._key(key), self._key(value)) for key, value in metadata.items()])
+
+    @staticmethod
+    def _match(key, pattern):
+        # the way FieldIndex.keys matches
+        if any(char in pattern for char in WILDCARDS):
+            return fnmatchcase(key, pattern)
+        return key == pattern
+
+    @staticmethod
+    def _key(value):
+        return sys.intern(str(value).lower())
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
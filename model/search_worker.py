@@ -0,0 +1,107 @@
+"""
+Background tree search
+
+The worker replays the edits the GUI thread journaled into the search
+index, runs the query and matches the raw json of a lazy model, then works
+out the folders leading to the matches. Raw matches go back to the GUI
+thread first, which fetches their rows and hands the items back. The GUI
+thread keeps editing the tree meanwhile, so every result carries the edit
+count of the model at the request and the view drops results that are
+stale or superseded by a newer request.
+
+"""
+
+import traceback
+
+from PyQt5 import QtCore
+
+
+class SearchWorker(QtCore.QObject):
+    # seq, edits, matches, raw matches as (item, raw children, rows)
+    raw_matched = QtCore.pyqtSignal(int, int, object, object)
+    # seq, edits, matches, ancestors, filtered parents
+    finished = QtCore.pyqtSignal(int, int, object, object, object)
+    check_interval = 4096
+
+    def __init__(self, tree_model):
+        super().__init__()
+        self.tree_model = tree_model
+        self.latest_seq = 0
+
+    def cancel(self, seq):
+        # called from the GUI thread, any request older than seq is abandoned
+        self.latest_seq = seq
+
+    def index(self):
+        # between searches, so that the next query finds the journal short
+        try:
+            self.tree_model.search_index.replay()
+        except Exception as e:
+            print("search index failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def search(self, seq, edits, text, pending):
+        if seq != self.latest_seq:
+            return
+        try:
+            search_index = self.tree_model.search_index
+            matches = search_index.query(text)
+            raw_matches = search_index.raw_matches(pending, text, lambda: seq != self.latest_seq,
+                                                   self.check_interval)
+            if raw_matches is None:
+                return
+        except Exception as e:
+            print("search failed: {}".format(e))
+            print(traceback.format_exc())
+            return
+        if raw_matches:
+            self.raw_matched.emit(seq, edits, matches, raw_matches)
+        else:
+            self.resolve(seq, edits, matches)
+
+    def resolve(self, seq, edits, matches):
+        if seq != self.latest_seq:
+            return
+        try:
+            ancestors = self._ancestors(seq, matches)
+            if ancestors is None:
+                return
+            filtered_parents = self._filtered_parents(seq, matches, ancestors)
+            if filtered_parents is None:
+                return
+        except Exception as e:
+            print("search failed: {}".format(e))
+            print(traceback.format_exc())
+            return
+        self.finished.emit(seq, edits, matches, ancestors, filtered_parents)
+
+    def _ancestors(self, seq, matches):
+        ancestors = set()
+        for count, item in enumerate(matches):
+            if count % self.check_interval == 0 and seq != self.latest_seq:
+                return None
+            parent = item.parent()
+            while parent is not None and parent not in ancestors:
+                ancestors.add(parent)
+                parent = parent.parent()
+        return ancestors
+
+    def _filtered_parents(self, seq, matches, ancestors):
+        # matched rows keep their whole subtree, only ancestors outside of
+        # every match lose their other children; the root always does, so
+        # a query without matches shows nothing
+        filtered_parents = {self.tree_model.root_item}
+        for count, parent in enumerate(ancestors):
+            if count % self.check_interval == 0 and seq != self.latest_seq:
+                return None
+            if not self._inside_match(parent, matches):
+                filtered_parents.add(parent)
+        return filtered_parents
+
+    @staticmethod
+    def _inside_match(item, matches):
+        while item is not None:
+            if item in matches:
+                return True
+            item = item.parent()
+        return False
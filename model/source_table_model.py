@@ -1,5 +1,5 @@
 from PyQt5 import QtCore
-import qtawesome as qta
+from model.icon_cache import IconCache
 import traceback
 
 
@@ -8,17 +8,30 @@ class SourceTableModel(QtCore.QAbstractTableModel):
     def __init__(self, sources=None, parent=None):
         super().__init__(parent)
         try:
-            if sources is None:
-                self.sources = None
-                return
-            self.sources = []
-            for source in sources:
-                if source != "":
-                    self.sources.append(source)
+            self.sources = None
+            self._copied = False
+            self.set_sources(sources)
+            IconCache.warm()
         except Exception as e:
             print("Initialization failed: {}".format(e))
             print(traceback.format_exc())
 
+    def set_sources(self, sources):
+        # the model is kept and shows the sources of the selected item; they
+        # are read in place and only copied on the first edit, items share
+        # their sources list and never change it
+        self.beginResetModel()
+        if sources is not None and "" in sources:
+            sources = [source for source in sources if source != ""]
+        self.sources = sources
+        self._copied = False
+        self.endResetModel()
+
+    def _copy(self):
+        if not self._copied:
+            self.sources = list(self.sources)
+            self._copied = True
+
     """
        The methods below are overridden methods of the base abstract class QAbstractItemModel
     """
@@ -47,9 +60,9 @@ class SourceTableModel(QtCore.QAbstractTableModel):
         column = index.column()
         if role == QtCore.Qt.DecorationRole:
             if column == 1:
-                return qta.icon('fa5s.plus-circle')
+                return IconCache.add_icon
             if column == 2:
-                return qta.icon('fa5s.minus-circle')
+                return IconCache.remove_icon
 
         if role == QtCore.Qt.DisplayRole and column == 0:
             if len(self.sources) == 0:
@@ -62,6 +75,7 @@ class SourceTableModel(QtCore.QAbstractTableModel):
             column = index.column()
             if column != 0 or role != QtCore.Qt.EditRole or value == "":
                 return False
+            self._copy()
             if len(self.sources):
                 self.sources[row] = value
             else:
@@ -74,6 +88,7 @@ class SourceTableModel(QtCore.QAbstractTableModel):
 
     def insertRow(self, row):
         try:
+            self._copy()
             self.beginInsertRows(QtCore.QModelIndex(), row, row)
             self.sources.insert(row + 1, "")
             self.endInsertRows()
@@ -85,6 +100,7 @@ class SourceTableModel(QtCore.QAbstractTableModel):
 
     def removeRow(self, row):
         try:
+            self._copy()
             if len(self.sources) == 1:
                 self.sources = []
                 self.beginRemoveRows(QtCore.QModelIndex(), 0, 0)
@@ -107,4 +123,7 @@ class SourceTableModel(QtCore.QAbstractTableModel):
 
 
     def getSources(self):
-        return self.sources
+        # a copy, items may share their sources list and never change it
+        if self.sources is None:
+            return None
+        return list(self.sources)
@@ -0,0 +1,119 @@
+"""
+Loaded state of the tree
+
+The tree is edited in place, so instead of keeping a second copy of it the
+baseline only keeps what edits replaced: the first time the fields or the
+children of an item change after a load or a save, their previous values
+are recorded. Every item never touched is its own baseline, and sources,
+metadata and raw pending children are shared since they are only ever
+replaced. Putting the records back costs as much as the edits did, not as
+much as the tree.
+
+"""
+
+from itertools import chain
+
+from model.tree_item import EMPTY_CHILDREN
+
+
+class TreeBaseline(object):
+
+    def __init__(self):
+        # item -> (title, varId, dataType, sources, metadata, valueChanged, newAdded)
+        self.fields = {}
+        # item -> (children, pending children, pending row)
+        self.children = {}
+
+    def clear(self):
+        # the tree as it is becomes the baseline (loaded or saved)
+        self.fields = {}
+        self.children = {}
+
+    def record_fields(self, item):
+        # must run before the fields of item are changed
+        if item not in self.fields:
+            self.fields[item] = (item.itemData, item.varId, item.dataType, item.sources, item.metadata,
+                                 item.valueChanged, item.newAdded)
+
+    def record_children(self, item):
+        # must run before children are added to, moved in or removed from item
+        if item not in self.children:
+            self.children[item] = (tuple(item.childItems), item.pendingChildren, item.pendingRow)
+
+    def loaded(self, item, children):
+        # children the loader appends after an edit are still part of the baseline
+        record = self.children.get(item)
+        if record is not None:
+            self.children[item] = (record[0] + tuple(children),) + record[1:]
+
+    def original_children(self, item):
+        record = self.children.get(item)
+        return item.childItems if record is None else record[0]
+
+    def original_parents(self):
+        # item -> parent it was loaded under, for the items that changed place
+        parents = {}
+        for item, record in self.children.items():
+            for child in record[0]:
+                parents[child] = item
+        return parents
+
+    def touched(self):
+        # items with a record and their ancestors, as loaded and as edited;
+        # any other item holds the same subtree as in the baseline
+        original_parents = self.original_parents()
+        old_marked = set()
+        new_marked = set()
+        for item in chain(self.fields, self.children):
+            node = item
+            while node is not None and node not in new_marked:
+                new_marked.add(node)
+                node = node.parentItem
+            node = item
+            while node is not None and node not in old_marked:
+                old_marked.add(node)
+                node = original_parents.get(node, node.parentItem)
+        return old_marked | new_marked
+
+    def subtree(self, item):
+        # the subtree of item as loaded, including the items removed since
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            yield item
+            stack.extend(self.original_children(item))
+
+    def restore(self, items):
+        """
+        Puts the recorded fields and children back on items and forgets
+        their records. Returns the items that had any.
+        """
+        restored = []
+        for item in items:
+            fields = self.fields.pop(item, None)
+            children = self.children.pop(item, None)
+            if fields is None and children is None:
+                continue
+            if fields is not None:
+                (item.itemData, item.varId, item.dataType, item.sources, item.metadata,
+                 item.valueChanged, item.newAdded) = fields
+                item.forgetPath()
+            if children is not None:
+                child_items, item.pendingChildren, item.pendingRow = children
+                item.childItems = list(child_items) if child_items else EMPTY_CHILDREN
+                item.validRows = 0
+                for child in child_items:
+                    child.parentItem = item
+                    child.forgetPath()
+            restored.append(item)
+        # restored items may sit below clean ancestors again, so the dirty
+        # path is marked up to the root whatever is already dirty on it,
+        # and the digests on it are dropped
+        marked = set()
+        for item in restored:
+            while item is not None and item not in marked:
+                marked.add(item)
+                item.dirty = True
+                item.digest = None
+                item = item.parentItem
+        return restored
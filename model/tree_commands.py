@@ -0,0 +1,101 @@
+"""
+Undo commands for tree edits
+
+Every edit of the tree is pushed on the model's undo stack as one of these
+commands. A command keeps only the delta: the old and new value of a field,
+or the parent and row an item was inserted at, removed from or moved
+between. A removed subtree is kept by reference, so undoing a delete puts
+the same items back instead of building them again. The model only
+detaches it, and its index entries and issues wait for the undo until the
+stack deletes the command.
+
+"""
+
+from PyQt5 import QtWidgets
+
+
+class SetFieldCommand(QtWidgets.QUndoCommand):
+    labels = {'title': "Rename", 'varId': "Change VarId", 'dataType': "Change data type",
+              'sources': "Change sources", 'metadata': "Change metadata"}
+
+    def __init__(self, tree_model, item, field, value):
+        super().__init__(self.labels[field])
+        self.tree_model = tree_model
+        self.item = item
+        self.field = field
+        self.old_value = tree_model.get_field(item, field)
+        self.new_value = value
+        # the view marks edited items, the marks go back and forth with the edit
+        self.old_flags = (item.valueChanged, item.newAdded)
+        self.new_flags = None
+
+    def redo(self):
+        self.tree_model.apply_field(self.item, self.field, self.new_value)
+        if self.new_flags is not None:
+            self.item.valueChanged, self.item.newAdded = self.new_flags
+
+    def undo(self):
+        self.new_flags = (self.item.valueChanged, self.item.newAdded)
+        self.tree_model.apply_field(self.item, self.field, self.old_value)
+        self.item.valueChanged, self.item.newAdded = self.old_flags
+
+
+class InsertItemCommand(QtWidgets.QUndoCommand):
+
+    def __init__(self, tree_model, parent_item, row, item):
+        super().__init__("Add " + str(item.data()))
+        self.tree_model = tree_model
+        self.parent_item = parent_item
+        self.row = row
+        self.item = item
+
+    def redo(self):
+        self.tree_model.apply_insert(self.parent_item, self.row, self.item)
+
+    def undo(self):
+        self.tree_model.apply_remove(self.parent_item, self.row, self)
+
+
+class RemoveItemCommand(QtWidgets.QUndoCommand):
+
+    def __init__(self, tree_model, parent_item, row):
+        self.item = parent_item.child(row)
+        super().__init__("Delete " + str(self.item.data()))
+        self.tree_model = tree_model
+        self.parent_item = parent_item
+        self.row = row
+
+    def redo(self):
+        self.tree_model.apply_remove(self.parent_item, self.row, self)
+
+    def undo(self):
+        self.tree_model.apply_insert(self.parent_item, self.row, self.item)
+
+
+class MoveRowsCommand(QtWidgets.QUndoCommand):
+
+    def __init__(self, tree_model, source_parent_item, source_row, count, target_parent_item, target_row):
+        super().__init__("Move")
+        self.tree_model = tree_model
+        self.source_parent_item = source_parent_item
+        self.source_row = source_row
+        self.count = count
+        self.target_parent_item = target_parent_item
+        self.target_row = target_row
+        self.first_item = source_parent_item.child(source_row)
+        self.moved = False
+
+    def redo(self):
+        self.moved = self.tree_model.apply_move(self.source_parent_item, self.source_row, self.count,
+                                                self.target_parent_item, self.target_row)
+        if not self.moved:
+            # refused by Qt, the stack drops the command
+            self.setObsolete(True)
+
+    def undo(self):
+        row = self.first_item.childNumber()
+        # the destination row counts the moved rows while they are still there
+        back_row = self.source_row
+        if self.source_parent_item is self.target_parent_item and self.source_row > row:
+            back_row += self.count
+        self.tree_model.apply_move(self.target_parent_item, row, self.count, self.source_parent_item, back_row)
@@ -0,0 +1,301 @@
+"""
+Tree diff
+
+Lists what changed between the tree as loaded (or last saved) and the tree
+as edited: items added, removed or moved, and titles, varIds, data types,
+sources and metadata edited. Items are matched with hash maps, by identity
+when both sides hold the same TreeItem or raw json, otherwise by varId (by
+parent and title for items without one), so the diff is linear in the
+number of items it looks at.
+
+Against the baseline only the items with a record and their ancestors are
+opened: any other item holds the same subtree on both sides, so it is
+compared as a whole and its descendants are never visited.
+
+"""
+
+import gc
+import threading
+from contextlib import contextmanager
+
+from model.tree_item import TreeItem
+
+ADDED = 'added'
+REMOVED = 'removed'
+MOVED = 'moved'
+FIELDS = ('title', 'varId', 'dataType', 'sources', 'metadata')
+
+# collector_paused calls in progress, and the collector state before them
+_pause_lock = threading.Lock()
+_paused = 0
+_was_enabled = True
+
+
+class TreeChange(object):
+    __slots__ = ('kind', 'path', 'varId', 'old', 'new')
+
+    def __init__(self, kind, path, var_id, old=None, new=None):
+        # kind is ADDED, REMOVED, MOVED or the name of the edited field
+        self.kind = kind
+        self.path = path
+        self.varId = var_id
+        self.old = old
+        self.new = new
+
+    def to_dict(self):
+        return {"change": self.kind, "path": self.path, "varId": self.varId, "old": self.old, "new": self.new}
+
+
+def diff_baseline(root_item, baseline):
+    """
+    Changes made to the tree below root_item since the baseline was taken.
+    """
+    with collector_paused():
+        return _diff_baseline(root_item, baseline)
+
+
+@contextmanager
+def collector_paused():
+    # the records are millions of small tuples next to millions of items,
+    # the cyclic collector would rescan the tree many times over for none
+    # of them to be garbage. The switch is for the whole process: pauses
+    # are counted and the last one to end turns the collector back on.
+    # The validation worker runs with it; the compare worker pauses it
+    # while it holds the raw json of a file
+    global _paused, _was_enabled
+    with _pause_lock:
+        if not _paused:
+            _was_enabled = gc.isenabled()
+            gc.disable()
+        _paused += 1
+    try:
+        yield
+    finally:
+        with _pause_lock:
+            _paused -= 1
+            if not _paused and _was_enabled:
+                gc.enable()
+
+
+def _diff_baseline(root_item, baseline):
+    touched = baseline.touched()
+    if root_item not in touched:
+        return []
+    # raw json loaded since is opened where its item is, attached or not
+    expanded = set()
+    for item in touched:
+        expanded.add(_key(_item_fields(item)))
+        record = baseline.fields.get(item)
+        if record is not None:
+            expanded.add(_key(_record_fields(record)))
+
+    def new_node(node):
+        if type(node) is not TreeItem:
+            return _raw_fields(node), None
+        if node not in touched:
+            return _item_fields(node), None
+        return _item_fields(node), _children(node.childItems, node.pendingChildren, node.pendingRow)
+
+    def old_node(node):
+        if type(node) is not TreeItem:
+            fields = _raw_fields(node)
+            return fields, (_raw_children(node) if _key(fields) in expanded else None)
+        record = baseline.fields.get(node)
+        fields = _item_fields(node) if record is None else _record_fields(record)
+        if node not in touched:
+            return fields, None
+        record = baseline.children.get(node)
+        if record is None:
+            return fields, _children(node.childItems, node.pendingChildren, node.pendingRow)
+        return fields, _children(*record)
+
+    new = _walk(_children(root_item.childItems, root_item.pendingChildren, root_item.pendingRow), new_node)
+    record = baseline.children.get(root_item)
+    old_roots = _children(*record) if record is not None else _children(root_item.childItems,
+                                                                         root_item.pendingChildren,
+                                                                         root_item.pendingRow)
+    return _compare(_walk(old_roots, old_node), new)
+
+
+def _item_fields(item):
+    # empty sources and metadata compare equal whatever their container
+    return item.itemData, item.varId, item.dataType, item.sources or None, item.metadata or None
+
+
+def _record_fields(record):
+    return record[0], record[1], record[2], record[3] or None, record[4] or None
+
+
+def _raw_fields(data):
+    return (data["title"], data.get("varId"), data.get("dataType") or None,
+            data.get("sources") or None, data.get("metadata") or None)
+
+
+def _key(fields):
+    return fields[1] if fields[1] is not None else (None, fields[0])
+
+
+def _children(child_items, pending_children, pending_row):
+    if not pending_children or pending_row >= len(pending_children):
+        return child_items
+    return list(child_items) + [data for data in pending_children[pending_row:] if len(data)]
+
+
+def _raw_children(data):
+    return [child for child in data.get("children") or () if len(child)]
+
+
+def _walk(roots, expand):
+    # preorder records (node, parent record, row, fields); expand returns
+    # the fields of a node and its children, None to compare it as a whole
+    records = []
+    stack = [(roots[row], -1, row) for row in range(len(roots) - 1, -1, -1)]
+    while stack:
+        node, parent, row = stack.pop()
+        fields, children = expand(node)
+        index = len(records)
+        records.append((node, parent, row, fields))
+        if children:
+            for row in range(len(children) - 1, -1, -1):
+                stack.append((children[row], index, row))
+    return records
+
+
+def _match(old, new):
+    # new record -> old record or -1
+    matches = [-1] * len(new)
+    taken = bytearray(len(old))
+    by_node = {id(record[0]): index for index, record in enumerate(old)}
+    rest = []
+    for index, record in enumerate(new):
+        match = by_node.get(id(record[0]))
+        if match is None or taken[match]:
+            rest.append(index)
+        else:
+            matches[index] = match
+            taken[match] = 1
+    del by_node
+    if not rest:
+        return matches, taken
+    by_key = {}
+    for index in range(len(old) - 1, -1, -1):
+        if not taken[index]:
+            node, parent, row, fields = old[index]
+            key = fields[1] if fields[1] is not None else (parent, fields[0])
+            by_key.setdefault(key, []).append(index)
+    # rest is in preorder, so the parents are matched before their children
+    for index in rest:
+        node, parent, row, fields = new[index]
+        key = fields[1] if fields[1] is not None else (matches[parent] if parent >= 0 else -1, fields[0])
+        candidates = by_key.get(key)
+        if candidates:
+            match = candidates.pop()
+            matches[index] = match
+            taken[match] = 1
+    return matches, taken
+
+
+def _compare(old, new):
+    matches, taken = _match(old, new)
+    changes = []
+    # new parent -> [(old row, new record)] of the children that stayed in it
+    stayed = {}
+    for index, (node, parent, row, fields) in enumerate(new):
+        match = matches[index]
+        if match < 0:
+            if parent < 0 or matches[parent] >= 0:
+                changes.append(TreeChange(ADDED, _path(new, index), fields[1]))
+            continue
+        old_fields = old[match][3]
+        for position, field in enumerate(FIELDS):
+            value = fields[position]
+            old_value = old_fields[position]
+            if value is not old_value and value != old_value:
+                changes.append(TreeChange(field, _path(new, index), fields[1], _plain(old_value), _plain(value)))
+        old_parent, old_row = old[match][1:3]
+        new_parent = -1 if parent < 0 else (matches[parent] if matches[parent] >= 0 else -2)
+        if new_parent != old_parent:
+            changes.append(_moved(old, new, match, index))
+        else:
+            stayed.setdefault(parent, []).append((old_row, index))
+    # siblings keep their order unless they are outside the longest
+    # increasing run of their old rows
+    for siblings in stayed.values():
+        if len(siblings) > 1 and not _in_order(siblings):
+            kept = _increasing(siblings)
+            for old_row, index in siblings:
+                if index not in kept:
+                    changes.append(_moved(old, new, matches[index], index))
+    for index in range(len(old)):
+        if not taken[index]:
+            parent = old[index][1]
+            if parent < 0 or taken[parent]:
+                changes.append(TreeChange(REMOVED, _path(old, index), old[index][3][1]))
+    return changes
+
+
+def _moved(old, new, old_index, new_index):
+    return TreeChange(MOVED, _path(new, new_index), new[new_index][3][1],
+                      _position(old, old_index), _position(new, new_index))
+
+
+def _in_order(siblings):
+    previous = -1
+    for old_row, index in siblings:
+        if old_row < previous:
+            return False
+        previous = old_row
+    return True
+
+
+def _increasing(siblings):
+    # new records of the longest run of siblings whose old rows increase
+    tails = []
+    tail_rows = []
+    previous = [-1] * len(siblings)
+    for position, (old_row, index) in enumerate(siblings):
+        low, high = 0, len(tail_rows)
+        while low < high:
+            middle = (low + high) // 2
+            if tail_rows[middle] < old_row:
+                low = middle + 1
+            else:
+                high = middle
+        if low:
+            previous[position] = tails[low - 1]
+        if low == len(tails):
+            tails.append(position)
+            tail_rows.append(old_row)
+        else:
+            tails[low] = position
+            tail_rows[low] = old_row
+    kept = set()
+    position = tails[-1]
+    while position >= 0:
+        kept.add(siblings[position][1])
+        position = previous[position]
+    return kept
+
+
+def _path(records, index):
+    path = []
+    while index >= 0:
+        path.append(records[index][3][0])
+        index = records[index][1]
+    return '/' + '/'.join(str(title) for title in reversed(path))
+
+
+def _position(records, index):
+    parent = records[index][1]
+    return "{}[{}]".format(_path(records, parent) if parent >= 0 else '/', records[index][2])
+
+
+def _plain(value):
+    # json friendly copies of shared containers
+    if value is None or isinstance(value, str):
+        return value
+    if hasattr(value, 'keys'):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return value
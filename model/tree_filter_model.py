@@ -0,0 +1,113 @@
+"""
+Search filter between TreeModel and TreeView
+
+Shows the matches with their whole subtrees and the folders leading to
+them. The sets come precomputed from the search worker, so the proxy is
+left non-recursive: it only asks about the children of rows it shows, and
+a filter change is a single invalidate instead of a call per row.
+
+"""
+
+from PyQt5 import QtCore
+
+
+class TreeFilterModel(QtCore.QSortFilterProxyModel):
+
+    def __init__(self, tree_model):
+        QtCore.QSortFilterProxyModel.__init__(self)
+        self.tree_model = tree_model
+        self.matches = set()
+        self.ancestors = set()
+        # ancestors of matches whose other children are filtered out
+        self.filtered_parents = set()
+        # connected first so it runs before the proxy filters the new rows
+        tree_model.rowsInserted.connect(self._rows_inserted)
+        tree_model.rowsMoved.connect(self._rows_moved)
+
+    def set_filter(self, matches, ancestors, filtered_parents):
+        self.matches = matches
+        self.ancestors = ancestors
+        self.filtered_parents = filtered_parents
+        if matches or not filtered_parents:
+            if self.sourceModel() is None:
+                # a new source is mapped afresh, nothing to invalidate
+                self._attach()
+            else:
+                self.invalidate()
+        else:
+            # nothing matches, the proxy is left empty instead of asking
+            # about every root row
+            self.setSourceModel(None)
+
+    def _attach(self):
+        if self.sourceModel() is None:
+            self.setSourceModel(self.tree_model)
+
+    def clear_filter(self):
+        # the source is let go, a proxy out of the view would map the root
+        # rows again on every insert there
+        self.matches = set()
+        self.ancestors = set()
+        self.filtered_parents = set()
+        self.setSourceModel(None)
+
+    def reveal(self, item):
+        # item and the folders leading to it stay visible until the next search
+        if not self.filtered_parents:
+            return
+        if self.sourceModel() is not None and self.index_of(item).isValid():
+            return
+        self.matches.add(item)
+        parent = item.parent()
+        while parent is not None:
+            self.ancestors.add(parent)
+            parent = parent.parent()
+        if self.sourceModel() is None:
+            self.setSourceModel(self.tree_model)
+        else:
+            self.invalidateFilter()
+
+    def index_of(self, item):
+        return self.mapFromSource(self.tree_model.index_of(item))
+
+    def _rows_inserted(self, parent, first, last):
+        # rows added while a search is shown stay visible until the next
+        # one; fetched rows were there already, the search saw them
+        if self.filtered_parents and not self.tree_model.fetching():
+            parent_item = self.tree_model.get_item(parent)
+            for row in range(first, last + 1):
+                self.matches.add(parent_item.child(row))
+            self._attach()
+
+    def _rows_moved(self, parent, first, last, destination, row):
+        if parent == destination and row > last:
+            row -= last - first + 1
+        self._rows_inserted(destination, row, row + last - first)
+
+    # inherited Method
+    def canFetchMore(self, parent):
+        # the rows a filtered parent would fetch stay hidden, the search
+        # fetched the ones that match
+        if self.tree_model.get_item(self.mapToSource(parent)) in self.filtered_parents:
+            return False
+        return QtCore.QSortFilterProxyModel.canFetchMore(self, parent)
+
+    # inherited Method
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        # the view asks for every row it lays out, the base class would map
+        # all the children of the row to answer; a filtered parent leads to
+        # a match, the other rows keep all of their children
+        if not parent.isValid() or self.sourceModel() is None:
+            return QtCore.QSortFilterProxyModel.hasChildren(self, parent)
+        source_parent = self.mapToSource(parent)
+        if source_parent.internalPointer() in self.filtered_parents:
+            return True
+        return self.tree_model.hasChildren(source_parent)
+
+    # inherited Method
+    def filterAcceptsRow(self, source_row, source_parent):
+        parent_item = source_parent.internalPointer() if source_parent.isValid() else self.tree_model.root_item
+        if parent_item not in self.filtered_parents:
+            return True
+        item = parent_item.child(source_row)
+        return item in self.matches or item in self.ancestors
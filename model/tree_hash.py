@@ -0,0 +1,322 @@
+"""
+Merkle digests of subtrees
+
+The digest of an item covers its title, varId, data type, sources and
+metadata and the digests of its children, loaded or still raw json, so two
+subtrees have the same digest when they hold the same content wherever
+they are. Empty sources and metadata are the same as none, and metadata
+keys are hashed sorted, as the diff compares them.
+
+Items keep their digest until they or a descendant change: markDirty drops
+it along the ancestor path, so after an edit only that path is hashed
+again. Raw json has no place to keep one and is hashed on each call.
+
+The digests answer whether a subtree differs from the load or the last
+save (is_modified), and which branches differ from a schema file
+(compare_schema, run by the compare worker).
+
+"""
+
+import hashlib
+import json
+
+from model.path_index import PathIndex
+from model.tree_item import TreeItem
+
+DIGEST_SIZE = 16
+
+_encode = json.JSONEncoder(sort_keys=True, separators=(',', ':')).encode
+
+
+def item_digest(item):
+    """
+    Digest of the subtree of item: its fields and the digests of its
+    children, loaded or raw. Items keep theirs until markDirty drops it, so
+    only the ones without a digest are hashed.
+    """
+    digests = {}
+    digest = _item_digest(item, {}, digests, None)
+    install_digests(digests)
+    return digest
+
+
+def install_digests(digests):
+    """
+    Keeps on the items the digests hashed by compare_schema, children
+    first. A row fetched since has none, so its parent does not get one
+    either: an item with a digest only has descendants with one, which is
+    what lets markDirty stop early.
+    """
+    for item, digest in digests.items():
+        if item.digest is None and all(child.digest is not None for child in item.childItems):
+            item.digest = digest
+
+
+def data_digest(data, memo=None):
+    # the digest of raw json, equal to item_digest of the same item once loaded
+    if memo is None:
+        memo = {}
+    stack = [(data, False)]
+    while stack:
+        node, ready = stack.pop()
+        if ready:
+            memo[id(node)] = _digest(_data_fields(node), [memo[id(child)] for child in _data_children(node)])
+            continue
+        stack.append((node, True))
+        for child in _data_children(node):
+            if id(child) not in memo:
+                stack.append((child, False))
+    return memo[id(data)]
+
+
+def is_modified(item, baseline):
+    """
+    Whether the subtree of item holds other content than in the baseline;
+    edits undone by hand or by undo leave it unmodified.
+
+    Only the items with a baseline record and their ancestors are hashed
+    on both sides, from the tree and from the records. A subtree left
+    alone that is on both sides gets the same stand-in there instead of
+    its digest, so the cost follows the edits rather than the tree; only
+    what is on one side alone, such as removed, new or fetched rows, is
+    hashed.
+    """
+    touched = baseline.touched()
+    if item not in touched:
+        return False
+    current = _touched_children(item, touched, _item_children)
+    original = _touched_children(item, touched, lambda node: _original_children(node, baseline))
+    shared = _untouched(current, touched) & _untouched(original, touched)
+
+    def original_fields(node):
+        record = baseline.fields.get(node)
+        return _item_fields(node) if record is None else _encode_fields(*record[:5])
+
+    return (_touched_digest(item, current, _item_fields, shared) !=
+            _touched_digest(item, original, original_fields, shared))
+
+
+def compare_schema(root_item, nodes, path='', digests=None, lock=None):
+    """
+    Paths that differ between the tree of root_item and the schema nodes
+    (raw json), only below path when one is given. The path itself is
+    listed when it is on one side only, None is returned when it is on
+    neither.
+
+    Nothing is written to the items, so this may run in another thread:
+    the digests of the items hashed go to digests, for install_digests,
+    and the rows of an item are read under lock while the GUI thread
+    fetches.
+    """
+    memo = {}
+    if digests is None:
+        digests = {}
+    if not path:
+        return differing_branches(nodes, _node_children(root_item, lock), '', memo, digests, lock)
+    old = node_at(nodes, path)
+    new = node_at(_node_children(root_item, lock), path, lock)
+    if old is None and new is None:
+        return None
+    if old is None or new is None:
+        return [path]
+    if _node_digest(old, memo, digests, lock) == _node_digest(new, memo, digests, lock):
+        return []
+    branches = differing_branches(_node_children(old), _node_children(new, lock), path, memo, digests, lock)
+    if _node_fields(old) != _node_fields(new):
+        branches.insert(0, path)
+    return branches
+
+
+def node_at(nodes, path, lock=None):
+    """
+    The item or raw json at path below the list nodes, trying every node
+    with the title of each level in turn, or None.
+    """
+    titles = PathIndex.split(path)
+    if titles is None:
+        return None
+    stack = [(node, 0) for node in reversed(nodes) if type(node) is TreeItem or len(node)]
+    while stack:
+        node, depth = stack.pop()
+        if str(_title(node)) != titles[depth]:
+            continue
+        if depth == len(titles) - 1:
+            return node
+        stack.extend((child, depth + 1) for child in reversed(_node_children(node, lock)))
+    return None
+
+
+def differing_branches(old_nodes, new_nodes, path='', memo=None, digests=None, lock=None):
+    """
+    Paths of the items that differ between two lists of items or raw json,
+    e.g. the children of the same folder in two schemas, below path. Items
+    are paired by varId (by title without one) and pairs with the same
+    digest are skipped whole. An item is listed when it has no pair, or
+    when its own fields or the keys of its children differ; only the pairs
+    that differ are opened.
+    """
+    if memo is None:
+        memo = {}
+    if digests is None:
+        digests = {}
+    branches = []
+    stack = [(path, old_nodes, new_nodes)]
+    while stack:
+        path, old_nodes, new_nodes = stack.pop()
+        unpaired = {}
+        for node in old_nodes:
+            unpaired.setdefault(_pair_key(node), []).append(node)
+        for keys in unpaired.values():
+            keys.reverse()
+        for node in new_nodes:
+            node_path = path + '/' + str(_title(node))
+            candidates = unpaired.get(_pair_key(node))
+            if not candidates:
+                branches.append(node_path)
+                continue
+            old = candidates.pop()
+            if _node_digest(old, memo, digests, lock) == _node_digest(node, memo, digests, lock):
+                continue
+            old_children, children = _node_children(old, lock), _node_children(node, lock)
+            if (_node_fields(old) != _node_fields(node) or
+                    [_pair_key(child) for child in old_children] != [_pair_key(child) for child in children]):
+                branches.append(node_path)
+            stack.append((node_path, old_children, children))
+        for candidates in unpaired.values():
+            for node in candidates:
+                branches.append(path + '/' + str(_title(node)))
+    return branches
+
+
+def _item_digest(item, memo, digests, lock):
+    # hashes the items of the subtree without a digest into digests,
+    # children first
+    stack = [(item, None)]
+    while stack:
+        node, children = stack.pop()
+        if node.digest is not None or node in digests:
+            continue
+        if children is None:
+            children = _node_children(node, lock)
+            stack.append((node, children))
+            stack.extend((child, None) for child in children if type(child) is TreeItem)
+            continue
+        digests[node] = _digest(_item_fields(node), [_node_digest(child, memo, digests, lock) for child in children])
+    return item.digest or digests[item]
+
+
+def _digest(fields, child_digests):
+    digest = hashlib.blake2b(fields, digest_size=DIGEST_SIZE)
+    for child_digest in child_digests:
+        digest.update(child_digest)
+    return digest.digest()
+
+
+def _encode_fields(title, var_id, data_type, sources, metadata):
+    # empty sources and metadata are the same as none; the json array
+    # closes before the fixed size child digests start
+    return _encode([title, var_id, data_type or None, sources or None, metadata or None]).encode()
+
+
+def _item_fields(item):
+    return _encode_fields(item.itemData, item.varId, item.dataType, item.sources, item.metadata)
+
+
+def _data_fields(data):
+    return _encode_fields(data["title"], data.get("varId"), data.get("dataType"),
+                          data.get("sources"), data.get("metadata"))
+
+
+def _data_children(data):
+    return [child for child in data.get("children") or () if len(child)]
+
+
+def _original_children(item, baseline):
+    record = baseline.children.get(item)
+    if record is None:
+        return _item_children(item)
+    child_items, pending_children, pending_row = record
+    children = list(child_items)
+    if pending_children:
+        children.extend(data for data in pending_children[pending_row:] if len(data))
+    return children
+
+
+def _touched_children(item, touched, children_of):
+    # touched item -> its children, on one side, for the touched subtree of item
+    children = {}
+    stack = [item]
+    while stack:
+        node = stack.pop()
+        children[node] = node_children = children_of(node)
+        stack.extend(child for child in node_children if type(child) is TreeItem and child in touched)
+    return children
+
+
+def _untouched(children, touched):
+    return {id(child) for node_children in children.values() for child in node_children
+            if type(child) is not TreeItem or child not in touched}
+
+
+def _touched_digest(item, children, fields_of, shared):
+    memo = {}
+    digests = {}
+    stack = [(item, False)]
+    while stack:
+        node, ready = stack.pop()
+        if not ready:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children[node] if type(child) is TreeItem and child in children)
+            continue
+        child_digests = []
+        for child in children[node]:
+            if type(child) is TreeItem and child in children:
+                child_digests.append(digests[child])
+            elif id(child) in shared:
+                # the same subtree on both sides, whatever it holds
+                child_digests.append(id(child).to_bytes(DIGEST_SIZE, 'little'))
+            elif type(child) is TreeItem:
+                child_digests.append(item_digest(child))
+            else:
+                child_digests.append(data_digest(child, memo))
+        digests[node] = _digest(fields_of(node), child_digests)
+    return digests[item]
+
+
+def _node_digest(node, memo, digests, lock):
+    if type(node) is TreeItem:
+        return node.digest or digests.get(node) or _item_digest(node, memo, digests, lock)
+    return memo.get(id(node)) or data_digest(node, memo)
+
+
+def _node_fields(node):
+    if type(node) is TreeItem:
+        return _item_fields(node)
+    return _data_fields(node)
+
+
+def _node_children(node, lock=None):
+    if type(node) is not TreeItem:
+        return _data_children(node)
+    if lock is None or node.pendingChildren is None:
+        return _item_children(node)
+    # a fetch moves rows from the raw children to the items
+    with lock:
+        return _item_children(node)
+
+
+def _item_children(item):
+    children = list(item.childItems)
+    if item.hasPendingChildren():
+        children.extend(data for data in item.pendingChildren[item.pendingRow:] if len(data))
+    return children
+
+
+def _title(node):
+    return node.itemData if type(node) is TreeItem else node["title"]
+
+
+def _pair_key(node):
+    var_id = node.varId if type(node) is TreeItem else node.get("varId")
+    return var_id if var_id is not None else (None, _title(node))
+
@@ -1,11 +1,34 @@
+import sys
 import traceback
+from types import MappingProxyType
+
+# shared read-only placeholders for leaves and for items without
+# sources/metadata, all of them are replaced (never mutated) on write
+EMPTY_CHILDREN = ()
+EMPTY_SOURCES = ()
+EMPTY_METADATA = MappingProxyType({})
 
 
 class TreeItem(object):
+    # every slot costs 8 B on each item. fragment, digest and path get one
+    # each: a save fills fragment on every item and a compare fills digest,
+    # so a shared side object for the three (80 B once set) would cost more
+    # than the 16 B it saves on items that have none yet
+    __slots__ =('parentItem', 'childItems', 'row', 'validRows', 'pendingChildren', 'pendingRow', 'varId',
+                 'dataType', 'sources', 'metadata', 'itemData', 'valueChanged', 'newAdded', 'dirty', 'fragment', 'digest',
+                 'path')
 
     def __init__(self, data, parent=None):
         self.parentItem = parent
-        self.childItems = []
+        self.childItems = EMPTY_CHILDREN
+        # row of this item inside parentItem.childItems, valid while
+        # it is below the parent's validRows watermark
+        self.row = 0
+        self.validRows = 0
+        # raw json of children not converted to items yet (lazy loading),
+        # the ones before pendingRow are already in childItems
+        self.pendingChildren = None
+        self.pendingRow = 0
         self.varId = None
         self.dataType = None
         self.sources = None
@@ -13,18 +36,49 @@ class TreeItem(object):
         self.itemData = None
         self.valueChanged = False
         self.newAdded = False
-        self.isHidden = True
+        # dirty: the item or something below it changed since its json
+        # fragment was cached; the ancestors of a dirty item are dirty too
+        self.dirty = True
+        self.fragment = None
+        # merkle digest of the subtree (tree_hash), None until computed; an
+        # item with a digest only has descendants with one
+        self.digest = None
+        # absolute path, None until fullPath computes it from the parent's;
+        # an item with a path only has ancestors (but the root) with one
+        self.path = None
 
         if data is not None:
             self.itemData = data["title"]
             self.varId = (data["varId"] if 'varId' in data else None)
-            self.dataType = (data["dataType"] if 'dataType' in data else None)
-            self.sources = (data["sources"] if 'sources' in data else [])
-            self.metadata = (data["metadata"] if 'metadata' in data else {})
+            data_type = data.get('dataType')
+            # only strings are interned, any other value is kept as loaded
+            self.dataType = (sys.intern(data_type) if isinstance(data_type, str) else data_type)
+            self.sources = data.get('sources') or EMPTY_SOURCES
+            self.metadata = data.get('metadata') or EMPTY_METADATA
 
     def parent(self):
         return self.parentItem
 
+    def markDirty(self):
+        # one walk for both marks: it stops at the first item that is
+        # already dirty and has no digest, nothing above it has one
+        item = self
+        while item is not None and (not item.dirty or item.digest is not None):
+            item.dirty = True
+            item.digest = None
+            item = item.parentItem
+
+    def forgetPath(self):
+        # after a rename or a move, for the descendants that have a path
+        if self.path is None and self.parentItem is not None:
+            return
+        self.path = None
+        stack = [child for child in self.childItems if child.path is not None]
+        while stack:
+            item = stack.pop()
+            item.path = None
+            stack.extend(child for child in item.childItems if child.path is not None)
+
     def child(self, row):
         return self.childItems[row]
 
@@ -32,15 +86,51 @@ class TreeItem(object):
         return len(self.childItems)
 
     def childNumber(self):
-        if self.parentItem != None:
-            return self.parentItem.childItems.index(self)
-        return 0
+        parent = self.parentItem
+        if parent is None:
+            return 0
+        if self.row >= parent.validRows or parent.childItems[self.row] is not self:
+            parent.updateRows()
+        return self.row
+
+    def updateRows(self):
+        # renumber the children whose rows went stale after an insert/remove,
+        # so a batch of edits costs a single pass on the next lookup
+        children = self.childItems
+        for row in range(self.validRows, len(children)):
+            children[row].row = row
+        self.validRows = len(children)
+
+    def hasPendingChildren(self):
+        return self.pendingChildren is not None and self.pendingRow < len(self.pendingChildren)
+
+    def pendingCount(self):
+        if self.pendingChildren is None:
+            return 0
+        return len(self.pendingChildren) - self.pendingRow
+
+    def setPendingChildren(self, children, row=0):
+        self.pendingChildren = children
+        self.pendingRow = row
+        self.markDirty()
+        return True
+
+    def takePendingChildren(self, count):
+        start = self.pendingRow
+        children = self.pendingChildren[start:start + count]
+        self.pendingRow = start + len(children)
+        if not self.hasPendingChildren():
+            self.pendingChildren = None
+            self.pendingRow = 0
+        return children
 
     def data(self):
         return self.itemData
 
     def setData(self, value):
         self.itemData = value
+        self.forgetPath()
+        self.markDirty()
         return True
 
     def getVarId(self):
@@ -48,6 +138,7 @@ class TreeItem(object):
 
     def setVarId(self, value):
         self.varId = value
+        self.markDirty()
         return True
 
     def getDataType(self):
@@ -55,6 +146,7 @@ class TreeItem(object):
 
     def setDataType(self, value):
         self.dataType = value
+        self.markDirty()
         return True
 
     def getSources(self):
@@ -62,6 +154,7 @@ class TreeItem(object):
 
     def setSources(self, sources):
         self.sources = sources
+        self.markDirty()
         return True
 
     def setValueChanged(self, flag):
@@ -77,6 +170,7 @@ class TreeItem(object):
 
     def setMetaData(self, metadata):
         self.metadata = metadata
+        self.markDirty()
         return True
 
     def create_new_item(self):
@@ -89,52 +183,140 @@ class TreeItem(object):
                 new_item["sources"] = self.sources
             if len(self.metadata):
                 new_item["metadata"] = self.metadata
-            if self.childCount():
+            if self.childCount() or self.hasPendingChildren():
                 new_item["children"] = []
                 for child in self.childItems:
                     new_item["children"].append(child.create_new_item())
+                if self.hasPendingChildren():
+                    for data in self.pendingChildren[self.pendingRow:]:
+                        if len(data):
+                            new_item["children"].append(TreeItem.create_new_data(data))
             return new_item
         except Exception as e:
             print("create_new_item failed: {}".format(e))
             print(traceback.format_exc())
 
-    def create_duplicate(self, parent_item):
-        try:
-            new_item = TreeItem(self.create_new_item(), parent_item)
-            if self.childCount():
-                for child in self.childItems:
-                    new_item.appendChild(child.create_duplicate(new_item))
+    @staticmethod
+    def create_new_data(data):
+        # same output as create_new_item, for raw json that was never loaded
+        new_item = {}
+        new_item["title"] = data["title"]
+        new_item["varId"] = data.get("varId")
+        new_item["dataType"] = data.get("dataType")
+        if data.get("sources"):
+            new_item["sources"] = data["sources"]
+        if data.get("metadata"):
+            new_item["metadata"] = data["metadata"]
+        if data.get("children"):
+            new_item["children"] = [TreeItem.create_new_data(child) for child in data["children"] if len(child)]
+        return new_item
 
-            return new_item
+    def create_duplicate(self, parent_item, var_id_prefix=None):
+        # a single pass over the subtree; sources, metadata and raw pending
+        # children are shared with the original since they are only ever
+        # replaced, never changed in place. With var_id_prefix every copy
+        # gets the prefixed varId and is flagged as new
+        try:
+            new_root = self._copy(parent_item, var_id_prefix)
+            stack = [(self, new_root)]
+            while stack:
+                item, new_item = stack.pop()
+                if item.childItems:
+                    new_item.childItems = []
+                    for child in item.childItems:
+                        new_child = child._copy(new_item, var_id_prefix)
+                        new_item.appendChild(new_child)
+                        stack.append((child, new_child))
+            return new_root
         except Exception as e:
             print("create_duplicate failed: {}".format(e))
             print(traceback.format_exc())
 
+    def _copy(self, parent_item, var_id_prefix):
+        new_item = TreeItem(None, parent_item)
+        new_item.itemData = self.itemData
+        new_item.varId = self.varId
+        new_item.dataType = self.dataType
+        new_item.sources = self.sources
+        new_item.metadata = self.metadata
+        if var_id_prefix is not None:
+            if self.varId is not None:
+                new_item.varId = var_id_prefix + self.varId
+            new_item.newAdded = True
+            if self.hasPendingChildren():
+                # the varIds in the raw json are prefixed too, on a copy
+                new_item.setPendingChildren(TreeItem.copy_data(self.pendingChildren[self.pendingRow:],
+                                                               var_id_prefix))
+        elif self.hasPendingChildren():
+            new_item.setPendingChildren(self.pendingChildren, self.pendingRow)
+        return new_item
+
+    @staticmethod
+    def copy_data(children, var_id_prefix):
+        # a copy of raw children with var_id_prefix before every varId; the
+        # other values are shared, they are only ever replaced
+        result = []
+        stack = [(children, result)]
+        while stack:
+            children, copies = stack.pop()
+            for data in children:
+                copy = dict(data)
+                if data.get("varId") is not None:
+                    copy["varId"] = var_id_prefix + data["varId"]
+                if data.get("children"):
+                    copy["children"] = []
+                    stack.append((data["children"], copy["children"]))
+                copies.append(copy)
+        return result
+
     def appendChild(self, item):
+        if self.childItems is EMPTY_CHILDREN:
+            self.childItems = []
+        item.row = len(self.childItems)
+        item.forgetPath()
+        if self.validRows == item.row:
+            self.validRows += 1
         self.childItems.append(item)
+        self.markDirty()
 
     def insertChild(self, position, item):
         if position > len(self.childItems):
             return False
+        if self.childItems is EMPTY_CHILDREN:
+            self.childItems = []
         self.childItems.insert(position, item)
+        item.row = position
+        item.forgetPath()
+        self.validRows = min(self.validRows, position)
+        self.markDirty()
         return True
 
     def removeChildren(self, position, count):
         if position < 0 or position + count > len(self.childItems):
             return False
-        while count > 0:
-            self.childItems.pop(position)
-            count -= 1
+        if count == 0:
+            return True
+        del self.childItems[position:position + count]
+        self.validRows = min(self.validRows, position)
+        self.markDirty()
         return True
 
     def fullPath(self):
         try:
-            path = [self.data()]
-            parent = self.parent()
-            while parent.parent() is not None:
-                path.append(parent.data())
-                parent = parent.parent()
-            return '/' + '/'.join(reversed(path))
+            if self.path is not None:
+                return self.path
+            # up to the nearest ancestor with a path, then each path is its
+            # parent's plus the title
+            items = []
+            item = self
+            while item.path is None and item.parentItem is not None:
+                items.append(item)
+                item = item.parentItem
+            path = item.path or ''
+            for item in reversed(items):
+                path = path + '/' + item.itemData
+                item.path = path
+            return path
         except Exception as e:
             print("fullPath failed: {}".format(e))
             print(traceback.format_exc())
@@ -0,0 +1,90 @@
+"""
+Background schema loading
+
+Streams the json file and builds the top-level subtrees in a worker thread,
+completed subtrees are handed to the GUI thread in chunks.
+
+"""
+
+import io
+import os
+import threading
+import time
+import traceback
+
+from PyQt5 import QtCore
+from model.json_stream_reader import JsonStreamReader
+
+
+class TreeLoader(QtCore.QObject):
+    ack_timeout = 5
+    items_loaded = QtCore.pyqtSignal(object)
+    progress = QtCore.pyqtSignal(int)
+    finished = QtCore.pyqtSignal()
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, file_path, build_item, stream_children=True, chunk_interval=0.25):
+        super().__init__()
+        self.file_path = file_path
+        self.build_item = build_item
+        # lazy models keep raw children, so only the top level is streamed
+        self.stream_children = stream_children
+        self.chunk_interval = chunk_interval
+        self._cancelled = False
+        self._chunk_processed = threading.Event()
+
+    def cancel(self):
+        # called from the GUI thread, checked by run() between top-level subtrees
+        self._cancelled = True
+        self._chunk_processed.set()
+
+    def chunk_processed(self):
+        # called from the GUI thread once a chunk is inserted and laid out
+        self._chunk_processed.set()
+
+    def _emit_chunk(self, chunk):
+        # the view lays the rows out while we wait, so the two threads do not
+        # fight for the GIL over every model callback
+        self._chunk_processed.clear()
+        self.items_loaded.emit(chunk)
+        self._chunk_processed.wait(self.ack_timeout)
+
+    def run(self):
+        try:
+            total = max(os.path.getsize(self.file_path), 1)
+            percent = 0
+            chunk = []
+            start = last_emit = last_progress = time.monotonic()
+            # decoded from a binary file, whose offset counts bytes like the
+            # file size does
+            with io.TextIOWrapper(open(self.file_path, 'rb')) as f:
+                reader = JsonStreamReader(f)
+                for item in reader.iter_items(self.build_item, self.stream_children):
+                    if self._cancelled:
+                        self.cancelled.emit()
+                        return
+                    if item is not None:
+                        chunk.append(item)
+                    # every insert makes the view lay out all root rows again, so
+                    # the interval grows with the elapsed time to keep the number
+                    # of layouts logarithmic
+                    if time.monotonic() - last_emit > max(self.chunk_interval, (last_emit - start) / 2):
+                        self._emit_chunk(chunk)
+                        chunk = []
+                        last_emit = time.monotonic()
+                    # the progress bar repaints synchronously, report whole steps only
+                    if time.monotonic() - last_progress > self.chunk_interval:
+                        last_progress = time.monotonic()
+                        if min(f.buffer.tell() * 100 // total, 100) != percent:
+                            percent = min(f.buffer.tell() * 100 // total, 100)
+                            self.progress.emit(percent)
+            if chunk:
+                self._emit_chunk(chunk)
+            self.finished.emit()
+        except ValueError as e:
+            self.failed.emit("Json TypeError: {}".format(e))
+        except Exception as e:
+            print("TreeLoader failed: {}".format(e))
+            print(traceback.format_exc())
+            self.failed.emit(str(e))
@@ -1,29 +1,574 @@
-import qtawesome as qta
-from PyQt5 import QtCore, QtGui
-from model.tree_item import TreeItem
+from PyQt5 import QtCore, QtWidgets, sip
+from model.tree_item import TreeItem, EMPTY_CHILDREN
 from model.type_manager import TypeManager
+from model.icon_cache import IconCache
+from model.search_index import SearchIndex
+from model.path_index import PathIndex
+from model.tree_baseline import TreeBaseline
+from model import tree_hash
+from model.tree_commands import SetFieldCommand, InsertItemCommand, RemoveItemCommand, MoveRowsCommand
+from model.tree_validation import TreeValidator, DUPLICATE_VAR_ID, SIBLING_TITLES
+import threading
 import traceback
 
 
 class TreeModel(QtCore.QAbstractItemModel):
     rowMoved = QtCore.pyqtSignal(object)
+    # combined once, the view asks for the flags of every row it lays out
+    item_flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled | QtCore.Qt.ItemIsEditable
+    collection_flags = item_flags | QtCore.Qt.ItemIsDropEnabled
+    primitive_flags = item_flags | QtCore.Qt.ItemNeverHasChildren
+    collection_types = frozenset(TypeManager.collections)
+    item_roles = frozenset((QtCore.Qt.DisplayRole, QtCore.Qt.DecorationRole, QtCore.Qt.ForegroundRole))
+    field_setters = {'title': TreeItem.setData, 'varId': TreeItem.setVarId, 'dataType': TreeItem.setDataType,
+                     'sources': TreeItem.setSources, 'metadata': TreeItem.setMetaData}
 
-    def __init__(self):
+    def __init__(self, lazy=False, fetch_batch_size=256):
         QtCore.QAbstractItemModel.__init__(self)
         self.root_item = TreeItem({"title": "root"})
+        # in lazy mode children stay as raw json until the view asks for them
+        self.lazy = lazy
+        self.fetch_batch_size = fetch_batch_size
+        self._fetching = False
+        # held while a fetch moves raw rows onto items, for the threads
+        # that read the rows of an item meanwhile
+        self.rows_lock = threading.RLock()
+        self.search_index = SearchIndex()
+        self.path_index = PathIndex()
+        # bumped by every change to the content of the tree, fetches aside,
+        # so that work done in another thread can tell it went stale
+        self.edits = 0
+        # edits since the load or the last save, for revert
+        self.baseline = TreeBaseline()
+        # every edit goes through a command on this stack
+        self.undo_stack = QtWidgets.QUndoStack()
+        # root of a subtree taken out by a command -> the command, which
+        # may put it back; its index entries and issues are kept until the
+        # stack deletes the command
+        self.detached = {}
+        self.undo_stack.indexChanged.connect(self._release_detached)
+        # schema issues, checked again along the edits
+        self.validator = TreeValidator(self)
+        IconCache.warm()
+
+    def set_lazy(self, lazy):
+        # the mode of the next load, only while the model is empty
+        if self.root_item.childCount() or self.root_item.hasPendingChildren():
+            return False
+        self.lazy = lazy
+        return True
 
     def load_data(self, data):
+        self.edits += 1
+        if self.lazy:
+            self.root_item.setPendingChildren(data)
+            self.search_index.var_id_index.add_pending(self.root_item)
+            self.fetchMore(QtCore.QModelIndex())
+            return
+        self.beginResetModel()
         for element in data:
             self.create_tree(element, self.root_item)
+        for item in self.root_item.childItems:
+            self.search_index.add_subtree(item)
+        self.endResetModel()
 
     def create_tree(self, data, parent_item):
         if len(data) == 0:
             return
-        new_item = TreeItem(data, parent_item)
+        new_item = self.build_item(data)
+        new_item.parentItem = parent_item
         parent_item.appendChild(new_item)
-        if 'children' in data:
-            for element in data["children"]:
-                self.create_tree(element, new_item)
+
+    def build_item(self, data, children=None):
+        # builds a detached subtree, safe to call from the loader thread;
+        # children may come already built from the streaming reader
+        if len(data) == 0:
+            return None
+        new_item = TreeItem(data)
+        if children is not None:
+            for child in children:
+                if child is not None:
+                    child.parentItem = new_item
+                    new_item.appendChild(child)
+        elif 'children' in data:
+            if self.lazy:
+                new_item.setPendingChildren(data["children"])
+            else:
+                for element in data["children"]:
+                    self.create_tree(element, new_item)
+        return new_item
+
+    def append_items(self, items):
+        # attaches subtrees built by build_item under the root
+        if not items:
+            return
+        self.edits += 1
+        first = self.root_item.childCount()
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(items) - 1)
+        for item in items:
+            item.parentItem = self.root_item
+            self.root_item.appendChild(item)
+            self.search_index.add_subtree(item)
+        self.path_index.forget(self.root_item)
+        self.baseline.loaded(self.root_item, items)
+        self.validator.inserted(self.root_item, items)
+        self.endInsertRows()
+
+    def clear(self):
+        self.edits += 1
+        self.beginResetModel()
+        self.root_item.removeChildren(0, self.root_item.childCount())
+        self.root_item.setPendingChildren(None)
+        self.search_index.clear()
+        self.path_index.clear()
+        self.validator.clear()
+        self.baseline.clear()
+        self.detached = {}
+        self.undo_stack.clear()
+        self.endResetModel()
+
+    def fetch_remaining(self, parent=QtCore.QModelIndex()):
+        # materialize every direct child of parent, e.g. before appending to it
+        item = self.get_item(parent)
+        if item.hasPendingChildren():
+            self._fetch(parent, item, item.pendingCount())
+
+    def fetch_rows(self, item, children, rows, built):
+        """
+        The item built from the raw json at rows below item, whose raw
+        children were children when a search found the match there. The
+        rows on the way are fetched a batch at a time at least; built maps
+        (id of the raw children, row) to the items fetched by earlier calls.
+        Only valid while the tree is not edited, None when a row is gone.
+        """
+        for row in rows:
+            child = built.get((id(children), row))
+            if child is None and item.pendingChildren is children and row >= item.pendingRow:
+                first = item.pendingRow
+                count = max(row - first + 1, self.fetch_batch_size)
+                items = iter(self._fetch(self.index_of(item), item, count))
+                for offset, data in enumerate(children[first:first + count]):
+                    if len(data):
+                        built[(id(children), first + offset)] = next(items)
+                child = built[(id(children), row)]
+            elif child is None:
+                # fetched by the view meanwhile; without an edit, fetched
+                # rows are only ever appended in the order of the raw json
+                end = item.pendingRow if item.pendingChildren is children else len(children)
+                offset = sum(1 for data in children[row:end] if len(data))
+                if not 0 < offset <= item.childCount():
+                    return None
+                child = item.childItems[-offset]
+            item, children = child, children[row].get("children")
+        return item
+
+    def fetching(self):
+        # rows inserted now come from raw json, not from an edit
+        return self._fetching
+
+    def _fetch(self, parent, item, count):
+        # views may ask for more rows from inside the insert notifications
+        self._fetching = True
+        try:
+            first = item.childCount()
+            self.baseline.record_children(item)
+            with self.rows_lock:
+                children = item.takePendingChildren(count)
+                self.beginInsertRows(parent, first, first + len(children) - 1)
+                for data in children:
+                    self.create_tree(data, item)
+            items = item.childItems[first:]
+            if item.newAdded:
+                # rows below a copy are new as well
+                for child in items:
+                    child.newAdded = True
+            self.search_index.add_loaded(item, items)
+            self.path_index.forget(item)
+            self.validator.loaded(item, children, items)
+            self.endInsertRows()
+        finally:
+            self._fetching = False
+        return items
+
+    def set_var_id(self, item, var_id):
+        # varIds are unique, a taken one is refused
+        if var_id != item.getVarId() and self.search_index.var_id_index.contains(var_id):
+            return False
+        self.undo_stack.push(SetFieldCommand(self, item, 'varId', var_id))
+        return True
+
+    def find_var_id(self, var_id):
+        var_id_index = self.search_index.var_id_index
+        if not var_id_index.find(var_id) and var_id_index.is_pending(var_id):
+            # only in raw json yet, the rows leading to it are fetched
+            item, rows = var_id_index.pending_path(var_id)
+            for row in rows:
+                self._fetch(self.index_of(item), item, row - item.pendingRow + 1)
+                item = item.childItems[-1]
+        for item in var_id_index.find(var_id):
+            return item
+        return None
+
+    def find_path(self, path):
+        # the item at an absolute path, the raw json on the way is loaded
+        titles = PathIndex.split(path)
+        if titles is None:
+            return None
+        return self._find_path(self.root_item, titles, 0)
+
+    def _find_path(self, item, titles, depth):
+        if depth == len(titles):
+            return item
+        title = titles[depth]
+        for child in self.path_index.find(item, title):
+            found = self._find_path(child, titles, depth + 1)
+            if found is not None:
+                return found
+        row = self._pending_title_row(item, title)
+        while row is not None:
+            self._fetch(self.index_of(item), item, row - item.pendingRow + 1)
+            found = self._find_path(item.childItems[-1], titles, depth + 1)
+            if found is not None:
+                return found
+            row = self._pending_title_row(item, title)
+        return None
+
+    def find_issue(self, issue):
+        # the item a validation issue is about, its raw json is loaded first
+        if issue.kind == DUPLICATE_VAR_ID:
+            return self.find_var_id(issue.value[0])
+        item, route = issue.owner, issue.route
+        if not self.contains_item(item):
+            return None
+        for data in route:
+            row = self._pending_row(item, data)
+            if row is None:
+                return None
+            self._fetch(self.index_of(item), item, row - item.pendingRow + 1)
+            item = item.childItems[-1]
+        if issue.kind == SIBLING_TITLES:
+            # the last child carrying one of the repeated titles
+            self.fetch_remaining(self.index_of(item))
+            for child in reversed(item.childItems):
+                if child.data() in issue.value:
+                    return child
+        return None if item is self.root_item else item
+
+    @staticmethod
+    def _pending_row(item, data):
+        if not item.hasPendingChildren():
+            return None
+        for row in range(item.pendingRow, len(item.pendingChildren)):
+            if item.pendingChildren[row] is data:
+                return row
+        return None
+
+    @staticmethod
+    def _pending_title_row(item, title):
+        if not item.hasPendingChildren():
+            return None
+        for row in range(item.pendingRow, len(item.pendingChildren)):
+            if item.pendingChildren[row].get("title") == title:
+                return row
+        return None
+
+    def free_var_id_prefix(self, item, prefix):
+        # a prefix under which the varIds of a copy of item are all new
+        var_ids = []
+        stack = []
+        for other in self._subtree(item):
+            if other.getVarId() is not None:
+                var_ids.append(other.getVarId())
+            if other.hasPendingChildren():
+                stack.extend(other.pendingChildren[other.pendingRow:])
+        # and the ones still in raw json
+        while stack:
+            data = stack.pop()
+            if len(data) == 0:
+                continue
+            if data.get("varId") is not None:
+                var_ids.append(data["varId"])
+            if data.get("children"):
+                stack.extend(data["children"])
+        return self.search_index.var_id_index.free_prefix(var_ids, prefix)
+
+    def set_data_type(self, item, data_type):
+        self.undo_stack.push(SetFieldCommand(self, item, 'dataType', data_type))
+
+    def set_sources(self, item, sources):
+        self.undo_stack.push(SetFieldCommand(self, item, 'sources', sources))
+
+    def set_metadata(self, item, metadata):
+        self.undo_stack.push(SetFieldCommand(self, item, 'metadata', metadata))
+
+    def insert_item(self, row, item, parent=QtCore.QModelIndex()):
+        self.undo_stack.push(InsertItemCommand(self, self.get_item(parent), row, item))
+
+    """
+    The methods below apply the edits for the undo commands
+    """
+
+    @staticmethod
+    def get_field(item, field):
+        if field == 'title':
+            return item.data()
+        return getattr(item, field)
+
+    def apply_field(self, item, field, value):
+        self.edits += 1
+        self.baseline.record_fields(item)
+        index = self.index_of(item)
+        old_value = self.get_field(item, field)
+        if field == 'title':
+            self.search_index.remove_item(item)
+            item.setData(value)
+            self.search_index.add_item(item)
+            self.path_index.forget(item.parentItem)
+            self.validator.field_changed(item, field, old_value)
+            self.dataChanged.emit(index, index)
+            return
+        self.search_index.remove_fields(item)
+        self.field_setters[field](item, value)
+        self.search_index.add_fields(item)
+        self.validator.field_changed(item, field, old_value)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole, QtCore.Qt.ForegroundRole])
+
+    def apply_insert(self, parent_item, row, item):
+        self.edits += 1
+        self.beginInsertRows(self.index_of(parent_item), row, row)
+        self.baseline.record_children(parent_item)
+        item.parentItem = parent_item
+        parent_item.insertChild(row, item)
+        if self.detached.pop(item, None) is not None:
+            # put back by an undo, nothing below it changed meanwhile
+            self.search_index.attach(item)
+        else:
+            self.search_index.add_subtree(item)
+        self.path_index.forget(parent_item)
+        self.validator.inserted(parent_item, [item])
+        self.endInsertRows()
+
+    def apply_remove(self, parent_item, row, holder):
+        # the subtree is only detached, holder is the command that keeps it
+        # for an undo
+        self.edits += 1
+        self.beginRemoveRows(self.index_of(parent_item), row, row)
+        self.baseline.record_children(parent_item)
+        item = parent_item.child(row)
+        self.search_index.detach(item)
+        self.detached[item] = holder
+        parent_item.removeChildren(row, 1)
+        self.path_index.forget(parent_item)
+        self.validator.removed(parent_item, item)
+        self.endRemoveRows()
+
+    def _release_detached(self, index):
+        # the stack deletes the commands past its index on a new edit and
+        # all of them on clear(), their subtrees can no longer come back
+        released = [item for item, holder in self.detached.items() if sip.isdeleted(holder)]
+        for item in released:
+            del self.detached[item]
+            self.search_index.release(item)
+            self.validator.release(item)
+
+    def apply_move(self, source_parent_item, source_row, count, target_parent_item, target_row):
+        # the items are re-parented in place, so a move keeps their identity
+        # and flags and costs nothing per descendant; Qt refuses moves into
+        # the moved rows themselves or onto their own position
+        if not self.beginMoveRows(self.index_of(source_parent_item), source_row, source_row + count - 1,
+                                  self.index_of(target_parent_item), target_row):
+            return False
+        self.edits += 1
+        self.baseline.record_children(source_parent_item)
+        self.baseline.record_children(target_parent_item)
+        items = source_parent_item.childItems[source_row:source_row + count]
+        source_parent_item.removeChildren(source_row, count)
+        if source_parent_item is target_parent_item and target_row > source_row:
+            target_row -= count
+        for offset, item in enumerate(items):
+            item.parentItem = target_parent_item
+            target_parent_item.insertChild(target_row + offset, item)
+        self.path_index.forget(source_parent_item)
+        self.path_index.forget(target_parent_item)
+        self.validator.moved(source_parent_item, target_parent_item, items)
+        self.endMoveRows()
+        return True
+
+    def is_modified(self, index=QtCore.QModelIndex()):
+        # whether the subtree of index differs from the load or the last
+        # save, i.e. whether a revert would change anything
+        return tree_hash.is_modified(self.get_item(index), self.baseline)
+
+    def revert(self, index=QtCore.QModelIndex()):
+        """
+        Puts the subtree of index, or the whole tree for the root, back the
+        way it was loaded or last saved, from the records of the baseline
+        instead of the file. The undo history is dropped, its commands may
+        refer to the rows put back.
+        """
+        item = self.get_item(index)
+        baseline = self.baseline
+        self.edits += 1
+        if item is self.root_item:
+            self.undo_stack.clear()
+            items = set(baseline.fields)
+            items.update(baseline.children)
+            self.beginResetModel()
+            unindexed = self._unindex(items)
+            baseline.restore(items)
+            self._reindex(unindexed)
+            self.endResetModel()
+            self.path_index.clear()
+            self.validator.invalidate()
+            return True
+        loaded = list(baseline.subtree(item))
+        loaded_items = set(loaded)
+        parent = item.parent()
+        while parent is not None:
+            if parent in loaded_items:
+                # item was moved below its own former children, they cannot
+                # go back under it
+                return False
+            parent = parent.parent()
+        self.undo_stack.clear()
+        current = self._subtree(item)
+        current_items = set(current)
+        # rows moved across the border of the subtree go back to the parent
+        # they were loaded under, which changes rows outside of it
+        displaced = [other for other in loaded[1:] if other.parentItem not in loaded_items and
+                     self.contains_item(other)]
+        moved_out = [other for other in displaced if other not in current_items]
+        for other in moved_out:
+            current.extend(self._subtree(other))
+        parents = baseline.original_parents()
+        moved_in = [other for other in current if other not in loaded_items and other in parents and
+                    parents[other] not in loaded_items and other.parentItem is not parents[other]]
+        if moved_out or moved_in:
+            self.beginResetModel()
+            unindexed = self._unindex(loaded)
+            for other in displaced:
+                self._detach(other)
+            for other in moved_in:
+                if other.parentItem not in loaded_items:
+                    self._detach(other)
+                self._attach(other, parents[other])
+            baseline.restore(loaded)
+            self._reindex(unindexed)
+            for other in moved_in:
+                if self.contains_item(other):
+                    self.search_index.add_subtree(other)
+            self.endResetModel()
+            self.path_index.clear()
+            self.validator.invalidate()
+            return True
+        # otherwise only the rows below item are replaced; views must not
+        # fetch into it between the removal and the insert
+        self._fetching = True
+        try:
+            unindexed = self._unindex(loaded)
+            baseline.record_children(item)
+            if item.childCount():
+                self.beginRemoveRows(index, 0, item.childCount() - 1)
+                item.childItems = EMPTY_CHILDREN
+                item.validRows = 0
+                self.endRemoveRows()
+            count = len(baseline.original_children(item))
+            if count:
+                self.beginInsertRows(index, 0, count - 1)
+            baseline.restore(loaded)
+            self._reindex(unindexed)
+            if count:
+                self.endInsertRows()
+        finally:
+            self._fetching = False
+        self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.DecorationRole, QtCore.Qt.ForegroundRole])
+        self.path_index.clear()
+        self.validator.invalidate()
+        return True
+
+    def _unindex(self, items):
+        # index entries of the rows and fields about to be restored
+        children = {}
+        fields = []
+        for item in items:
+            record = self.baseline.children.get(item)
+            if record is not None:
+                # raw children are counted again once restored
+                self.search_index.var_id_index.remove_pending(item)
+                # nothing below a removed item is indexed, and its children
+                # may have been put back elsewhere by an earlier revert
+                if not self.contains_item(item):
+                    children[item] = set()
+                else:
+                    original = set(record[0])
+                    children[item] = set(item.childItems)
+                    for child in item.childItems:
+                        if child not in original:
+                            self.search_index.remove_subtree(child)
+            if item in self.baseline.fields:
+                fields.append(item)
+                self.search_index.remove_item(item)
+        return children, fields
+
+    def _reindex(self, unindexed):
+        children, fields = unindexed
+        for item, previous in children.items():
+            # items created after the load may get back children that are
+            # no longer part of the tree
+            if self.contains_item(item):
+                self.search_index.var_id_index.add_pending(item)
+                for child in item.childItems:
+                    if child not in previous:
+                        self.search_index.add_subtree(child)
+        for item in fields:
+            if self.contains_item(item):
+                self.search_index.add_item(item)
+
+    def _detach(self, item):
+        parent = item.parentItem
+        self.baseline.record_children(parent)
+        parent.removeChildren(item.childNumber(), 1)
+
+    def _attach(self, item, parent):
+        # back in front of the first loaded sibling that is still there
+        self.baseline.record_children(parent)
+        siblings = self.baseline.original_children(parent)
+        row = parent.childCount()
+        for sibling in siblings[siblings.index(item) + 1:]:
+            if sibling.parentItem is parent:
+                sibling_row = sibling.childNumber()
+                if sibling_row < parent.childCount() and parent.child(sibling_row) is sibling:
+                    row = sibling_row
+                    break
+        item.parentItem = parent
+        parent.insertChild(row, item)
+
+    @staticmethod
+    def _subtree(item):
+        items = []
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            items.append(item)
+            stack.extend(item.childItems)
+        return items
+
+    def index_of(self, item):
+        if item is self.root_item or item is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(item.childNumber(), 0, item)
+
+    def contains_item(self, item):
+        # False for items removed from the tree (or from a previous load)
+        while item is not self.root_item:
+            parent = item.parent()
+            if parent is None:
+                return False
+            row = item.childNumber()
+            if row >= parent.childCount() or parent.child(row) is not item:
+                return False
+            item = parent
+        return True
 
     def get_item(self, index):
         if index.isValid():
@@ -38,11 +583,12 @@ class TreeModel(QtCore.QAbstractItemModel):
 
     # inherited Method
     def index(self, row, column, parent=QtCore.QModelIndex()):
-        if self.hasIndex(row, column, parent):
-            parent_item = self.get_item(parent)
-            child_item = parent_item.child(row)
-            if child_item is not None:
-                return self.createIndex(row, column, child_item)
+        # bounds are checked here instead of hasIndex(), which would call
+        # back into rowCount() through Qt for every index the view lays out;
+        # the filter proxy calls this for every row it maps back
+        children = (parent.internalPointer() if parent.isValid() else self.root_item).childItems
+        if column == 0 and 0 <= row < len(children):
+            return self.createIndex(row, column, children[row])
         return QtCore.QModelIndex()
 
     # inherited Method
@@ -58,40 +604,43 @@ class TreeModel(QtCore.QAbstractItemModel):
 
     # inherited Method
     def rowCount(self, parent):
-        return self.get_item(parent).childCount()
+        return len((parent.internalPointer() if parent.isValid() else self.root_item).childItems)
 
     # inherited Method
     def columnCount(self, index):
         return 1
 
+    # inherited Method
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        item = parent.internalPointer() if parent.isValid() else self.root_item
+        return len(item.childItems) > 0 or item.hasPendingChildren()
+
+    # inherited Method
+    def canFetchMore(self, parent):
+        # only lazy models hold raw children, the view asks for every row
+        return self.lazy and not self._fetching and self.get_item(parent).hasPendingChildren()
+
+    # inherited Method
+    def fetchMore(self, parent):
+        item = self.get_item(parent)
+        if not self._fetching and item.hasPendingChildren():
+            self._fetch(parent, item, self.fetch_batch_size)
+
     # inherited Method
     def data(self, index, role=QtCore.Qt.DisplayRole):
 
         try:
-            if not index.isValid():
+            # the view asks for every role of every visible cell on each
+            # paint, the ones without data are answered first
+            if role not in self.item_roles or not index.isValid():
                 return None
-            item = self.get_item(index)
-            if role == QtCore.Qt.BackgroundRole:
-                if not (item.newAdded or item.valueChanged):
-                    return None
-            elif role == QtCore.Qt.ForegroundRole:
-                if item.newAdded:
-                    return QtGui.QBrush(QtCore.Qt.darkGreen)
-                elif item.valueChanged:
-                    return QtGui.QBrush(QtCore.Qt.blue)
-                else:
-                    return None
-            elif role == QtCore.Qt.DecorationRole:
-                if item.newAdded:
-                    return qta.icon(TypeManager.type_icon_dictionary[item.getDataType()], options=[{'color': 'green'}])
-                elif item.valueChanged:
-                    return qta.icon(TypeManager.type_icon_dictionary[item.getDataType()], options=[{'color': 'blue'}])
-                else:
-                    return qta.icon(TypeManager.type_icon_dictionary[item.getDataType()], options=[{'color': 'black'}])
-            elif role == QtCore.Qt.DisplayRole:
+            item = index.internalPointer()
+            if role == QtCore.Qt.DisplayRole:
                 return item.data()
+            elif role == QtCore.Qt.DecorationRole:
+                return IconCache.type_icon(item.getDataType(), IconCache.state(item))
             else:
-                return None
+                return IconCache.brushes.get(IconCache.state(item))
         except Exception as e:
             print("data failed: {}".format(e))
             print(traceback.format_exc())
@@ -103,23 +652,20 @@ class TreeModel(QtCore.QAbstractItemModel):
             return False
         if value == "":
             return False
-        item = self.get_item(index)
-        item.setData(value)
-        self.dataChanged.emit(index, index)
+        self.undo_stack.push(SetFieldCommand(self, self.get_item(index), 'title', value))
         return True
 
     # inherited Method
-    def insertRow(self, row, parent=QtCore.QModelIndex()):
-        self.beginInsertRows(parent, row, row)
-        self.endInsertRows()
+    def removeRow(self, row, parent=QtCore.QModelIndex()):
+        self.undo_stack.push(RemoveItemCommand(self, self.get_item(parent), row))
         return True
 
     # inherited Method
-    def removeRow(self, row, parent=QtCore.QModelIndex()):
-        self.beginRemoveRows(parent, row, row)
-        self.get_item(parent).removeChildren(row, 1)
-        self.endRemoveRows()
-        return True
+    def moveRows(self, source_parent, source_row, count, destination_parent, destination_row):
+        command = MoveRowsCommand(self, self.get_item(source_parent), source_row, count,
+                                  self.get_item(destination_parent), destination_row)
+        self.undo_stack.push(command)
+        return command.moved
 
     # inherited Method
     def supportedDropActions(self):
@@ -129,11 +675,10 @@ class TreeModel(QtCore.QAbstractItemModel):
     def flags(self, index):
         if not index.isValid():
             return QtCore.Qt.ItemIsEnabled
-        gen_flags = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled | QtCore.Qt.ItemIsEditable
-        if self.get_item(index).getDataType() in TypeManager.collections:
-            return gen_flags | QtCore.Qt.ItemIsDropEnabled
+        if index.internalPointer().dataType in self.collection_types:
+            return self.collection_flags
         else:
-            return gen_flags | QtCore.Qt.ItemNeverHasChildren
+            return self.primitive_flags
 
     # inherited Method
     def mimeTypes(self):
@@ -151,18 +696,15 @@ class TreeModel(QtCore.QAbstractItemModel):
         try:
             if action != QtCore.Qt.MoveAction:
                 return False
-            target_parent_item = self.get_item(parent)
-            source_item = self.get_item(self.drag_item_index)
+            source_row = self.drag_item_index.row()
             source_parent_idx = self.drag_item_index.parent()
-            num = source_item.childNumber()
-            new_item = source_item.create_duplicate(target_parent_item)
-            self.removeRow(num, source_parent_idx)
             if row == -1:
-                target_parent_item.appendChild(new_item)
-                row = target_parent_item.childCount() - 1
-            else:
-                target_parent_item.insertChild(row, new_item)
-            self.insertRow(row, parent)
+                self.fetch_remaining(parent)
+                row = self.get_item(parent).childCount()
+            if not self.moveRow(source_parent_idx, source_row, parent, row):
+                return False
+            if parent == source_parent_idx and row > source_row:
+                row -= 1
             self.rowMoved.emit(self.index(row, 0, parent))
             return True
         except Exception as e:
@@ -0,0 +1,593 @@
+"""
+Schema validation
+
+Checks every item, loaded or still raw json, for the problems that break
+the schema downstream: an empty title, a dataType unknown to TypeManager,
+a primitive with children, a Folder with sources, children of one parent
+sharing a title and varIds used more than once.
+
+The whole tree is checked once in a worker thread (ValidationWorker).
+Afterwards each edit only checks what it touched: the edited item, the
+parents whose children changed, the varIds that came or went and the
+subtrees put in. Edits made while the worker runs are checked again once
+its issues arrive, so whatever state of the tree it saw is corrected.
+
+A removed subtree keeps its issues aside until it is put back by an undo,
+which finds the tree the way it was at the removal, or can no longer be.
+
+An issue on raw json keeps the loaded item holding it and the route of
+raw json down to it; when the rows are loaded the issue moves to the new
+item.
+
+"""
+
+from PyQt5 import QtCore
+
+from model.tree_item import TreeItem
+from model.type_manager import TypeManager
+
+EMPTY_TITLE = 'empty title'
+UNKNOWN_TYPE = 'unknown dataType'
+PRIMITIVE_CHILDREN = 'primitive with children'
+FOLDER_SOURCES = 'Folder with sources'
+SIBLING_TITLES = 'sibling titles'
+DUPLICATE_VAR_ID = 'duplicate varId'
+# per item problems, keyed on the item
+NODE_KINDS = (EMPTY_TITLE, UNKNOWN_TYPE, PRIMITIVE_CHILDREN, FOLDER_SOURCES)
+KINDS = NODE_KINDS + (SIBLING_TITLES, DUPLICATE_VAR_ID)
+KNOWN_TYPES = frozenset(TypeManager.collections + TypeManager.primitives)
+PRIMITIVES = frozenset(TypeManager.primitives)
+
+
+class ValidationIssue(object):
+    __slots__ = ('kind', 'owner', 'route', 'value')
+
+    def __init__(self, kind, owner, route, value=None):
+        # the item is owner, or the last raw json of route below it; value
+        # is the offending dataType, sources, titles or (varId, count)
+        self.kind = kind
+        self.owner = owner
+        self.route = route
+        self.value = value
+
+    def key(self):
+        if self.kind == DUPLICATE_VAR_ID:
+            return self.kind, self.value[0]
+        return self.kind, (id(self.route[-1]) if self.route else self.owner)
+
+    def var_id(self):
+        if self.kind == DUPLICATE_VAR_ID:
+            return self.value[0]
+        if self.route:
+            return self.route[-1].get("varId")
+        return self.owner.getVarId()
+
+    def path(self):
+        if self.owner is None:
+            return ''
+        path = self.owner.fullPath() if self.owner.parent() is not None else ''
+        return path + ''.join('/' + str(data["title"]) for data in self.route)
+
+    def message(self):
+        if self.kind == EMPTY_TITLE:
+            return "The title is empty"
+        if self.kind == UNKNOWN_TYPE:
+            if self.value is None:
+                return "No dataType"
+            return "dataType {!r} is not a known type".format(self.value)
+        if self.kind == PRIMITIVE_CHILDREN:
+            return "{} has children".format(self.value)
+        if self.kind == FOLDER_SOURCES:
+            return "Folder has sources: {}".format(', '.join(str(source) for source in self.value))
+        if self.kind == SIBLING_TITLES:
+            return "Children share the titles: {}".format(', '.join(repr(title) for title in self.value))
+        return "Used by {} items".format(self.value[1])
+
+
+def node_problems(title, data_type, sources, has_children):
+    # [(kind, value)] of one item, None when it is fine
+    problems = None
+    if title is None or not str(title).strip():
+        problems = [(EMPTY_TITLE, title)]
+    if data_type not in KNOWN_TYPES:
+        problems = (problems or []) + [(UNKNOWN_TYPE, data_type)]
+    elif has_children and data_type in PRIMITIVES:
+        problems = (problems or []) + [(PRIMITIVE_CHILDREN, data_type)]
+    elif sources and data_type == 'Folder':
+        problems = (problems or []) + [(FOLDER_SOURCES, tuple(sources))]
+    return problems
+
+
+def repeated_titles(titles):
+    if len(titles) < 2:
+        return None
+    seen = set()
+    repeated = set()
+    for title in titles:
+        if title in seen:
+            repeated.add(title)
+        else:
+            seen.add(title)
+    return _sorted_titles(repeated)
+
+
+def _sorted_titles(titles):
+    return tuple(sorted(titles, key=str)) or None
+
+
+def scan(item, issues, var_ids, check_item=True, lock=None, cancelled=None, check_interval=4096):
+    """
+    Adds the issues found in the subtree of item, raw json included, to
+    issues and counts its varIds in var_ids. Without check_item the item
+    itself (the root) only gets its children compared. Returns False when
+    cancelled() said so.
+
+    The rows of an item are read under lock, so that a fetch moving raw
+    json into items is seen either before or after.
+    """
+    visited = 0
+    # (node, owner, raw json above node) with the raw json as (data, above)
+    stack = [(item, None, None)]
+    while stack:
+        node, owner, above = stack.pop()
+        visited += 1
+        if cancelled is not None and visited % check_interval == 0 and cancelled():
+            return False
+        if type(node) is TreeItem:
+            if lock is not None and node.pendingChildren is not None:
+                with lock:
+                    children, raw = list(node.childItems), pending_children(node)
+            else:
+                children, raw = node.childItems, pending_children(node)
+            if node is not item or check_item:
+                problems = node_problems(node.itemData, node.dataType, node.sources, bool(children or raw))
+                if problems:
+                    for kind, value in problems:
+                        issue = ValidationIssue(kind, node, (), value)
+                        issues[issue.key()] = issue
+                var_id = node.varId
+                if var_id is not None:
+                    var_ids[var_id] = var_ids.get(var_id, 0) + 1
+            if children or raw:
+                titles = [child.itemData for child in children]
+                titles.extend(data["title"] for data in raw)
+                repeated = repeated_titles(titles)
+                if repeated:
+                    issue = ValidationIssue(SIBLING_TITLES, node, (), repeated)
+                    issues[issue.key()] = issue
+                stack.extend((child, None, None) for child in children)
+                stack.extend((data, node, None) for data in raw)
+            continue
+        raw = node.get("children")
+        if raw:
+            raw = [data for data in raw if len(data)]
+        problems = node_problems(node["title"], node.get("dataType") or None, node.get("sources"), bool(raw))
+        if problems:
+            route = _route(node, above)
+            for kind, value in problems:
+                issue = ValidationIssue(kind, owner, route, value)
+                issues[issue.key()] = issue
+        var_id = node.get("varId")
+        if var_id is not None:
+            var_ids[var_id] = var_ids.get(var_id, 0) + 1
+        if raw:
+            repeated = repeated_titles([data["title"] for data in raw])
+            if repeated:
+                issue = ValidationIssue(SIBLING_TITLES, owner, _route(node, above), repeated)
+                issues[issue.key()] = issue
+            above = (node, above)
+            stack.extend((data, owner, above) for data in raw)
+    return True
+
+
+def validate_tree(root_item, lock=None, cancelled=None):
+    """
+    Issues of the whole tree by key, None when cancelled.
+    """
+    issues = {}
+    var_ids = {}
+    if not scan(root_item, issues, var_ids, False, lock, cancelled):
+        return None
+    for var_id, count in var_ids.items():
+        if count > 1:
+            issue = ValidationIssue(DUPLICATE_VAR_ID, None, (), (var_id, count))
+            issues[issue.key()] = issue
+    return issues
+
+
+def pending_children(item):
+    if not item.hasPendingChildren():
+        return ()
+    return [data for data in item.pendingChildren[item.pendingRow:] if len(data)]
+
+
+def has_children(item):
+    if item.childCount():
+        return True
+    if not item.hasPendingChildren():
+        return False
+    return any(len(data) for data in item.pendingChildren[item.pendingRow:])
+
+
+def subtree_var_ids(item):
+    # varIds of the items and raw json below item, item included
+    var_ids = set()
+    stack = [item]
+    while stack:
+        node = stack.pop()
+        if type(node) is TreeItem:
+            var_id = node.varId
+            stack.extend(node.childItems)
+            stack.extend(pending_children(node))
+        else:
+            var_id = node.get("varId")
+            stack.extend(data for data in node.get("children") or () if len(data))
+        if var_id is not None:
+            var_ids.add(var_id)
+    return var_ids
+
+
+def _route(data, above):
+    route = [data]
+    while above is not None:
+        route.append(above[0])
+        above = above[1]
+    return tuple(reversed(route))
+
+
+class _Touched(object):
+    # what the edits made while the worker runs have to check again
+    def __init__(self):
+        self.items = set()
+        self.parents = set()
+        self.var_ids = set()
+        self.subtrees = []
+        self.removed = False
+        # id of raw json -> (raw json, item loaded from it)
+        self.loaded = {}
+
+
+class TreeValidator(QtCore.QObject):
+    issuesChanged = QtCore.pyqtSignal()
+    # the issues were replaced as a whole (full check, clear)
+    issuesReset = QtCore.pyqtSignal()
+    # removed and added issues of one edit, before issuesChanged
+    issuesUpdated = QtCore.pyqtSignal(object, object)
+    # the tree changed too much to follow (revert), check it all again
+    checkNeeded = QtCore.pyqtSignal()
+    # parents with this many children keep a count of their child titles
+    # instead of comparing them all on each edit
+    wide_parent = 256
+
+    def __init__(self, tree_model):
+        super().__init__()
+        self.tree_model = tree_model
+        self.issues = {}
+        # id of the first raw json of a route -> keys of the issues below it
+        self.raw_keys = {}
+        self.duplicates = set()
+        # wide parent -> (title -> children with it, titles used more than once)
+        self.titles = {}
+        # removed item -> (issues below it, varIds no longer duplicate without it)
+        self.held = {}
+        # nothing is checked before the first full check
+        self.active = False
+        self.seq = 0
+        self.touched = None
+        self._removed = []
+        self._added = []
+
+    def clear(self):
+        self.issues = {}
+        self.raw_keys = {}
+        self.duplicates = set()
+        self.titles = {}
+        self.held = {}
+        self.active = False
+        self.seq += 1
+        self.touched = None
+        self._reset()
+
+    def start(self):
+        # a full check is about to run in the worker, edits are recorded
+        # until its issues arrive
+        self.seq += 1
+        self.active = True
+        self.touched = _Touched()
+        self.issuesChanged.emit()
+        return self.seq
+
+    def running(self):
+        return self.touched is not None
+
+    def finished(self, seq, issues):
+        if seq != self.seq:
+            return
+        touched = self.touched
+        self.touched = None
+        if issues is None:
+            self.issuesChanged.emit()
+            return
+        model = self.tree_model
+        self.issues = {}
+        self.raw_keys = {}
+        self.duplicates = set()
+        filtered = touched.removed or touched.subtrees
+        for issue in issues.values():
+            while issue.route and id(issue.route[0]) in touched.loaded:
+                data, item = touched.loaded[id(issue.route[0])]
+                if data is not issue.route[0]:
+                    break
+                issue.owner = item
+                issue.route = issue.route[1:]
+            if issue.kind == DUPLICATE_VAR_ID:
+                # the worker may have met a moved row twice or never
+                touched.var_ids.add(issue.value[0])
+                continue
+            if filtered and not model.contains_item(issue.owner):
+                continue
+            self._add(issue)
+        for item in touched.subtrees:
+            if model.contains_item(item):
+                self._check_subtree(item)
+        for item in touched.items:
+            if model.contains_item(item):
+                self._check_item(item)
+        for item in touched.parents:
+            if model.contains_item(item):
+                self._check_siblings(item)
+        for var_id in touched.var_ids:
+            self._check_var_id(var_id)
+        self._reset()
+
+    """
+    The methods below follow the edits of the model
+    """
+
+    def field_changed(self, item, field, old_value):
+        if not self.active:
+            return
+        if field == 'varId':
+            self._check_var_id(old_value)
+            self._check_var_id(item.getVarId())
+        else:
+            self._check_item(item)
+            if field == 'title':
+                self._count_title(item.parent(), old_value, -1)
+                self._count_title(item.parent(), item.data(), 1)
+                self._check_siblings(item.parent())
+        self._emit()
+
+    def inserted(self, parent_item, items):
+        if not self.active:
+            return
+        for item in items:
+            self._count_title(parent_item, item.data(), 1)
+        self._check_item(parent_item)
+        self._check_siblings(parent_item)
+        for item in items:
+            held = self.held.pop(item, None)
+            if held is not None and self.touched is None:
+                self._restore(*held)
+            else:
+                self._check_subtree(item)
+        self._emit()
+
+    def removed(self, parent_item, item):
+        if not self.active:
+            return
+        self._count_title(parent_item, item.data(), -1)
+        if self.touched is None:
+            self._hold(item)
+        else:
+            self.touched.removed = True
+            self._drop_subtree(item)
+            # a removal can only end the duplicates of the varIds it took away
+            if self.duplicates:
+                for var_id in subtree_var_ids(item) & self.duplicates:
+                    self._check_var_id(var_id)
+        self._check_item(parent_item)
+        self._check_siblings(parent_item)
+        self._emit()
+
+    def release(self, item):
+        # the removal of item can no longer be undone
+        self.held.pop(item, None)
+
+    def moved(self, source_parent_item, target_parent_item, items):
+        if not self.active:
+            return
+        for item in items:
+            self._count_title(source_parent_item, item.data(), -1)
+            self._count_title(target_parent_item, item.data(), 1)
+        for parent_item in (source_parent_item, target_parent_item):
+            self._check_item(parent_item)
+            self._check_siblings(parent_item)
+        if self.touched is not None:
+            self.touched.subtrees.extend(items)
+        self._emit()
+
+    def loaded(self, parent_item, children, items):
+        # raw json of parent_item became items, its issues move to them
+        if not self.active:
+            return
+        for data, item in zip([data for data in children if len(data)], items):
+            if self.touched is not None:
+                self.touched.loaded[id(data)] = (data, item)
+            self._move_raw_issues(data, item)
+
+    def invalidate(self):
+        if self.active:
+            self.titles = {}
+            self.checkNeeded.emit()
+
+    """
+    Incremental checks
+    """
+
+    def _emit(self):
+        if self._removed or self._added:
+            removed, added = self._removed, self._added
+            self._removed = []
+            self._added = []
+            self.issuesUpdated.emit(removed, added)
+            self.issuesChanged.emit()
+
+    def _reset(self):
+        self._removed = []
+        self._added = []
+        self.issuesReset.emit()
+        self.issuesChanged.emit()
+
+    def _add(self, issue):
+        key = issue.key()
+        replaced = self.issues.get(key)
+        if replaced is not None:
+            self._removed.append(replaced)
+        self.issues[key] = issue
+        if issue.route:
+            self.raw_keys.setdefault(id(issue.route[0]), set()).add(key)
+        elif issue.kind == DUPLICATE_VAR_ID:
+            self.duplicates.add(issue.value[0])
+        self._added.append(issue)
+
+    def _pop(self, key):
+        issue = self.issues.pop(key, None)
+        if issue is None:
+            return None
+        if issue.route:
+            keys = self.raw_keys.get(id(issue.route[0]))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.raw_keys[id(issue.route[0])]
+        elif issue.kind == DUPLICATE_VAR_ID:
+            self.duplicates.discard(issue.value[0])
+        self._removed.append(issue)
+        return issue
+
+    def _move_raw_issues(self, data, item):
+        keys = self.raw_keys.pop(id(data), None)
+        if keys is None:
+            return
+        for key in keys:
+            issue = self.issues.pop(key)
+            self._removed.append(issue)
+            issue.owner = item
+            issue.route = issue.route[1:]
+            self._add(issue)
+
+    def _check_item(self, item):
+        if self.touched is not None:
+            self.touched.items.add(item)
+        if item is self.tree_model.root_item:
+            return
+        for kind in NODE_KINDS:
+            self._pop((kind, item))
+        problems = node_problems(item.data(), item.getDataType(), item.getSources(), has_children(item))
+        for kind, value in problems or ():
+            self._add(ValidationIssue(kind, item, (), value))
+
+    def _check_siblings(self, parent_item):
+        if self.touched is not None:
+            self.touched.parents.add(parent_item)
+        self._pop((SIBLING_TITLES, parent_item))
+        if parent_item in self.titles:
+            repeated = _sorted_titles(self.titles[parent_item][1])
+        elif parent_item.childCount() + parent_item.pendingCount() >= self.wide_parent:
+            repeated = _sorted_titles(self._count_titles(parent_item)[1])
+        else:
+            titles = [child.data() for child in parent_item.childItems]
+            titles.extend(data["title"] for data in pending_children(parent_item))
+            repeated = repeated_titles(titles)
+        if repeated:
+            self._add(ValidationIssue(SIBLING_TITLES, parent_item, (), repeated))
+
+    def _count_titles(self, parent_item):
+        counts = {}
+        repeated = set()
+        titles = [child.data() for child in parent_item.childItems]
+        titles.extend(data["title"] for data in pending_children(parent_item))
+        for title in titles:
+            count = counts.get(title, 0) + 1
+            counts[title] = count
+            if count == 2:
+                repeated.add(title)
+        self.titles[parent_item] = counts, repeated
+        return counts, repeated
+
+    def _count_title(self, parent_item, title, step):
+        # only parents counted already follow their titles
+        entry = self.titles.get(parent_item)
+        if entry is None:
+            return
+        counts, repeated = entry
+        count = counts.get(title, 0) + step
+        if count:
+            counts[title] = count
+        else:
+            del counts[title]
+        if count > 1:
+            repeated.add(title)
+        else:
+            repeated.discard(title)
+
+    def _check_var_id(self, var_id):
+        if var_id is None:
+            return
+        if self.touched is not None:
+            self.touched.var_ids.add(var_id)
+        count = self.tree_model.search_index.var_id_index.count(var_id)
+        issue = self.issues.get((DUPLICATE_VAR_ID, var_id))
+        if issue is not None and issue.value[1] == count:
+            return
+        self._pop((DUPLICATE_VAR_ID, var_id))
+        if count > 1:
+            self._add(ValidationIssue(DUPLICATE_VAR_ID, None, (), (var_id, count)))
+
+    def _hold(self, item):
+        # the issues below item are kept for an undo; outside of the
+        # subtree only the duplicates of its varIds can change
+        issues = self._drop_subtree(item)
+        var_ids = subtree_var_ids(item)
+        for var_id in var_ids & self.duplicates:
+            self._check_var_id(var_id)
+        self.held[item] = issues, var_ids
+
+    def _restore(self, issues, var_ids):
+        # the tree is back the way it was when the issues were held, but
+        # for varIds taken meanwhile by the items outside of it
+        for issue in issues:
+            self._add(issue)
+        for var_id in var_ids:
+            self._check_var_id(var_id)
+
+    def _check_subtree(self, item):
+        if self.touched is not None:
+            self.touched.subtrees.append(item)
+        self._drop_subtree(item)
+        issues = {}
+        var_ids = {}
+        scan(item, issues, var_ids)
+        for issue in issues.values():
+            self._add(issue)
+        for var_id in var_ids:
+            self._check_var_id(var_id)
+
+    def _drop_subtree(self, item):
+        # the issues of the items and raw json below item, item included
+        dropped = []
+        stack = [item]
+        while stack:
+            item = stack.pop()
+            keys = [(kind, item) for kind in NODE_KINDS]
+            keys.append((SIBLING_TITLES, item))
+            if item.hasPendingChildren():
+                for data in item.pendingChildren[item.pendingRow:]:
+                    keys.extend(self.raw_keys.get(id(data), ()))
+            for key in keys:
+                issue = self._pop(key)
+                if issue is not None:
+                    dropped.append(issue)
+            stack.extend(item.childItems)
+        return dropped
@@ -0,0 +1,42 @@
+"""
+Background validation
+
+Runs the full check of the tree in a worker thread. The GUI thread keeps
+editing meanwhile; the validator records those edits and checks them again
+when the issues arrive, a newer request drops the older ones.
+
+"""
+
+import traceback
+
+from PyQt5 import QtCore
+
+from model.tree_validation import validate_tree
+
+
+class ValidationWorker(QtCore.QObject):
+    # seq, issues by key (None when the check failed)
+    finished = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, tree_model):
+        super().__init__()
+        self.tree_model = tree_model
+        self.latest_seq = 0
+
+    def cancel(self, seq):
+        # called from the GUI thread, any request older than seq is abandoned
+        self.latest_seq = seq
+
+    def validate(self, seq):
+        if seq != self.latest_seq:
+            return
+        try:
+            issues = validate_tree(self.tree_model.root_item, self.tree_model.rows_lock,
+                                   lambda: seq != self.latest_seq)
+        except Exception as e:
+            print("validation failed: {}".format(e))
+            print(traceback.format_exc())
+            issues = None
+        if seq != self.latest_seq:
+            return
+        self.finished.emit(seq, issues)
@@ -0,0 +1,127 @@
+import copy
+import json
+import os
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5 import QtCore, QtWidgets
+
+from model.tree_commands import SetFieldCommand
+from model.tree_item import TreeItem
+
+
+@pytest.fixture(scope='session')
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture(scope='session')
+def schema():
+    """
+    Returns a function giving sample.json repeated the number of times asked
+    for, with the varIds of every copy made unique.
+    """
+    with open(os.path.join(REPO, 'sample.json')) as f:
+        sample = json.load(f)
+
+    def rename(element, copy_number):
+        if element.get('varId') is not None:
+            element['varId'] = '{}_{}'.format(element['varId'], copy_number)
+        for child in element.get('children', ()):
+            rename(child, copy_number)
+        return element
+
+    def make(copies):
+        return [rename(copy.deepcopy(element), number) for number in range(copies) for element in sample]
+    return make
+
+
+def walk(item):
+    # the loaded items below item, item included
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        yield item
+        stack.extend(item.childItems)
+
+
+def loaded_items(model):
+    return [item for item in walk(model.root_item) if item is not model.root_item]
+
+
+def parent_index(model, item):
+    # index of the parent of item, the invalid one for the root rows
+    parent = item.parent()
+    return QtCore.QModelIndex() if parent is model.root_item else model.index_of(parent)
+
+
+def issues(issues_by_key):
+    # key -> message of the validator's issues, comparable to validate_tree
+    return {key: issue.message() for key, issue in issues_by_key.items()}
+
+
+def _rename(model, rnd, item, step):
+    # blank and repeated titles are issues (setData refuses an empty one),
+    # the others search terms
+    title = rnd.choice([" ", "twin", "Some_Text_new", item.data() + "list", "renamed_{}".format(step)])
+    model.setData(model.index_of(item), title)
+
+
+def _set_var_id(model, rnd, item, step):
+    var_id = rnd.choice([rnd.choice(loaded_items(model)).getVarId(), "new_{}_7".format(step)])
+    if var_id != item.getVarId():
+        # set_var_id refuses a taken varId, the command does not
+        model.undo_stack.push(SetFieldCommand(model, item, 'varId', var_id))
+
+
+def _insert(model, rnd, item, step):
+    parent = item.parent()
+    if rnd.randrange(2):
+        new = rnd.choice(loaded_items(model)).create_duplicate(parent, 'copy{}_'.format(step))
+    else:
+        new = TreeItem({"title": rnd.choice(["twin", "new_{}".format(step)]), "dataType": "Folder",
+                        "varId": rnd.choice(["new_{}".format(step), item.getVarId()])})
+    model.insert_item(rnd.randint(0, parent.childCount()), new, parent_index(model, item))
+
+
+def _undo(model, rnd, item, step):
+    if model.undo_stack.canUndo():
+        model.undo_stack.undo()
+
+
+def _redo(model, rnd, item, step):
+    if model.undo_stack.canRedo():
+        model.undo_stack.redo()
+
+
+def _fetch(model, rnd, item, step):
+    index = model.index_of(item)
+    if model.canFetchMore(index):
+        model.fetchMore(index)
+
+
+EDITS = {
+    'rename': _rename,
+    'var_id': _set_var_id,
+    'metadata': lambda model, rnd, item, step: model.set_metadata(item, {"key": step}),
+    'data_type': lambda model, rnd, item, step: model.set_data_type(item, rnd.choice(["Text", "Folder", "List"])),
+    'sources': lambda model, rnd, item, step: model.set_sources(item, rnd.choice([[], ["irs"]])),
+    'remove': lambda model, rnd, item, step: model.removeRow(item.childNumber(), parent_index(model, item)),
+    'insert': _insert,
+    'undo': _undo,
+    'redo': _redo,
+    'fetch': _fetch,
+}
+
+
+def random_edit(model, rnd, step, kinds=tuple(EDITS)):
+    """
+    Makes an edit of one of kinds, picked by rnd, on a loaded item picked by
+    rnd, through the model and its undo stack the way the views do.
+    """
+    EDITS[rnd.choice(kinds)](model, rnd, rnd.choice(loaded_items(model)), step)
@@ -0,0 +1,69 @@
+import io
+import json
+
+import pytest
+
+from model.json_stream_reader import JsonStreamReader
+
+
+def build(data, children):
+    # puts the streamed children back where json.load has them
+    if children is not None:
+        data["children"] = children
+    return data
+
+
+def read(text, chunk_size, stream_children=True):
+    reader = JsonStreamReader(io.StringIO(text), chunk_size)
+    return list(reader.iter_items(build, stream_children)), reader
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 20])
+def test_items_match_json_load(schema, chunk_size):
+    # the small chunks split nodes, keys and numbers across reads
+    data = schema(3)
+    data.append({"title": "n", "varId": "n", "dataType": "Integer", "metadata": {"min": 123456789, "max": -1.5e10}})
+    data.append({"title": "empty", "children": []})
+    text = json.dumps(data, indent=4)
+    items, _ = read(text, chunk_size)
+    assert items == json.loads(text)
+    items, _ = read(text, chunk_size, stream_children=False)
+    assert items == json.loads(text)
+
+
+def test_children_are_built_before_their_parent(schema):
+    built = []
+
+    def build_item(data, children):
+        built.append(data.get("title"))
+        return build(data, children)
+
+    text = json.dumps(schema(1))
+    list(JsonStreamReader(io.StringIO(text), 16).iter_items(build_item))
+    folder = schema(1)[0]
+    assert built.index(folder["title"]) > max(built.index(child["title"]) for child in folder["children"])
+
+
+@pytest.mark.parametrize('chunk_size', [16, 1 << 20])
+def test_equal_keys_share_one_string(schema, chunk_size):
+    # every node, also the ones walked key by key across reads
+    nodes = []
+    reader = JsonStreamReader(io.StringIO(json.dumps(schema(3))), chunk_size)
+    list(reader.iter_items(lambda data, children: nodes.append(data)))
+    keys = {}
+    for data in nodes:
+        for key, value in data.items():
+            assert keys.setdefault(key, key) is key, key
+            if isinstance(value, dict):
+                nodes.append(value)
+            elif isinstance(value, list):
+                nodes.extend(value for value in value if isinstance(value, dict))
+    assert len(nodes) > 3 * 10
+    assert set(keys) <= set(reader.keys)
+
+
+@pytest.mark.parametrize('text', ['', '{}', '[{"title": 1} {"title": 2}]', '[{"title": 1}, {"title" 2}]',
+                                  '[{"children": [{"title": 1}'])
+def test_malformed_files_raise(text):
+    with pytest.raises(json.JSONDecodeError):
+        read(text, 4)
@@ -0,0 +1,119 @@
+import json
+import os
+import random
+
+import pytest
+
+from conftest import random_edit
+from model.json_file_manager import JsonFileManager
+from model.json_stream_writer import JsonStreamWriter
+from model.tree_model import TreeModel
+
+
+def full_dump(model, **layout):
+    children = model.root_item.create_new_item().get("children", [])
+    return json.dumps(children, **layout).encode()
+
+
+def saved_model(schema, path, lazy=False):
+    data = schema(60)
+    # a folder large enough for blocks of its own below the root
+    data.append({"title": "big", "varId": "big", "dataType": "Folder", "children": schema(40)})
+    model = TreeModel(lazy)
+    model.load_data(data)
+    manager = JsonFileManager()
+    manager.file_path = str(path)
+    manager.save_tree(model.root_item)
+    return model, manager
+
+
+def blocks(item):
+    return [part for part in item.fragment[1] if type(part) is tuple and part[0] is not None]
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_resave_matches_full_dump(app, schema, tmp_path, lazy):
+    rnd = random.Random(14)
+    model, manager = saved_model(schema, tmp_path / 'tree.json', lazy)
+    assert (tmp_path / 'tree.json').read_bytes() == full_dump(model)
+    for step in range(40):
+        random_edit(model, rnd, step, ('rename', 'metadata', 'remove', 'insert', 'undo', 'fetch'))
+        manager.save_tree(model.root_item)
+        assert (tmp_path / 'tree.json').read_bytes() == full_dump(model), step
+
+
+def test_blocks_are_cut_the_same_in_every_model(app, schema, tmp_path):
+    first, _ = saved_model(schema, tmp_path / 'first.json')
+    second, _ = saved_model(schema, tmp_path / 'second.json')
+    sizes = [len(block[0]) for block in blocks(first.root_item)]
+    assert len(sizes) > 1
+    assert sizes == [len(block[0]) for block in blocks(second.root_item)]
+
+
+def test_resave_keeps_the_blocks_of_clean_rows(app, schema, tmp_path):
+    model, manager = saved_model(schema, tmp_path / 'tree.json')
+    before = blocks(model.root_item)
+    model.setData(model.index(5, 0), 'renamed')
+    manager.save_tree(model.root_item)
+    after = blocks(model.root_item)
+    # only the block holding row 5 was encoded again
+    assert after[0] is not before[0]
+    assert after[1:] == before[1:]
+    assert all(new is old for new, old in zip(after[1:], before[1:]))
+    assert (tmp_path / 'tree.json').read_bytes() == full_dump(model)
+
+
+def test_resave_without_copy_file_range(app, schema, tmp_path, monkeypatch):
+    # the bytes kept are read and written back instead
+    monkeypatch.delattr(os, 'copy_file_range', raising=False)
+    model, manager = saved_model(schema, tmp_path / 'tree.json')
+    model.set_metadata(model.root_item.child(3), {"key": "value"})
+    model.removeRow(40)
+    manager.save_tree(model.root_item)
+    assert (tmp_path / 'tree.json').read_bytes() == full_dump(model)
+
+
+def test_resave_after_outside_write(app, schema, tmp_path):
+    model, manager = saved_model(schema, tmp_path / 'tree.json')
+    # the file no longer holds the cached fragments, nothing is copied from it
+    (tmp_path / 'tree.json').write_bytes(b'[]')
+    model.setData(model.index(0, 0), 'renamed')
+    manager.save_tree(model.root_item)
+    assert (tmp_path / 'tree.json').read_bytes() == full_dump(model)
+
+
+def test_failed_save_leaves_the_old_file(app, schema, tmp_path, monkeypatch):
+    model, manager = saved_model(schema, tmp_path / 'tree.json')
+    os.chmod(tmp_path / 'tree.json', 0o640)
+    saved = (tmp_path / 'tree.json').read_bytes()
+    write_tree = JsonStreamWriter.write_tree
+
+    def failing_write_tree(writer, *args):
+        write_tree(writer, *args)
+        writer.flush()
+        raise OSError("disk full")
+
+    monkeypatch.setattr(JsonStreamWriter, 'write_tree', failing_write_tree)
+    model.setData(model.index(0, 0), 'renamed')
+    with pytest.raises(OSError):
+        manager.save_tree(model.root_item)
+    assert (tmp_path / 'tree.json').read_bytes() == saved
+    assert os.listdir(tmp_path) == ['tree.json']
+    monkeypatch.undo()
+    manager.save_tree(model.root_item)
+    assert (tmp_path / 'tree.json').read_bytes() == full_dump(model)
+    # the permissions of the file replaced are kept
+    assert os.stat(tmp_path / 'tree.json').st_mode & 0o777 == 0o640
+
+
+@pytest.mark.parametrize('layout', [{'indent': 2}, {'indent': 4, 'separators': (',', ':')},
+                                    {'separators': (',', ':')}])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_layouts_match_json_dump(app, schema, tmp_path, layout, lazy):
+    model, manager = saved_model(schema, tmp_path / 'tree.json', lazy)
+    manager.indent = layout.get('indent')
+    manager.separators = layout.get('separators')
+    for step in range(2):
+        manager.save_tree(model.root_item)
+        assert (tmp_path / 'tree.json').read_bytes() == full_dump(model, **layout), step
+        model.set_metadata(model.root_item.child(3), {"key": "value"})
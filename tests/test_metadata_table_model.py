@@ -0,0 +1,20 @@
+from model.metadata_table_model import MetadataTableModel
+
+
+def test_empty_key_is_left_out_before_and_after_an_edit(app):
+    metadata = {"": "hidden", "first": "1", "second": "2"}
+    table = MetadataTableModel(metadata)
+    assert table.rowCount() == 2
+    assert table.getMetaData() == {"first": "1", "second": "2"}
+    table.setData(table.index(1, 1), "edited")
+    assert table.getMetaData() == {"first": "1", "second": "edited"}
+    # the item's dict is never changed in place
+    assert metadata == {"": "hidden", "first": "1", "second": "2"}
+
+
+def test_unedited_metadata_is_read_in_place(app):
+    metadata = {"key": "value"}
+    table = MetadataTableModel(metadata)
+    assert table.data(table.index(0, 0)) == "key"
+    assert table.metadata is None
+    assert table.getMetaData() == metadata and table.getMetaData() is not metadata
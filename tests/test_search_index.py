@@ -0,0 +1,133 @@
+import random
+from fnmatch import fnmatchcase
+
+import pytest
+
+from conftest import random_edit, walk
+from model.tree_model import TreeModel
+
+QUERIES = ["some_text", "SOME", "list", "zzz", "e", "varId:*_7", "varId:i_folder_in_root_3 folder",
+           "type:text", "type:k*", "source:*", "meta.up:*"]
+
+
+def brute_force(model, text):
+    # the loaded items matching every field term and holding the rest of
+    # the text in their title
+    terms = [word.split(':', 1) for word in text.split() if ':' in word]
+    text = ' '.join(word for word in text.split() if ':' not in word).lower()
+    matches = set()
+    for item in walk(model.root_item):
+        if item is model.root_item or text not in str(item.data()).lower():
+            continue
+        for field, pattern in terms:
+            if field == 'varId':
+                values = [] if item.getVarId() is None else [item.getVarId()]
+            elif field == 'type':
+                values = [] if item.getDataType() is None else [item.getDataType()]
+            elif field == 'source':
+                values = list(item.getSources())
+            else:
+                values = [value for key, value in item.getMetaData().items() if key == field[len('meta.'):]]
+            if not any(fnmatchcase(str(value).lower(), pattern.lower()) for value in values):
+                break
+        else:
+            matches.add(item)
+    return matches
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_query_matches_brute_force(app, schema, lazy):
+    rnd = random.Random(6)
+    model = TreeModel(lazy)
+    model.load_data(schema(20))
+    for step in range(60):
+        random_edit(model, rnd, step, ('rename', 'var_id', 'remove', 'insert', 'undo', 'fetch'))
+        for text in QUERIES:
+            assert model.search_index.query(text) == brute_force(model, text), (step, text)
+
+
+def test_rename_updates_the_title_index(app, schema):
+    model = TreeModel()
+    model.load_data(schema(2))
+    item = model.root_item.child(0).child(0)
+    assert item in model.search_index.query("some_text")
+    model.setData(model.index_of(item), "Needle")
+    assert item not in model.search_index.query("some_text")
+    assert model.search_index.query("needle") == {item}
+    # substrings shorter than a trigram too
+    assert model.search_index.query("ee") == {item}
+    model.undo_stack.undo()
+    assert not model.search_index.query("needle")
+
+
+def test_removed_and_moved_items(app, schema):
+    model = TreeModel()
+    model.load_data(schema(2))
+    folder = model.root_item.child(0)
+    inside = set(walk(folder))
+    model.removeRow(0)
+    assert not model.search_index.query("some") & inside
+    model.undo_stack.undo()
+    assert {item for item in inside if "some" in item.data()} <= model.search_index.query("some")
+    item = folder.child(0)
+    model.moveRows(model.index_of(folder), 0, 1, model.index(6, 0), 0)
+    assert model.search_index.query("varId:{}".format(item.getVarId())) == {item}
+
+
+def test_field_terms_and_with_the_title(app, schema):
+    model = TreeModel()
+    model.load_data(schema(3))
+    matches = model.search_index.query("some type:Integer")
+    assert matches
+    assert all(item.getDataType() == "Integer" and "some" in item.data() for item in matches)
+    assert model.search_index.query("varId:i_folder_in_root_1") == {model.root_item.child(6)}
+    assert model.search_index.query('meta."no such key":*') == set()
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_taken_var_ids_are_refused(app, schema, lazy):
+    model = TreeModel(lazy)
+    model.load_data(schema(2))
+    item = model.root_item.child(1)
+    # loaded, and in lazy mode still in raw json below a folder
+    nested = schema(2)[0]["children"][1]["varId"]
+    for var_id in (model.root_item.child(2).getVarId(), nested):
+        assert not model.set_var_id(item, var_id)
+    assert model.undo_stack.count() == 0
+    assert model.set_var_id(item, item.getVarId())
+    # free again once the row holding it is removed
+    model.removeRow(0)
+    assert model.set_var_id(item, nested)
+    assert model.search_index.var_id_index.count(nested) == 1
+    model.undo_stack.undo()
+    model.undo_stack.undo()
+    assert not model.set_var_id(item, nested)
+
+
+def test_copies_get_a_free_prefix(app, schema):
+    model = TreeModel()
+    model.load_data(schema(1))
+    folder = model.root_item.child(0)
+    assert model.free_var_id_prefix(folder, "copy_of_") == "copy_of_"
+    for prefix in ("copy_of_", "copy_of_2_"):
+        model.insert_item(1, folder.create_duplicate(model.root_item, prefix))
+    assert model.free_var_id_prefix(folder, "copy_of_") == "copy_of_3_"
+    # a single varId taken under a prefix is enough to skip it
+    model.undo_stack.undo()
+    model.set_var_id(model.root_item.child(0).child(1), "copy_of_2_" + folder.child(0).getVarId())
+    assert model.free_var_id_prefix(folder, "copy_of_") == "copy_of_3_"
+
+
+def test_find_var_id_fetches_only_the_path(app, schema):
+    data = schema(2)
+    row = len(data) // 2 + 4
+    var_id = data[row]["children"][1]["children"][1]["children"][0]["varId"]
+    model = TreeModel(True)
+    model.load_data(data)
+    item = model.find_var_id(var_id)
+    assert item.getVarId() == var_id
+    assert item.parent().parent().parent() is model.root_item.child(row)
+    # the rows up to the path, and nothing of the other folders
+    assert [child.childNumber() for child in model.root_item.child(row).childItems] == [0, 1]
+    assert not any(model.root_item.child(other).childItems for other in range(len(data)) if other != row)
+    assert model.find_var_id("no such varId") is None
@@ -0,0 +1,169 @@
+import random
+
+import pytest
+from PyQt5 import QtCore
+
+from conftest import issues, loaded_items, parent_index, walk
+from model.tree_model import TreeModel
+from model.tree_validation import validate_tree
+
+
+def dump(model):
+    return model.root_item.create_new_item().get("children", [])
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_undo_redo_delete_round_trips(app, schema, lazy):
+    rnd = random.Random(16)
+    model = TreeModel(lazy)
+    model.load_data(schema(30))
+    for row in range(0, 30, 3):
+        model.fetchMore(model.index(row, 0))
+    loaded = dump(model)
+    validator = model.validator
+    validator.finished(validator.start(), validate_tree(model.root_item))
+    for step in range(30):
+        item = rnd.choice(loaded_items(model))
+        before = dump(model)
+        model.removeRow(item.childNumber(), parent_index(model, item))
+        after = dump(model)
+        assert after != before
+        model.undo_stack.undo()
+        assert dump(model) == before, step
+        assert model.contains_item(item)
+        assert item.getVarId() is None or model.search_index.var_id_index.contains(item.getVarId())
+        assert issues(validator.issues) == issues(validate_tree(model.root_item))
+        model.undo_stack.redo()
+        assert dump(model) == after, step
+        assert not model.contains_item(item)
+        assert issues(validator.issues) == issues(validate_tree(model.root_item))
+    while model.undo_stack.canUndo():
+        model.undo_stack.undo()
+    assert dump(model) == loaded
+
+
+def test_undo_delete_puts_the_same_subtree_back(app, schema):
+    model = TreeModel()
+    model.load_data(schema(2))
+    folder = model.root_item.child(3)
+    children = list(folder.childItems)
+    model.removeRow(3)
+    assert model.root_item.child(3) is not folder
+    model.undo_stack.undo()
+    # the subtree was kept by reference, not copied
+    assert model.root_item.child(3) is folder
+    assert folder.childItems == children
+    assert folder.parent() is model.root_item
+
+
+def test_undo_move_goes_back_to_the_old_parent_and_row(app, schema):
+    model = TreeModel()
+    model.load_data(schema(2))
+    item = model.root_item.child(0).child(1)
+    target = model.root_item.child(7)
+    assert model.moveRows(model.index(0, 0), 1, 1, model.index(7, 0), 0)
+    assert target.child(0) is item
+    model.undo_stack.undo()
+    assert model.root_item.child(0).child(1) is item
+    assert item.parent() is model.root_item.child(0)
+    model.undo_stack.redo()
+    assert target.child(0) is item
+
+
+def test_undo_field_edits(app, schema):
+    model = TreeModel()
+    model.load_data(schema(1))
+    item = model.root_item.child(0).child(0)
+    model.setData(model.index_of(item), 'renamed')
+    model.set_sources(item, ["irs"])
+    model.set_metadata(item, {"key": "value"})
+    model.undo_stack.undo()
+    model.undo_stack.undo()
+    assert list(item.getSources()) == list(schema(1)[0]["children"][0]["sources"])
+    model.undo_stack.undo()
+    assert item.data() == 'some_text'
+    model.undo_stack.redo()
+    assert item.data() == 'renamed'
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_deleted_subtree_left_out_of_lookups(app, schema, lazy):
+    model = TreeModel(lazy)
+    model.load_data(schema(5))
+    item = model.root_item.child(0)
+    var_ids = [child.getVarId() for child in walk(item) if child.getVarId() is not None]
+    model.removeRow(0)
+    var_id_index = model.search_index.var_id_index
+    for var_id in var_ids:
+        assert not var_id_index.contains(var_id)
+    assert not model.search_index.query(item.data()) & set(walk(item))
+    model.undo_stack.undo()
+    for var_id in var_ids:
+        assert var_id_index.contains(var_id)
+    # commands past the undone ones are dropped with what they held
+    model.setData(model.index(1, 0), 'renamed')
+    model.undo_stack.clear()
+    assert not model.detached
+
+
+def test_undo_stack_holds_no_copy_of_the_tree(app, schema):
+    model = TreeModel()
+    model.load_data(schema(3))
+    model.removeRow(2, QtCore.QModelIndex())
+    command = model.undo_stack.command(0)
+    # a delete keeps the detached item and where it was, nothing else
+    held = [value for value in vars(command).values() if isinstance(value, (list, dict))]
+    assert not held
+
+
+def drop(model, item, parent_item, row):
+    data = model.mimeData([model.index_of(item)])
+    return model.dropMimeData(data, QtCore.Qt.MoveAction, row, 0, model.index_of(parent_item))
+
+
+def test_drop_moves_the_dragged_item_itself(app, schema):
+    model = TreeModel()
+    model.load_data(schema(2))
+    folder = model.root_item.child(0)
+    item = folder.child(1)
+    item.setValueChanged(True)
+    descendants = list(walk(item))
+    target = model.root_item.child(7)
+    persistent = QtCore.QPersistentModelIndex(model.index_of(item))
+    moved = []
+    model.rowMoved.connect(moved.append)
+    edits = model.edits
+    # appended to the end of the target
+    assert drop(model, item, target, -1)
+    assert target.child(target.childCount() - 1) is item
+    assert item.parent() is target and item not in folder.childItems
+    assert list(walk(item)) == descendants and item.valueChanged
+    assert persistent.isValid() and model.get_item(QtCore.QModelIndex(persistent)) is item
+    assert [model.get_item(index) for index in moved] == [item]
+    assert model.edits > edits
+    assert model.search_index.query("varId:{}".format(item.getVarId())) == {item}
+
+
+def test_drop_below_itself_in_the_same_folder(app, schema):
+    model = TreeModel()
+    model.load_data(schema(1))
+    folder = model.root_item.child(0)
+    item = folder.child(0)
+    moved = []
+    model.rowMoved.connect(moved.append)
+    # dropped before row 3, which is row 2 once it has left row 0
+    assert drop(model, item, folder, 3)
+    assert folder.child(2) is item and item.childNumber() == 2
+    assert [model.get_item(index) for index in moved] == [item]
+
+
+def test_drop_into_its_own_subtree_is_refused(app, schema):
+    model = TreeModel()
+    model.load_data(schema(1))
+    folder = model.root_item.child(0)
+    inner = next(child for child in folder.childItems if child.childItems)
+    before = dump(model)
+    assert not drop(model, folder, inner, 0)
+    assert not drop(model, folder, folder, 0)
+    assert dump(model) == before
+    assert model.undo_stack.count() == 0
@@ -0,0 +1,224 @@
+import copy
+
+import pytest
+
+from conftest import walk
+from model import tree_hash
+from model.metadata_table_model import MetadataTableModel
+from model.source_table_model import SourceTableModel
+from model.tree_item import TreeItem
+from model.tree_model import TreeModel
+
+
+def ancestors(item):
+    item = item.parent()
+    while item is not None:
+        yield item
+        item = item.parent()
+
+
+def test_mark_dirty_clears_digests_up_the_path(app, schema):
+    model = TreeModel()
+    model.load_data(schema(10))
+    tree_hash.item_digest(model.root_item)
+    assert all(item.digest is not None for item in walk(model.root_item))
+    folder = model.root_item.child(6)
+    first, second = folder.child(0), folder.child(1)
+    first.markDirty()
+    path = {first} | set(ancestors(first))
+    for item in walk(model.root_item):
+        assert (item.digest is None) == (item in path)
+    # the ancestors stay dirty, the walk goes on past them while they have
+    # a digest again
+    tree_hash.item_digest(model.root_item)
+    second.markDirty()
+    path = {second} | set(ancestors(second))
+    for item in walk(model.root_item):
+        assert (item.digest is None) == (item in path)
+        assert item.dirty or item not in path
+
+
+def test_edit_changes_digest_only_up_the_path(app, schema):
+    model = TreeModel()
+    model.load_data(schema(10))
+    before = {item: tree_hash.item_digest(item) for item in walk(model.root_item)}
+    item = model.root_item.child(6).child(0)
+    model.setData(model.index_of(item), 'renamed')
+    path = {item} | set(ancestors(item))
+    for other in walk(model.root_item):
+        assert (tree_hash.item_digest(other) != before[other]) == (other in path)
+
+
+def test_loaded_and_raw_digests_agree(app, schema):
+    data = schema(3)
+    model = TreeModel(True)
+    model.load_data(schema(3))
+    # raw rows of the lazy model hash the same as the loaded ones
+    assert tree_hash.item_digest(model.root_item) == tree_hash.data_digest({"title": "root", "children": data})
+    for row, element in enumerate(data):
+        assert tree_hash.item_digest(model.root_item.child(row)) == tree_hash.data_digest(element)
+
+
+def test_compare_lists_only_the_branches_that_differ(app, schema):
+    data = schema(2)
+    model = TreeModel()
+    model.load_data(schema(2))
+    assert tree_hash.compare_schema(model.root_item, data) == []
+    item = model.root_item.child(6).child(2).child(0)
+    model.setData(model.index_of(item), 'renamed')
+    assert tree_hash.compare_schema(model.root_item, data) == [item.fullPath()]
+    # below a path the other branches are not looked at
+    assert tree_hash.compare_schema(model.root_item, data, '/simple_list') == []
+
+
+def wide_folder(rows):
+    parent = TreeItem({"title": "wide"})
+    for row in range(rows):
+        parent.appendChild(TreeItem({"title": str(row)}, parent))
+    return parent
+
+
+def test_child_number_follows_inserts_and_removals(app):
+    parent = wide_folder(1000)
+    assert [child.childNumber() for child in parent.childItems] == list(range(1000))
+    parent.insertChild(0, TreeItem({"title": "first"}, parent))
+    parent.removeChildren(500, 10)
+    parent.insertChild(700, TreeItem({"title": "middle"}, parent))
+    parent.appendChild(TreeItem({"title": "last"}, parent))
+    # asked in any order, the rows are the positions in the list
+    for row in reversed(range(parent.childCount())):
+        assert parent.child(row).childNumber() == row
+
+
+def test_child_number_renumbers_once_per_batch_of_edits(app, monkeypatch):
+    parent = wide_folder(1000)
+    renumbered = []
+    update_rows = TreeItem.updateRows
+    monkeypatch.setattr(TreeItem, 'updateRows', lambda item: renumbered.append(item) or update_rows(item))
+    for child in parent.childItems:
+        child.childNumber()
+    assert not renumbered
+    parent.removeChildren(10, 5)
+    parent.insertChild(3, TreeItem({"title": "new"}, parent))
+    for child in parent.childItems:
+        child.childNumber()
+    assert renumbered == [parent]
+
+
+def test_model_parent_of_a_wide_folder(app):
+    model = TreeModel()
+    model.load_data([{"title": "wide", "varId": "wide", "dataType": "List",
+                      "children": [{"title": str(row), "dataType": "Text"} for row in range(5000)]}])
+    folder = model.index(0, 0)
+    model.removeRow(100, folder)
+    index = model.index(4000, 0, folder)
+    assert index.internalPointer().data() == "4001"
+    assert model.parent(index) == folder
+    assert model.index_of(index.internalPointer()).row() == 4000
+
+
+def edit_in_tables(model, item):
+    # the edits made in the side panel, as the controller applies them
+    metadata = MetadataTableModel(item.getMetaData())
+    metadata.setData(metadata.index(0, 1), "edited")
+    metadata.insertRow(0)
+    model.set_metadata(item, metadata.getMetaData())
+    sources = SourceTableModel(item.getSources())
+    sources.setData(sources.index(0, 0), "edited")
+    sources.insertRow(0)
+    sources.setData(sources.index(1, 0), "added")
+    model.set_sources(item, sources.getSources())
+
+
+def test_duplicate_shares_nothing_that_is_changed(app, schema):
+    model = TreeModel()
+    model.load_data(schema(1))
+    folder = model.root_item.child(0)
+    before = copy.deepcopy(folder.create_new_item())
+    prefix = model.free_var_id_prefix(folder, "copy_of_")
+    duplicate = folder.create_duplicate(model.root_item, prefix)
+    model.insert_item(1, duplicate)
+    pairs = list(zip(walk(folder), walk(duplicate)))
+    # the containers are shared until one side is edited
+    assert any(item.getMetaData() and item.getMetaData() is copy_item.getMetaData() for item, copy_item in pairs)
+    for item, copy_item in pairs:
+        assert copy_item.getVarId() == (None if item.getVarId() is None else prefix + item.getVarId())
+        if copy_item.getMetaData() and copy_item.getSources():
+            edit_in_tables(model, copy_item)
+            assert copy_item.getSources()[:2] == ["edited", "added"]
+    assert folder.create_new_item() == before
+    edited = copy.deepcopy(duplicate.create_new_item())
+    # and the other way around
+    for item, _ in pairs:
+        if item.getMetaData() and item.getSources():
+            edit_in_tables(model, item)
+    assert duplicate.create_new_item() == edited
+    while model.undo_stack.canUndo():
+        model.undo_stack.undo()
+    assert folder.create_new_item() == before
+
+
+def test_lazy_duplicate_leaves_the_raw_children_alone(app, schema):
+    data = schema(1)
+    raw = copy.deepcopy(data[0]["children"])
+    model = TreeModel(True)
+    model.load_data(data)
+    folder = model.root_item.child(0)
+    assert folder.hasPendingChildren()
+    duplicate = folder.create_duplicate(model.root_item, "copy_of_")
+    model.insert_item(1, duplicate)
+    model.fetch_remaining(model.index(1, 0))
+    model.fetch_remaining(model.index(0, 0))
+    assert [child.getVarId() for child in duplicate.childItems] == [
+        None if child.getVarId() is None else "copy_of_" + child.getVarId() for child in folder.childItems]
+    assert [child.create_new_item() for child in folder.childItems] == raw
+
+
+def walked_path(item):
+    titles = []
+    while item.parent() is not None:
+        titles.append(item.data())
+        item = item.parent()
+    return '/' + '/'.join(reversed(titles))
+
+
+def assert_paths(model):
+    items = [item for item in walk(model.root_item) if item is not model.root_item]
+    assert [item.fullPath() for item in items] == [walked_path(item) for item in items]
+
+
+def test_renames_and_moves_invalidate_the_cached_paths(app, schema):
+    model = TreeModel()
+    model.load_data(schema(2))
+    assert_paths(model)
+    folder = model.root_item.child(3)
+    deep = folder.child(1).child(1).child(0)
+    model.setData(model.index_of(folder), "renamed")
+    assert deep.fullPath().startswith("/renamed/")
+    assert_paths(model)
+    model.moveRows(model.index_of(folder), 1, 1, model.index(0, 0), 0)
+    assert deep.fullPath().startswith(model.root_item.child(0).fullPath() + "/")
+    assert_paths(model)
+    while model.undo_stack.canUndo():
+        model.undo_stack.undo()
+        assert_paths(model)
+    model.insert_item(0, folder.create_duplicate(model.root_item))
+    assert_paths(model)
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_find_path_follows_renames(app, schema, lazy):
+    model = TreeModel(lazy)
+    model.load_data(schema(2))
+    path = "/outer_keyed_list/inner_keyed_list/a_list"
+    item = model.find_path(path)
+    assert walked_path(item) == path
+    folder = item.parent()
+    model.setData(model.index_of(folder), "renamed")
+    assert model.find_path(folder.fullPath() + "/" + item.data()) is item
+    # titles repeat among the root rows, the copy in the second one is found
+    other = model.find_path(path)
+    assert other is not item and walked_path(other) == path
+    assert model.find_path(path + "/") is other
+    for path in ("", "/", "relative", "/no such folder"):
+        assert model.find_path(path) is None
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from conftest import issues, random_edit
+from model.tree_commands import SetFieldCommand
+from model.tree_model import TreeModel
+from model.tree_validation import (validate_tree, subtree_var_ids, EMPTY_TITLE, UNKNOWN_TYPE, PRIMITIVE_CHILDREN, FOLDER_SOURCES,
+                                   SIBLING_TITLES, DUPLICATE_VAR_ID)
+
+
+def validated_model(data, lazy=False):
+    model = TreeModel(lazy)
+    model.load_data(data)
+    validator = model.validator
+    validator.finished(validator.start(), validate_tree(model.root_item))
+    return model
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_incremental_validation_matches_full(app, schema, lazy):
+    rnd = random.Random(20)
+    data = schema(20)
+    # a duplicated varId and an empty title to start from
+    data[3]["varId"] = data[9]["varId"]
+    data[4]["title"] = ""
+    model = validated_model(data, lazy)
+    validator = model.validator
+    assert issues(validator.issues) == issues(validate_tree(model.root_item))
+    for step in range(150):
+        random_edit(model, rnd, step, ('rename', 'var_id', 'data_type', 'sources', 'remove', 'insert', 'undo',
+                                       'redo', 'fetch'))
+        assert issues(validator.issues) == issues(validate_tree(model.root_item)), step
+
+
+def test_each_edit_checks_the_item_it_touched(app, schema):
+    model = validated_model(schema(1))
+    validator = model.validator
+    folder = model.root_item.child(0)
+    text = folder.child(0)
+    model.setData(model.index_of(text), " ")
+    assert (EMPTY_TITLE, text) in validator.issues
+    model.set_data_type(folder, "Text")
+    assert (PRIMITIVE_CHILDREN, folder) in validator.issues
+    model.set_data_type(folder, "Nothing")
+    assert (UNKNOWN_TYPE, folder) in validator.issues
+    model.set_data_type(folder, "Folder")
+    model.set_sources(folder, ["irs"])
+    assert (FOLDER_SOURCES, folder) in validator.issues
+    model.setData(model.index_of(text), "some_int")
+    assert validator.issues[(SIBLING_TITLES, folder)].value == ("some_int",)
+    var_id = folder.child(1).getVarId()
+    model.undo_stack.push(SetFieldCommand(model, text, 'varId', var_id))
+    assert validator.issues[(DUPLICATE_VAR_ID, var_id)].value == (var_id, 2)
+    while model.undo_stack.canUndo():
+        model.undo_stack.undo()
+    assert not validator.issues
+
+
+def test_removal_holds_the_issues_of_its_subtree(app, schema, monkeypatch):
+    data = schema(2)
+    data[0]["children"][0]["title"] = ""
+    # the duplicate has one copy in the removed folder
+    var_id = data[0]["children"][1]["varId"]
+    data[6]["children"][1]["varId"] = var_id
+    data[7]["title"] = ""
+    # a duplicate outside of it, left alone
+    data[8]["varId"] = data[2]["varId"]
+    model = validated_model(data)
+    validator = model.validator
+    held = model.root_item.child(0).child(0)
+    kept = model.root_item.child(7)
+    assert {(EMPTY_TITLE, held), (EMPTY_TITLE, kept), (DUPLICATE_VAR_ID, var_id)} <= set(validator.issues)
+    removed_var_ids = subtree_var_ids(model.root_item.child(0))
+    checked = []
+    check_var_id = validator._check_var_id
+    monkeypatch.setattr(validator, '_check_var_id', lambda var_id: checked.append(var_id) or check_var_id(var_id))
+    model.removeRow(0)
+    # only the duplicates among the varIds removed are checked again
+    assert checked == [var_id]
+    assert var_id in removed_var_ids
+    monkeypatch.undo()
+    assert (EMPTY_TITLE, held) not in validator.issues
+    assert (DUPLICATE_VAR_ID, var_id) not in validator.issues
+    assert (EMPTY_TITLE, kept) in validator.issues
+    assert issues(validator.issues) == issues(validate_tree(model.root_item))
+    model.undo_stack.undo()
+    assert {(EMPTY_TITLE, held), (EMPTY_TITLE, kept), (DUPLICATE_VAR_ID, var_id)} <= set(validator.issues)
+    assert issues(validator.issues) == issues(validate_tree(model.root_item))
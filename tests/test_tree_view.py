@@ -0,0 +1,87 @@
+import time
+
+import pytest
+from PyQt5 import QtCore
+
+from conftest import walk
+from view import tree_view
+from view.tree_view import TreeView
+
+
+def run_events(app, done, seconds=30):
+    start = time.time()
+    while not done() and time.time() - start < seconds:
+        app.processEvents()
+    assert done()
+
+
+@pytest.fixture
+def view(app, schema):
+    view = TreeView()
+    view.resize(600, 400)
+    view.load_data(schema(20))
+    yield view
+    view.stop_search()
+    view.stop_validation()
+    view.close()
+
+
+def test_expand_all_opens_every_folder(app, view):
+    # one folder per slice, the rest are opened after the events between
+    view.expand_slice = 0
+    view.expandAll()
+    assert view._to_expand
+    run_events(app, lambda: not view._to_expand)
+    model = view.tree_model
+    for item in walk(model.root_item):
+        if item is not model.root_item and item.childItems:
+            assert view.isExpanded(model.index_of(item)), item.data()
+
+
+def test_collapse_all_stops_expanding(app, view):
+    view.expand_slice = 0
+    view.expandAll()
+    view.collapseAll()
+    app.processEvents()
+    model = view.tree_model
+    assert not any(view.isExpanded(model.index_of(item)) for item in walk(model.root_item)
+                   if item is not model.root_item)
+
+
+def test_search_opens_the_folders_of_every_match(app, view):
+    view.expand_slice = 0
+    done = []
+    view._search_worker.finished.connect(lambda *result: done.append(True))
+    view._start_search('some_text')
+    run_events(app, lambda: done and not view._to_expand)
+    matches = view.filter_model.matches
+    assert matches
+    for item in matches:
+        parent = item.parent()
+        while parent is not view.tree_model.root_item:
+            index = view.view_index(view.tree_model.index_of(parent))
+            assert index.isValid() and view.isExpanded(index), parent.data()
+            parent = parent.parent()
+    view._start_search('')
+    assert view.model() is view.tree_model
+    assert view.model().rowCount(QtCore.QModelIndex()) == view.tree_model.root_item.childCount()
+
+
+def test_typing_runs_a_single_search(app, view):
+    seq = view._search_seq
+    for text in ("s", "so", "som", "some"):
+        view.search(text)
+        app.processEvents()
+    assert view._search_seq == seq
+    run_events(app, lambda: view._search_seq != seq, seconds=5)
+    app.processEvents()
+    assert view._search_seq == seq + 1
+    assert view._search_text == "some"
+
+
+def test_new_var_ids_are_drawn_until_free(view, monkeypatch):
+    taken = view.tree_model.root_item.child(0).getVarId()
+    # the first draw is a varId already there
+    letters = iter(taken + "f" * len(taken))
+    monkeypatch.setattr(tree_view.random, 'choice', lambda population: next(letters))
+    assert view.randomString(len(taken)) == "f" * len(taken)
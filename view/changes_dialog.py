@@ -0,0 +1,51 @@
+from PyQt5 import QtWidgets
+from model.change_table_model import ChangeTableModel
+import json
+import traceback
+
+
+class ChangesDialog(QtWidgets.QDialog):
+
+    def __init__(self, changes, parent=None):
+        super().__init__(parent)
+        try:
+            self.changes = changes
+            self.setWindowTitle("Changes")
+            self.resize(900, 500)
+            self.table = QtWidgets.QTableView()
+            self.table.setModel(ChangeTableModel(changes, self))
+            self.table.verticalHeader().hide()
+            self.table.horizontalHeader().setStretchLastSection(True)
+            self.export_button = QtWidgets.QPushButton("Export")
+            self.export_button.setEnabled(len(changes) > 0)
+            self.export_button.clicked.connect(self.export)
+            close_button = QtWidgets.QPushButton("Close")
+            close_button.clicked.connect(self.accept)
+            buttons = QtWidgets.QHBoxLayout()
+            buttons.addWidget(QtWidgets.QLabel("{} changes".format(len(changes))))
+            buttons.addStretch()
+            buttons.addWidget(self.export_button)
+            buttons.addWidget(close_button)
+            layout = QtWidgets.QVBoxLayout(self)
+            layout.addWidget(self.table)
+            layout.addLayout(buttons)
+        except Exception as e:
+            print("ChangesDialog creation failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def export(self):
+        try:
+            options = QtWidgets.QFileDialog.Options()
+            options |= QtWidgets.QFileDialog.DontUseNativeDialog
+            file_path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Export", "", "Json Files (*.json);;All Files (*)",
+                                                                 options=options)
+            if file_path:
+                self.write_changes(file_path)
+        except Exception as e:
+            print("export failed: {}".format(e))
+            print(traceback.format_exc())
+            QtWidgets.QMessageBox.critical(QtWidgets.QMessageBox(), "Export Error", str(e))
+
+    def write_changes(self, file_path):
+        with open(file_path, 'w') as file:
+            json.dump([change.to_dict() for change in self.changes], file, indent=2)
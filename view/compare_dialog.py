@@ -0,0 +1,36 @@
+from PyQt5 import QtCore, QtWidgets
+import traceback
+
+
+class CompareDialog(QtWidgets.QDialog):
+    # a differing path was double clicked, to select it in the tree
+    path_activated = QtCore.pyqtSignal(str)
+
+    def __init__(self, file_path, path, branches, parent=None):
+        super().__init__(parent)
+        try:
+            self.setWindowTitle("Compare")
+            self.resize(700, 500)
+            below = " below {}".format(path) if path else ""
+            if branches is None:
+                text = "Neither the tree nor {} has {}.".format(file_path, path)
+            elif not branches:
+                text = "The tree and {} are identical{}.".format(file_path, below)
+            else:
+                text = "{} {} from {}{}.".format(len(branches), "branch differs" if len(branches) == 1 else
+                                                 "branches differ", file_path, below)
+            self.list = QtWidgets.QListWidget()
+            self.list.addItems(branches or [])
+            self.list.itemActivated.connect(lambda item: self.path_activated.emit(item.text()))
+            close_button = QtWidgets.QPushButton("Close")
+            close_button.clicked.connect(self.accept)
+            buttons = QtWidgets.QHBoxLayout()
+            buttons.addWidget(QtWidgets.QLabel(text))
+            buttons.addStretch()
+            buttons.addWidget(close_button)
+            layout = QtWidgets.QVBoxLayout(self)
+            layout.addWidget(self.list)
+            layout.addLayout(buttons)
+        except Exception as e:
+            print("CompareDialog creation failed: {}".format(e))
+            print(traceback.format_exc())
@@ -0,0 +1,56 @@
+from PyQt5 import QtCore, QtWidgets
+from model.issue_table_model import IssueTableModel
+import traceback
+
+
+class IssuesDialog(QtWidgets.QDialog):
+    # stays open while the tree is edited, the list follows the edits
+    issue_activated = QtCore.pyqtSignal(object)
+    check_clicked = QtCore.pyqtSignal()
+
+    def __init__(self, validator, parent=None):
+        super().__init__(parent)
+        try:
+            self.validator = validator
+            self.setWindowTitle("Validation")
+            self.resize(900, 500)
+            self.table_model = IssueTableModel(validator, self)
+            self.table = QtWidgets.QTableView()
+            self.table.setModel(self.table_model)
+            self.table.verticalHeader().hide()
+            self.table.horizontalHeader().setStretchLastSection(True)
+            self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+            self.table.activated.connect(lambda index: self.issue_activated.emit(self.table_model.issue(index.row())))
+            self.status_label = QtWidgets.QLabel()
+            check_button = QtWidgets.QPushButton("Check again")
+            check_button.clicked.connect(self.check_clicked)
+            close_button = QtWidgets.QPushButton("Close")
+            close_button.clicked.connect(self.close)
+            buttons = QtWidgets.QHBoxLayout()
+            buttons.addWidget(self.status_label)
+            buttons.addStretch()
+            buttons.addWidget(check_button)
+            buttons.addWidget(close_button)
+            layout = QtWidgets.QVBoxLayout(self)
+            layout.addWidget(self.table)
+            layout.addLayout(buttons)
+            validator.issuesChanged.connect(self.update_status)
+            self.update_status()
+        except Exception as e:
+            print("IssuesDialog creation failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def showEvent(self, event):
+        self.table_model.follow(True)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        # the rows are rebuilt once shown again instead of following the edits
+        self.table_model.follow(False)
+        super().hideEvent(event)
+
+    def update_status(self):
+        text = "{} issues".format(len(self.validator.issues))
+        if self.validator.running():
+            text += ", checking..."
+        self.status_label.setText(text)
@@ -1,4 +1,4 @@
-from PyQt5 import QtCore, QtWidgets
+from PyQt5 import QtCore, QtGui, QtWidgets
 from view.tree_view import TreeView
 import traceback
 
@@ -6,12 +6,17 @@ import traceback
 class MainWindow(QtWidgets.QWidget):
     # sygnals
     revert_button_clicked = QtCore.pyqtSignal()
+    changes_button_clicked = QtCore.pyqtSignal()
+    compare_button_clicked = QtCore.pyqtSignal()
+    validate_button_clicked = QtCore.pyqtSignal()
     data_type_changed = QtCore.pyqtSignal("QString")
     source_table_clicked = QtCore.pyqtSignal('QModelIndex')
     metadata_table_clicked = QtCore.pyqtSignal('QModelIndex')
     save_clicked = QtCore.pyqtSignal()
     search_text_entered = QtCore.pyqtSignal("QString ")
+    var_id_entered = QtCore.pyqtSignal("QString")
     change_var_id = QtCore.pyqtSignal()
+    load_cancel_clicked = QtCore.pyqtSignal()
 
     def __init__(self):
         super().__init__()
@@ -32,7 +37,14 @@ class MainWindow(QtWidgets.QWidget):
             self.save_button.clicked.connect(self.save_clicked)
             self.var_id_textbox.editingFinished.connect(self.change_var_id)
             self.revert_button.clicked.connect(self.revert_button_clicked)
+            self.changes_button.clicked.connect(self.changes_button_clicked)
+            self.compare_button.clicked.connect(self.compare_button_clicked)
+            self.validate_button.clicked.connect(self.validate_button_clicked)
             self.search_field.textChanged.connect(self.search_text_entered)
+            self.var_id_field.returnPressed.connect(lambda: self.var_id_entered.emit(self.var_id_field.text()))
+            self.load_cancel_button.clicked.connect(self.load_cancel_clicked)
+            self.undo_action.triggered.connect(self.tree_view.refresh_selection)
+            self.redo_action.triggered.connect(self.tree_view.refresh_selection)
         except Exception as e:
             print("connect_signals failed: {}".format(e))
             print(traceback.format_exc())
@@ -51,6 +63,7 @@ class MainWindow(QtWidgets.QWidget):
             self.path_value_textbox = QtWidgets.QLabel()
             self.type_combobox = QtWidgets.QComboBox()
             self.tree_view = TreeView()
+            self._create_undo_actions()
             self._create_right_side_layout()
             self._create_left_side_layout()
             splitter = QtWidgets.QSplitter()
@@ -67,21 +80,45 @@ class MainWindow(QtWidgets.QWidget):
         self.source_table.horizontalHeader().hide()
         self.source_table.verticalHeader().hide()
         self.source_table.setFixedHeight(62)
+        # the icon columns are sized from the visible rows only
+        self.source_table.horizontalHeader().setResizeContentsPrecision(0)
 
     def _create_metadata_table(self):
         self.metadata_table = QtWidgets.QTableView()
         self.metadata_table.verticalHeader().hide()
-        self.metadata_table.resizeRowsToContents()
-        self.metadata_table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        # rows of one line, sizing every row to its contents made each
+        # selection of an item with thousands of keys measure all of them;
+        # long values show in full as a tooltip
+        self.metadata_table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.metadata_table.horizontalHeader().setResizeContentsPrecision(0)
+
+    def _create_undo_actions(self):
+        undo_stack = self.tree_view.tree_model.undo_stack
+        self.undo_action = undo_stack.createUndoAction(self, "Undo")
+        self.undo_action.setShortcut(QtGui.QKeySequence.Undo)
+        self.redo_action = undo_stack.createRedoAction(self, "Redo")
+        self.redo_action.setShortcut(QtGui.QKeySequence.Redo)
+        self.addAction(self.undo_action)
+        self.addAction(self.redo_action)
 
     def _create_left_pane_buttons(self):
         layout = QtWidgets.QHBoxLayout()
         self.save_button = QtWidgets.QPushButton("Save")
+        self.undo_button = QtWidgets.QToolButton()
+        self.undo_button.setDefaultAction(self.undo_action)
+        self.redo_button = QtWidgets.QToolButton()
+        self.redo_button.setDefaultAction(self.redo_action)
         self.revert_button = QtWidgets.QPushButton("Revert")
+        self.changes_button = QtWidgets.QPushButton("Changes")
+        self.compare_button = QtWidgets.QPushButton("Compare")
         self.validate_button = QtWidgets.QPushButton("Validate")
         layout.addWidget(self.save_button)
+        layout.addWidget(self.undo_button)
+        layout.addWidget(self.redo_button)
         layout.addStretch()
         layout.addWidget(self.revert_button)
+        layout.addWidget(self.changes_button)
+        layout.addWidget(self.compare_button)
         layout.addStretch()
         layout.addWidget(self.validate_button)
         return layout
@@ -90,9 +127,29 @@ class MainWindow(QtWidgets.QWidget):
         layout = QtWidgets.QHBoxLayout()
         self.search_field = QtWidgets.QLineEdit()
         self.search_field.setPlaceholderText("Search...")
+        self.var_id_field = QtWidgets.QLineEdit()
+        self.var_id_field.setPlaceholderText("Go to VarId or /path...")
         layout.addWidget(self.search_field)
+        layout.addWidget(self.var_id_field)
+        return layout
+
+    def _create_progress_bar(self):
+        layout = QtWidgets.QHBoxLayout()
+        self.load_progress_bar = QtWidgets.QProgressBar()
+        self.load_progress_bar.setFormat("Loading... %p%")
+        self.load_cancel_button = QtWidgets.QPushButton("Cancel")
+        layout.addWidget(self.load_progress_bar)
+        layout.addWidget(self.load_cancel_button)
+        self.show_progress(False)
         return layout
 
+    def show_progress(self, visible):
+        self.load_progress_bar.setVisible(visible)
+        self.load_cancel_button.setVisible(visible)
+
+    def set_progress(self, percent):
+        self.load_progress_bar.setValue(percent)
+
     def _create_right_side_layout(self):
         layout = QtWidgets.QGridLayout(self.right_side_widget)
         layout.addWidget(QtWidgets.QLabel("Variable ID:"), 0, 0)
@@ -113,4 +170,5 @@ class MainWindow(QtWidgets.QWidget):
         layout.setContentsMargins(9, 0, 9, 0)
         layout.addLayout(self._create_left_pane_buttons())
         layout.addLayout(self._create_search_bar())
+        layout.addLayout(self._create_progress_bar())
         layout.addWidget(self.tree_view)
@@ -0,0 +1,13 @@
+from PyQt5 import QtGui, QtWidgets
+
+
+class TreeItemDelegate(QtWidgets.QStyledItemDelegate):
+    # a selected row keeps the color of its item (new, changed or clean)
+    # instead of the highlighted text color, with no stylesheet to re-polish
+    # the view on every selection
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        if option.state & QtWidgets.QStyle.State_Selected:
+            # the Text brush holds the ForegroundRole of the item by now
+            option.palette.setBrush(QtGui.QPalette.HighlightedText, option.palette.brush(QtGui.QPalette.Text))
@@ -1,25 +1,63 @@
 from PyQt5 import QtWidgets, QtCore
 from model.tree_model import TreeModel
+from model.tree_filter_model import TreeFilterModel
 from model.tree_item import TreeItem
+from model.search_worker import SearchWorker
+from model.validation_worker import ValidationWorker
 from model.type_manager import TypeManager
+from view.tree_item_delegate import TreeItemDelegate
 import random
 import string
+import time
 import traceback
 
 
 class TreeView(QtWidgets.QTreeView, QtCore.QObject):
+    # seconds of fetching for the raw matches of a search between events, at
+    # least
+    fetch_slice = 0.05
+    # seconds of opening folders between events, for expandAll and the
+    # folders leading to the matches of a search
+    expand_slice = 0.05
     tree_selection_changed = QtCore.pyqtSignal(object)
     tree_value_changed = QtCore.pyqtSignal(object)
+    search_requested = QtCore.pyqtSignal(int, int, str, object)
+    resolve_requested = QtCore.pyqtSignal(int, int, object)
+    index_requested = QtCore.pyqtSignal()
+    validation_requested = QtCore.pyqtSignal(int)
 
-    def __init__(self):
+    def __init__(self, lazy=False):
         try:
             QtWidgets.QTreeView.__init__(self)
             self.set_actions()
             self.initUI()
-            self.set_model()
+            self.set_model(lazy)
             self.setDragEnabled(True)
             self.index_selected = None
+            self._curItem = None
             self.text_to_search = ""
+            self._expanded_items = set()
+            self._search_timer = QtCore.QTimer()
+            self._search_timer.setSingleShot(True)
+            self._search_timer.setInterval(250)
+            self._search_timer.timeout.connect(lambda: self._start_search(self.text_to_search))
+            self._search_seq = 0
+            self._search_text = ""
+            # raw matches of the search in flight whose rows are being fetched
+            self._raw_fetch = None
+            self._raw_fetch_paused = 0.0
+            self._raw_fetch_timer = QtCore.QTimer()
+            self._raw_fetch_timer.setSingleShot(True)
+            self._raw_fetch_timer.timeout.connect(self._fetch_raw_matches)
+            # folders waiting to be opened, parents first, and the folders to
+            # open among their children (None for all of them)
+            self._to_expand = []
+            self._expand_folders = None
+            self._expand_timer = QtCore.QTimer()
+            self._expand_timer.setSingleShot(True)
+            self._expand_timer.timeout.connect(self._expand_next)
+            self._create_search_worker()
+            self._create_validation_worker()
             self.setFocusPolicy(QtCore.Qt.NoFocus)
         except Exception as e:
             print("View initialization failed: {}".format(e))
@@ -30,6 +68,7 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
             self._delete_action = self._create_menu_action('Delete', self._delete_slot)
             self._dup_action = self._create_menu_action('Duplicate', self._clone_slot)
             self._rename_action = self._create_menu_action('Rename', self._rename_slot)
+            self._revert_action = self._create_menu_action('Revert', self._revert_slot)
             self._add_child_folder_action = self._create_menu_action('New Folder', self.add_child_folder)
             self._add_child_primitive_action = self._create_menu_action('New Primitive', self.create_child_primitive)
             self._add_root_folder_action = self._create_menu_action('Add child container', self.add_root_folder)
@@ -38,25 +77,146 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
             print("set_actions failed: {}".format(e))
             print(traceback.format_exc())
 
-    def set_model(self):
-        self.tree_model = TreeModel()
+    def set_model(self, lazy=False):
+        self.tree_model = TreeModel(lazy)
         self.tree_model.dataChanged.connect(self._dataChanged)
         self.tree_model.rowMoved.connect(self._rowMoved)
+        # the proxy only sits between the model and the view while a search
+        # filters rows, it would double the work of every layout otherwise;
+        # self.index_selected and the actions work on the source model
+        self.filter_model = TreeFilterModel(self.tree_model)
+        # the open folder an insert goes into, closed until it is done
+        self._reopened = None
         self.setModel(self.tree_model)
 
+    def _set_view_model(self, model):
+        # a new model resets the view, its rows start collapsed
+        self._stop_expanding()
+        selection_model = self.selectionModel()
+        self.setModel(model)
+        selection_model.deleteLater()
+
+    # inherited Method
+    def setModel(self, model):
+        previous = self.model()
+        if previous is not None:
+            previous.rowsAboutToBeInserted.disconnect(self._close_parent)
+            previous.rowsInserted.disconnect(self._reopen_parent)
+        QtWidgets.QTreeView.setModel(self, model)
+        # connected after the view, so that it has taken the rows when the
+        # folder opens again
+        model.rowsAboutToBeInserted.connect(self._close_parent)
+        model.rowsInserted.connect(self._reopen_parent)
+
+    def _close_parent(self, parent, first, last):
+        # rows put into an open folder make Qt lay out every shown row again,
+        # a closed one just takes them; opening it again afterwards lays out
+        # its own rows only. Fetches come from the layout itself and are
+        # left alone, rows put at the top level always cost a layout.
+        if parent.isValid() and not self.tree_model.fetching() and self.isExpanded(parent):
+            self._reopened = QtCore.QPersistentModelIndex(parent), self.verticalScrollBar().value()
+            self.collapse(parent)
+
+    def _reopen_parent(self, parent, first, last):
+        if self._reopened is None:
+            return
+        parent, scrolled = self._reopened
+        self._reopened = None
+        self.expand(QtCore.QModelIndex(parent))
+        self.verticalScrollBar().setValue(scrolled)
+
+    def view_index(self, index):
+        # index of the source model -> index shown by the view
+        if self.model() is self.filter_model:
+            if self.filter_model.sourceModel() is None:
+                # a search without matches shows no row
+                return QtCore.QModelIndex()
+            return self.filter_model.mapFromSource(index)
+        return index
+
+    def source_index(self, index):
+        if self.model() is self.filter_model:
+            return self.filter_model.mapToSource(index)
+        return index
+
+    def _restore_current(self):
+        # the current row does not survive a new model, its folders are
+        # opened again to show it
+        if self._curItem is not None and self.tree_model.contains_item(self._curItem):
+            self.index_selected = self.tree_model.index_of(self._curItem)
+            self.setCurrentIndex(self.view_index(self.index_selected))
+
+    def _clear_filter(self):
+        if self.model() is self.filter_model:
+            self._set_view_model(self.tree_model)
+            self._restore_current()
+        self._expanded_items = set()
+        self.filter_model.clear_filter()
+
+    def _create_search_worker(self):
+        self._search_worker = SearchWorker(self.tree_model)
+        self._search_thread = QtCore.QThread()
+        self._search_worker.moveToThread(self._search_thread)
+        self.search_requested.connect(self._search_worker.search)
+        self.resolve_requested.connect(self._search_worker.resolve)
+        self.index_requested.connect(self._search_worker.index)
+        self._search_worker.raw_matched.connect(self._raw_matched)
+        self._search_worker.finished.connect(self._search_finished)
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.stop_search)
+        self._search_thread.start()
+
+    def stop_search(self):
+        self._search_seq += 1
+        self._search_worker.cancel(self._search_seq)
+        self._search_thread.quit()
+        self._search_thread.wait()
+
+    def _create_validation_worker(self):
+        self._validation_worker = ValidationWorker(self.tree_model)
+        self._validation_thread = QtCore.QThread()
+        self._validation_worker.moveToThread(self._validation_thread)
+        self.validation_requested.connect(self._validation_worker.validate)
+        self._validation_worker.finished.connect(self.tree_model.validator.finished)
+        self.tree_model.validator.checkNeeded.connect(self.validate)
+        QtWidgets.QApplication.instance().aboutToQuit.connect(self.stop_validation)
+        self._validation_thread.start()
+
+    def validate(self):
+        # full check in the worker, the edits made meanwhile are followed
+        seq = self.tree_model.validator.start()
+        self._validation_worker.cancel(seq)
+        self.validation_requested.emit(seq)
+
+    def stop_validation(self):
+        self._validation_worker.cancel(-1)
+        self._validation_thread.quit()
+        self._validation_thread.wait()
+
     """
         actions
     """
 
     def load_data(self, data):
         self.tree_model.load_data(data)
+        self.index_requested.emit()
+
+    def append_items(self, items):
+        self.tree_model.append_items(items)
+        self.index_requested.emit()
 
     def clearContent(self):
-        root_index = self.tree_model.index(0, 0).parent()
-        i = self.tree_model.rowCount(root_index)
-        while i:
-            self.tree_model.removeRow(i - 1, root_index)
-            i -= 1
+        self.tree_model.clear()
+        self._validation_worker.cancel(self.tree_model.validator.seq)
+        self._stop_expanding()
+        self._expanded_items = set()
+
+    def revert(self):
+        # a model reset, the search has to run again on the restored tree
+        self.tree_model.revert()
+        self._curItem = None
+        self._clear_filter()
+        if self.text_to_search.replace(' ', '') != "":
+            self._start_search(self.text_to_search)
 
     def getRootItem(self):
         if self.tree_model.hasIndex(0, 0):
@@ -64,23 +224,58 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
         return None
 
     def _rowMoved(self, curIdx):
-        self.setCurrentIndex(curIdx)
+        self.setCurrentIndex(self.view_index(curIdx))
         self.index_selected = curIdx
         self._curItem = self.tree_model.get_item(self.index_selected)
         self.tree_selection_changed.emit(self._curItem)
 
-    def _dataChanged(self, index):
-        self._curItem.setValueChanged(True)
-        self.tree_value_changed.emit(index.data())
+    def _dataChanged(self, index, bottom_right=None, roles=()):
+        # renames come without roles, other edits only name what they repaint
+        if roles:
+            return
+        item = self.tree_model.get_item(index)
+        item.setValueChanged(True)
+        if item is self._curItem:
+            self.tree_value_changed.emit(index.data())
+
+    def refresh_selection(self):
+        # after an undo or redo the selected item may be gone or changed
+        if self._curItem is not None and not self.tree_model.contains_item(self._curItem):
+            self._curItem = None
+        self.index_selected = self.tree_model.index_of(self._curItem)
+        self.setCurrentIndex(self.view_index(self.index_selected))
+        self.tree_selection_changed.emit(self._curItem)
 
     def mousePressEvent(self, event):
         QtWidgets.QTreeView.mousePressEvent(self, event)
-        self.index_selected = self.indexAt(event.pos())
-        self.setCurrentIndex(self.index_selected)
+        self.setCurrentIndex(self.indexAt(event.pos()))
+        self.index_selected = self.source_index(self.indexAt(event.pos()))
         self._curItem = None if self.index_selected.data() is None else self.tree_model.get_item(self.index_selected)
         self.tree_selection_changed.emit(self._curItem)
 
 
+    def select_var_id(self, var_id):
+        return self.select_item(self.tree_model.find_var_id(var_id))
+
+    def select_path(self, path):
+        return self.select_item(self.tree_model.find_path(path))
+
+    def select_issue(self, issue):
+        return self.select_item(self.tree_model.find_issue(issue))
+
+    def select_item(self, item):
+        if item is None:
+            return False
+        # an item hidden by the search is shown until the next one
+        self.filter_model.reveal(item)
+        self.index_selected = self.tree_model.index_of(item)
+        index = self.view_index(self.index_selected)
+        self.scrollTo(index)
+        self.setCurrentIndex(index)
+        self._curItem = item
+        self.tree_selection_changed.emit(self._curItem)
+        return True
+
     def getCurItem(self):
         return self._curItem
 
@@ -91,8 +286,12 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
 
 
     def randomString(self, stringLength=20):
+        # drawn again until no item has it
         letters = string.ascii_letters + string.digits
-        return ''.join(random.choice(letters) for i in range(stringLength))
+        while True:
+            var_id = ''.join(random.choice(letters) for i in range(stringLength))
+            if not self.tree_model.search_index.var_id_index.contains(var_id):
+                return var_id
 
     def _set_menu_items_visible(self, visible):
         self._delete_action.setVisible(visible[0])
@@ -102,15 +301,16 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
         self._add_child_primitive_action.setVisible(visible[4])
         self._add_root_folder_action.setVisible(visible[5])
         self._add_root_primitive_action.setVisible(visible[6])
+        self._revert_action.setVisible(visible[7])
 
     def _open_menu(self, position):
         if self._curItem is None:
-            self._set_menu_items_visible([False, False, False, False, False, True, True])
+            self._set_menu_items_visible([False, False, False, False, False, True, True, False])
         else:
             if self._curItem.dataType in TypeManager.collections:
-                self._set_menu_items_visible([True, True, True, True, True, False, False])
+                self._set_menu_items_visible([True, True, True, True, True, False, False, True])
             else:
-                self._set_menu_items_visible([True, True, True, False, False, False, False])
+                self._set_menu_items_visible([True, True, True, False, False, False, False, True])
         self._context_menu.exec_(self.viewport().mapToGlobal(position))
 
     def _rename_slot(self):
@@ -120,70 +320,71 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
         except Exception as e:
             print(str(e))
 
+    def _revert_slot(self):
+        if not self.tree_model.is_modified(self.index_selected):
+            # nothing to put back, and the undo history stays
+            return
+        if not self.tree_model.revert(self.index_selected):
+            QtWidgets.QMessageBox.warning(self, "Revert", "The item was moved below its own former children, "
+                                                          "revert the parent they were loaded under instead.")
+            return
+        # moves across the subtree reset the model and the selection with it
+        self.index_selected = self.tree_model.index_of(self._curItem)
+        self.setCurrentIndex(self.view_index(self.index_selected))
+        self.tree_selection_changed.emit(self._curItem)
+
     def _delete_slot(self):
         parent = self.index_selected.parent()
         pos = self.index_selected.row()
         self.tree_model.removeRow(pos, parent)
-        self._curItem = self.tree_model.get_item(self.currentIndex())
+        self._curItem = self.tree_model.get_item(self.source_index(self.currentIndex()))
         self.tree_selection_changed.emit(self._curItem)
 
-    def set_copy_of(self, item):
-        item.setVarId("copy_of_" + item.getVarId())
-        item.setNewAdded(True)
-        for child in item.childItems:
-            self.set_copy_of(child)
-
     def _clone_slot(self):
         parentItem = self._curItem.parent()
         dup_Item = self.create_slot(parentItem)
-        for item in dup_Item.childItems:
-            self.set_copy_of(item)
         pos = self.index_selected.row()
-        parentItem.insertChild(pos + 1, dup_Item)
-        self.tree_model.insertRow(pos, self.index_selected.parent())
+        self.tree_model.insert_item(pos + 1, dup_Item, self.index_selected.parent())
         self._curItem = dup_Item
         self.tree_selection_changed.emit(self._curItem)
 
     def create_slot(self, parentItem):
-        dup_Item = self._curItem.create_duplicate(parentItem)
+        prefix = self.tree_model.free_var_id_prefix(self._curItem, "copy_of_")
+        dup_Item = self._curItem.create_duplicate(parentItem, prefix)
         dup_Item.setData("Copy of " + self._curItem.data())
-        dup_Item.setVarId("copy_of_" + self._curItem.getVarId())
-        dup_Item.setNewAdded(True)
         return dup_Item
 
     def add_child_folder(self):
         parentItem = self.tree_model.get_item(self.index_selected)
         new_Item = self.create_new_folder(parentItem)
-        parentItem.insertChild(0, new_Item)
         count = 0
         self.insert_row_to_tree(count, new_Item)
 
     def add_root_folder(self):
         self.index_selected = self.tree_model.index(0, 0).parent()
+        self.tree_model.fetch_remaining(self.index_selected)
         parentItem = self.tree_model.get_item(self.index_selected)
         new_Item = self.create_new_folder(parentItem)
-        parentItem.appendChild(new_Item)
-        count = parentItem.childCount() - 1
+        count = parentItem.childCount()
         self.insert_row_to_tree(count, new_Item)
 
     def create_root_primitive(self):
         self.index_selected = self.tree_model.index(0, 0).parent()
+        self.tree_model.fetch_remaining(self.index_selected)
         parentItem = self.tree_model.get_item(self.index_selected)
         new_Item = self.create_new_item(parentItem)
-        parentItem.appendChild(new_Item)
-        count = parentItem.childCount() - 1
+        count = parentItem.childCount()
         self.insert_row_to_tree(count, new_Item)
 
     def create_child_primitive(self):
         parentItem = self.tree_model.get_item(self.index_selected)
         new_Item = self.create_new_item(parentItem)
-        parentItem.insertChild(0, new_Item)
         count = 0
         self.insert_row_to_tree(count, new_Item)
 
     def insert_row_to_tree(self, count, new_Item):
-        self.tree_model.insertRow(count, self.index_selected)
-        self.setCurrentIndex(self.tree_model.index(count, 0, self.index_selected))
+        self.tree_model.insert_item(count, new_Item, self.index_selected)
+        self.setCurrentIndex(self.view_index(self.tree_model.index(count, 0, self.index_selected)))
         self._curItem = new_Item
         self.tree_selection_changed.emit(self._curItem)
 
@@ -207,60 +408,171 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
         new_Item.setNewAdded(True)
         return new_Item
 
-    def _start_search(self, text):
-        if not self.tree_model.hasIndex(0, 0) or text.replace(' ', '') == "":
-            self._show_all(self.tree_model.index(0, 0).parent())
-            self.collapseAll()
-            return
-        root_idx = self.tree_model.index(0, 0).parent()
-        self._show_all(root_idx)
+    def search(self, text):
+        # restarted on every keystroke, so fast typing runs a single search
         self.text_to_search = text
-        self._searching(root_idx)
-        self.expandAll()
+        self._search_timer.start()
 
-    def _show_all(self, index):
-        item = self.tree_model.get_item(index)
-        if item.childCount() == 0:
+    def _start_search(self, text):
+        # a newer request makes the worker drop the one in flight
+        self._search_seq += 1
+        self._search_worker.cancel(self._search_seq)
+        self._raw_fetch = None
+        if not self.tree_model.hasChildren() or text.replace(' ', '') == "":
+            # back on the model the view starts collapsed, the folders the
+            # search opened are closed without a layout of the filtered rows
+            self._clear_filter()
             return
-        for i in range(item.childCount()):
-            idx = self.tree_model.index(i, 0, index)
-            _item = self.tree_model.get_item(idx)
-            _item.isHidden = False
-            self.setRowHidden(_item.childNumber(), idx.parent(), False)
-
-            self._show_all(idx)
-
+        # the worker matches the raw json too, the model is left as it is
+        self._search_text = text
+        self.search_requested.emit(self._search_seq, self.tree_model.edits, text,
+                                   self.tree_model.search_index.pending_children())
 
-    def _searching(self, index):
-        for i in range(self.tree_model.rowCount(index)):
-            idx = self.tree_model.index(i, 0)
-            self._search_func(idx)
-
-    def _search_func(self, index):
+    def _raw_matched(self, seq, edits, matches, raw_matches):
+        if seq != self._search_seq:
+            return
+        self._raw_fetch = (seq, edits, matches, iter(raw_matches), {})
+        self._raw_fetch_paused = time.monotonic()
+        self._fetch_raw_matches()
+
+    def _fetch_raw_matches(self):
+        # the rows of the raw matches are fetched a slice at a time, the
+        # events are handled in between
+        if self._raw_fetch is None or self._raw_fetch[0] != self._search_seq:
+            return
+        seq, edits, matches, raw_matches, built = self._raw_fetch
+        if edits != self.tree_model.edits:
+            self._start_search(self._search_text)
+            return
+        # a slice lasts as long as the events handled since the previous
+        # one, the layouts of the fetched rows take half of the time at most
+        now = time.monotonic()
+        deadline = now + max(self.fetch_slice, now - self._raw_fetch_paused)
         try:
-            item = self.tree_model.get_item(index)
-            if self.text_to_search.lower() in item.data().lower():
-                item.isHidden = False
-                item.parent().isHidden = False
-                self.setRowHidden(item.childNumber(), index.parent(), False)
-                return
-
-            if item.childCount() == 0:
-                item.isHidden = True
-                item.parent().isHidden = True
-                self.setRowHidden(item.childNumber(), index.parent(), True)
-                return
-
-            for i in range(item.childCount()):
-                idx = self.tree_model.index(i, 0, index)
-                self._search_func(idx)
-
-            self.setRowHidden(item.childNumber(), index.parent(), item.isHidden)
+            for item, children, rows in raw_matches:
+                match = self.tree_model.fetch_rows(item, children, rows, built)
+                if match is None:
+                    self._start_search(self._search_text)
+                    return
+                matches.add(match)
+                if time.monotonic() > deadline:
+                    self._hide_rows()
+                    self._raw_fetch_paused = time.monotonic()
+                    self._raw_fetch_timer.start()
+                    return
         except Exception as e:
             print("search failed: {}".format(e))
             print(traceback.format_exc())
+            return
+        self._raw_fetch = None
+        self.resolve_requested.emit(seq, edits, matches)
+
+    def _hide_rows(self):
+        # rows fetched into the shown tree make Qt lay out every shown row
+        # after each slice; the empty filter shows none until the search ends
+        if self.model() is not self.filter_model:
+            self.filter_model.clear_filter()
+            self._set_view_model(self.filter_model)
+            self._expanded_items = set()
+
+    def _search_finished(self, seq, edits, matches, ancestors, filtered_parents):
+        if seq != self._search_seq:
+            return
+        if edits != self.tree_model.edits:
+            # the tree was edited while the worker read it, search again
+            self._start_search(self.text_to_search)
+            return
+        ancestors.discard(self.tree_model.root_item)
+        self.setUpdatesEnabled(False)
+        try:
+            # the proxy starts over when it shows no source yet
+            swapped = self.model() is not self.filter_model or self.filter_model.sourceModel() is None
+            if swapped:
+                if self.model() is self.filter_model:
+                    # a source put into the shown proxy is laid out right
+                    # away, and once more for the folders opened below
+                    self._set_view_model(self.tree_model)
+                self.filter_model.set_filter(matches, ancestors, filtered_parents)
+                self._set_view_model(self.filter_model)
+                self._expanded_items = set()
+            else:
+                # stale folders are closed first, the proxy then has fewer
+                # expanded rows to carry over its invalidate
+                self._collapse_items(self._expanded_items - ancestors)
+                self.filter_model.set_filter(matches, ancestors, filtered_parents)
+            # with the layout the new model or the filter has pending, the
+            # first slice only records the folders it opens
+            self._open_folders(ancestors)
+            if swapped:
+                self._restore_current()
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def _collapse_items(self, items):
+        # folders opened by the previous query that lead to no match anymore
+        # are closed again, so the view does not lay out their rows
+        if len(items) > 64:
+            # with a layout pending, expand/collapse only record the state
+            # instead of laying out after each call; the filter lays out
+            # every shown row next anyway
+            self.scheduleDelayedItemsLayout()
+        for item in items:
+            if self.tree_model.contains_item(item):
+                self.collapse(self.view_index(self.tree_model.index_of(item)))
+        self._expanded_items = self._expanded_items - items
+
+    def _open_folders(self, folders=None):
+        # folders (all of them for None) are opened parents first, a slice
+        # at a time with the events handled in between. Qt lays out the rows
+        # of each folder as it opens, opening them all at once would lay out
+        # every row of the tree in one go.
+        self._expand_folders = folders
+        self._to_expand = [self.tree_model.root_item]
+        self._expand_next()
+
+    def _stop_expanding(self):
+        self._to_expand = []
+        self._expand_timer.stop()
+
+    def _expand_next(self):
+        deadline = time.monotonic() + self.expand_slice
+        folders = self._expand_folders
+        stack = self._to_expand
+        while stack:
+            item = stack.pop()
+            if item is not self.tree_model.root_item:
+                if not self.tree_model.contains_item(item):
+                    continue
+                index = self.tree_model.index_of(item)
+                if self.model() is self.tree_model:
+                    # the folder opens on all of its rows, Qt would fetch
+                    # a batch of them in the layout only
+                    while self.tree_model.canFetchMore(index):
+                        self.tree_model.fetchMore(index)
+                view_index = self.view_index(index)
+                if not view_index.isValid():
+                    # filtered out, its folders are not shown either
+                    continue
+                self.expand(view_index)
+                self._expanded_items.add(item)
+            stack.extend(reversed([child for child in item.childItems if (
+                child in folders if folders is not None else child.childItems or child.hasPendingChildren())]))
+            if stack and time.monotonic() > deadline:
+                self._expand_timer.start()
+                return
 
+    # inherited Method
+    def expandAll(self):
+        # Qt would lay out every row of the tree at once, which blocks for
+        # seconds on a large one
+        self._open_folders()
 
+    # inherited Method
+    def collapseAll(self):
+        # the folders still waiting would open again afterwards
+        self._stop_expanding()
+        self._expanded_items = set()
+        QtWidgets.QTreeView.collapseAll(self)
 
     """
     Initialize UI
@@ -270,11 +582,16 @@ class TreeView(QtWidgets.QTreeView, QtCore.QObject):
         self._context_menu.addAction(self._delete_action)
         self._context_menu.addAction(self._dup_action)
         self._context_menu.addAction(self._rename_action)
+        self._context_menu.addAction(self._revert_action)
         self._context_menu.addAction(self._add_child_folder_action)
         self._context_menu.addAction(self._add_child_primitive_action)
         self._context_menu.addAction(self._add_root_folder_action)
         self._context_menu.addAction(self._add_root_primitive_action)
         self.header().hide()
+        # every row has the height of the first, so the view never asks the
+        # delegate for the size of the others
+        self.setUniformRowHeights(True)
+        self.setItemDelegate(TreeItemDelegate(self))
         self.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
         self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self._open_menu)
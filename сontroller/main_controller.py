@@ -1,10 +1,18 @@
 import sys
+from functools import partial
 from PyQt5 import QtCore, QtWidgets
 from model.type_manager import TypeManager
 from model.json_file_manager import JsonFileManager
+from model.tree_loader import TreeLoader
 from model.source_table_model import SourceTableModel
 from model.metadata_table_model import MetadataTableModel
+from model.tree_diff import diff_baseline
+from model.compare_worker import CompareWorker
+from model.tree_hash import install_digests
 from view.main_view import MainWindow
+from view.changes_dialog import ChangesDialog
+from view.compare_dialog import CompareDialog
+from view.issues_dialog import IssuesDialog
 import traceback
 
 
@@ -12,11 +20,20 @@ class MainController:
 
     def __init__(self):
         self._app = QtWidgets.QApplication(sys.argv)
-        self._source_model = SourceTableModel()
+        # the side panel keeps its models and rebinds them to the selection
+        self.source_model = SourceTableModel()
+        self.metadata_model = MetadataTableModel()
+        self._type_list = None
         self.main_view = MainWindow()
         self.selectedItem = None
         self.is_selection_changed = False
         self.is_selection_changed = False
+        self.loader = None
+        self._loaders = []
+        # only a complete load can serve as the baseline of a revert
+        self.load_complete = False
+        self.compare_dialog = None
+        self.issues_dialog = None
         self.init()
 
     def init(self):
@@ -26,6 +43,9 @@ class MainController:
             self.set_metadata_table_model()
             self.set_source_table_model()
             self.main_view.revert_button_clicked.connect(self.revert_clicked)
+            self.main_view.changes_button_clicked.connect(self.changes_clicked)
+            self.main_view.compare_button_clicked.connect(self.compare_clicked)
+            self.main_view.validate_button_clicked.connect(self.validate_clicked)
             self.main_view.data_type_changed.connect(self.data_type_changed)
             self.main_view.source_table_clicked.connect(self.source_table_clicked)
             self.main_view.tree_view.tree_selection_changed.connect(self.tree_selection_changed)
@@ -34,6 +54,8 @@ class MainController:
             self.main_view.save_clicked.connect(self.save_clicked)
             self.main_view.search_text_entered.connect(self.do_search)
             self.main_view.change_var_id.connect(self.change_var_id)
+            self.main_view.var_id_entered.connect(self.go_to_var_id)
+            self.main_view.load_cancel_clicked.connect(self.cancel_loading)
         except Exception as e:
             print("Controller initialization failed: {}".format(e))
             print(traceback.format_exc())
@@ -44,15 +66,15 @@ class MainController:
             self.main_view.right_side_widget.setTitle("")
             self.main_view.var_id_textbox.setText("")
             self.main_view.path_value_textbox.setText("")
-            self.main_view.source_table.setModel(SourceTableModel())
-            self.main_view.metadata_table.setModel(MetadataTableModel())
+            self.source_model.set_sources(None)
+            self.metadata_model.set_metadata(None)
         except Exception as e:
             print("disable_right_panel failed: {}".format(e))
             print(traceback.format_exc())
 
     def metadata_changed(self):
         try:
-            self.selectedItem.setMetaData(self.main_view.metadata_table.model().getMetaData())
+            self.main_view.tree_view.tree_model.set_metadata(self.selectedItem, self.metadata_model.getMetaData())
             self.selectedItem.setValueChanged(True)
             self.set_decoration_role()
             return
@@ -62,7 +84,7 @@ class MainController:
 
     def do_search(self, text):
         try:
-            self.main_view.tree_view._start_search(text)
+            self.main_view.tree_view.search(text)
         except Exception as e:
             print("do_search failed: {}".format(e))
             print(traceback.format_exc())
@@ -73,16 +95,34 @@ class MainController:
                 dialog_result = QtWidgets.QMessageBox.question(QtWidgets.QMessageBox(), "Confirm",
                                                                "Are you sure you want to change VarId?")
                 if dialog_result == QtWidgets.QMessageBox.Yes:
-                    self.selectedItem.setVarId(self.main_view.var_id_textbox.text())
+                    var_id = self.main_view.var_id_textbox.text()
+                    if not self.main_view.tree_view.tree_model.set_var_id(self.selectedItem, var_id):
+                        self.main_view.var_id_textbox.setText(self.selectedItem.getVarId())
+                        QtWidgets.QMessageBox.warning(QtWidgets.QMessageBox(), "VarId",
+                                                      "The VarId {} is already used.".format(var_id))
+                        return
                     self.selectedItem.setValueChanged(True)
                     self.set_decoration_role()
         except Exception as e:
             print("change_var_id failed: {}".format(e))
             print(traceback.format_exc())
 
+    def go_to_var_id(self, var_id):
+        try:
+            if var_id.startswith('/'):
+                if not self.main_view.tree_view.select_path(var_id):
+                    QtWidgets.QMessageBox.information(QtWidgets.QMessageBox(), "Path",
+                                                      "No item is at {}.".format(var_id))
+            elif var_id and not self.main_view.tree_view.select_var_id(var_id):
+                QtWidgets.QMessageBox.information(QtWidgets.QMessageBox(), "VarId",
+                                                  "No item has the VarId {}.".format(var_id))
+        except Exception as e:
+            print("go_to_var_id failed: {}".format(e))
+            print(traceback.format_exc())
+
     def source_changed(self):
         try:
-            self.selectedItem.setSources(self.main_view.source_table.model().getSources())
+            self.main_view.tree_view.tree_model.set_sources(self.selectedItem, self.source_model.getSources())
             self.selectedItem.setValueChanged(True)
             self.set_decoration_role()
             return
@@ -91,35 +131,21 @@ class MainController:
             print(traceback.format_exc())
 
     def set_decoration_role(self):
+        # only the row is repainted, its delegate picks the selected color
         index = self.main_view.tree_view.selectedIndexes()[0]
         self.main_view.tree_view.dataChanged(index,
                                              index,
-                                             [QtCore.Qt.DecorationRole])
-        self.main_view.tree_view.dataChanged(index,
-                                             index,
-                                             [QtCore.Qt.ForegroundRole])
-        self.set_style_to_tree('blue')
-
-    def set_style_to_tree(self, style):
-        self.main_view.tree_view.setStyleSheet(
-            '''
-                QTreeView::item::selected {
-                  selection-color: ''' + style + ''';
-                }
-            '''
-        )
+                                             [QtCore.Qt.DecorationRole, QtCore.Qt.ForegroundRole])
 
     def data_type_changed(self, selected):
         try:
             if self.is_selection_changed:
                 return
-            model = SourceTableModel(self.selectedItem.getSources())
-            self.main_view.source_table.setModel(model)
-            model.dataChanged.connect(self.source_changed)
+            self.source_model.set_sources(self.selectedItem.getSources())
             self.main_view.source_table.setDisabled(selected == "Folder")
             if self.selectedItem.getDataType() == selected:
                 return
-            self.selectedItem.setDataType(selected)
+            self.main_view.tree_view.tree_model.set_data_type(self.selectedItem, selected)
             current_index = self.main_view.tree_view.selectedIndexes()[0]
             self.main_view.tree_view.dataChanged(current_index, current_index, [QtCore.Qt.DecorationRole])
             self.selectedItem.setValueChanged(True)
@@ -139,7 +165,6 @@ class MainController:
 
     def tree_selection_changed(self, selected):
         try:
-            self.select_dynamic_style(selected)
             #self.change_var_id()
             self.selectedItem = selected
             if selected is None:
@@ -150,12 +175,15 @@ class MainController:
             self.main_view.right_side_widget.setTitle(self.selectedItem.data())
             self.main_view.path_value_textbox.setText(self.selectedItem.fullPath())
             self.is_selection_changed = True
-            self.main_view.type_combobox.clear()
-            if len(selected.getSources()) > 0 and "Folder" in TypeManager.get_types_list(self.selectedItem.getDataType()):
-                self.main_view.type_combobox.addItems(TypeManager.get_types_list(self.selectedItem.getDataType()))
-                self.main_view.type_combobox.model().item(0).setEnabled(False)
-            else:
-                self.main_view.type_combobox.addItems(TypeManager.get_types_list(self.selectedItem.getDataType()))
+            types = TypeManager.get_types_list(self.selectedItem.getDataType())
+            if types is not self._type_list:
+                # refilled only when the selection goes between collections
+                # and primitives
+                self._type_list = types
+                self.main_view.type_combobox.clear()
+                self.main_view.type_combobox.addItems(types)
+            self.main_view.type_combobox.model().item(0).setEnabled(
+                not (len(selected.getSources()) > 0 and "Folder" in types))
             self.main_view.type_combobox.setCurrentText(self.selectedItem.getDataType())
             self.is_selection_changed = False
             self.data_type_changed(self.selectedItem.getDataType())
@@ -166,21 +194,9 @@ class MainController:
 
 
 
-    def select_dynamic_style(self, selected):
-        if selected.valueChanged:
-            style = 'blue'
-        elif selected.newAdded:
-            style = 'green'
-        else:
-            style = 'black'
-        self.set_style_to_tree(style)
-
-
     def update_metadata_model(self):
         try:
-            model = MetadataTableModel(self.selectedItem.getMetaData())
-            self.main_view.metadata_table.setModel(model)
-            model.dataChanged.connect(self.metadata_changed)
+            self.metadata_model.set_metadata(self.selectedItem.getMetaData())
         except Exception as e:
             print("update_metadata_model failed: {}".format(e))
             print(traceback.format_exc())
@@ -222,47 +238,196 @@ class MainController:
         try:
             dialog_result = QtWidgets.QMessageBox.question(QtWidgets.QMessageBox(), "Save", "Would you save the changes?")
             if dialog_result == QtWidgets.QMessageBox.Yes:
-                root_item = self.main_view.tree_view.getRootItem()
-                result_file = []
-                for child in root_item.childItems:
-                    result_file.append(child.create_new_item())
-                self.JsonManager.save_json_file(result_file)
-                self.JsonManager.json_data = result_file
+                self.JsonManager.save_tree(self.main_view.tree_view.tree_model.root_item)
+                # revert now goes back to what was saved
+                self.main_view.tree_view.tree_model.baseline.clear()
         except Exception as e:
             print("save_clicked failed: {}".format(e))
             print(traceback.format_exc())
+            # the previous file is left untouched
+            QtWidgets.QMessageBox.critical(QtWidgets.QMessageBox(), "Save Error", str(e))
 
     def get_json_data(self):
         try:
             self.JsonManager = JsonFileManager()
-            self.JsonManager.get_json_data()
+            self.JsonManager.select_file()
         except Exception as e:
             print("get_json_data failed: {}".format(e))
             print(traceback.format_exc())
 
     def create_tree(self):
         try:
-            self.main_view.tree_view.load_data(self.JsonManager.json_data)
             self.disable_right_panel()
+            if not self.JsonManager.file_path:
+                return
+            self.cancel_loading()
+            self.load_complete = False
+            tree_model = self.main_view.tree_view.tree_model
+            tree_model.set_lazy(self.JsonManager.is_large_file())
+            loader = TreeLoader(self.JsonManager.file_path, tree_model.build_item, not tree_model.lazy)
+            thread = self._worker_thread(loader, loader.finished, loader.failed, loader.cancelled)
+            loader.items_loaded.connect(partial(self.items_loaded, loader))
+            loader.progress.connect(partial(self.loading_progress, loader))
+            loader.finished.connect(partial(self.loading_finished, loader))
+            loader.failed.connect(partial(self.loading_failed, loader))
+            self.loader = loader
+            self.main_view.save_button.setEnabled(False)
+            self.main_view.show_progress(True)
+            thread.start()
         except Exception as e:
             print("create_tree failed: {}".format(e))
             print(traceback.format_exc())
 
+    def _worker_thread(self, worker, *done):
+        # runs worker.run in a thread of its own, quit by any of the done signals
+        thread = QtCore.QThread()
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        for signal in done:
+            signal.connect(thread.quit)
+        thread.finished.connect(lambda: self._loaders.remove((worker, thread)))
+        # keep both alive until the thread is done, even after a cancel
+        self._loaders.append((worker, thread))
+        return thread
+
+    def cancel_loading(self):
+        # the partially loaded tree stays browsable, saving it is disabled
+        # until a full load (Revert) succeeds
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+            self.main_view.show_progress(False)
+
+    def items_loaded(self, loader, items):
+        # chunks queued before a cancel are dropped
+        if loader is self.loader:
+            self.main_view.tree_view.append_items(items)
+            self.main_view.tree_view.doItemsLayout()
+        loader.chunk_processed()
+
+    def loading_progress(self, loader, percent):
+        if loader is self.loader:
+            self.main_view.set_progress(percent)
+
+    def loading_finished(self, loader):
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.load_complete = True
+        self.main_view.save_button.setEnabled(True)
+        self.main_view.show_progress(False)
+        self.main_view.tree_view.validate()
+
+    def loading_failed(self, loader, message):
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.main_view.show_progress(False)
+        QtWidgets.QMessageBox.critical(QtWidgets.QMessageBox(), "Json Error", message)
+        self._app.exit(1)
+
     def revert_clicked(self):
         try:
             dialog_result = QtWidgets.QMessageBox.question(QtWidgets.QMessageBox(), "Confirm", "Would you revert?")
             if dialog_result == QtWidgets.QMessageBox.Yes:
-                self.main_view.tree_view.clearContent()
-                self.JsonManager.get_json_data()
-                self.create_tree()
+                if self.load_complete:
+                    self.main_view.tree_view.revert()
+                    self.disable_right_panel()
+                else:
+                    # a cancelled load has no baseline, the file is read again
+                    self.main_view.tree_view.clearContent()
+                    self.create_tree()
                 self.selectedItem = None
         except Exception as e:
             print("revert_clicked failed: {}".format(e))
             print(traceback.format_exc())
 
+    def changes_clicked(self):
+        try:
+            # changes since the load or the last save
+            tree_model = self.main_view.tree_view.tree_model
+            changes = diff_baseline(tree_model.root_item, tree_model.baseline)
+            ChangesDialog(changes, self.main_view).exec_()
+        except Exception as e:
+            print("changes_clicked failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def compare_clicked(self):
+        try:
+            # the tree against a schema file, whole or below a path
+            options = QtWidgets.QFileDialog.Options()
+            options |= QtWidgets.QFileDialog.DontUseNativeDialog
+            file_path, _ = QtWidgets.QFileDialog.getOpenFileName(QtWidgets.QFileDialog(), "Compare with", "",
+                                                                 "Json Files (*.json);;All Files (*)", options=options)
+            if not file_path:
+                return
+            path = self.selectedItem.fullPath() if self.selectedItem is not None else ''
+            path, accepted = QtWidgets.QInputDialog.getText(self.main_view, "Compare",
+                                                            "Below the path (empty for the whole tree):", text=path)
+            if not accepted:
+                return
+            self.start_compare(file_path, path.strip())
+        except Exception as e:
+            print("compare_clicked failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def start_compare(self, file_path, path):
+        # the file is read and both sides are hashed in the background
+        worker = CompareWorker(file_path, self.main_view.tree_view.tree_model, path)
+        thread = self._worker_thread(worker, worker.finished, worker.failed)
+        worker.finished.connect(partial(self.compare_finished, file_path, path))
+        worker.failed.connect(lambda message: QtWidgets.QMessageBox.critical(
+            QtWidgets.QMessageBox(), "Json Error", message))
+        thread.start()
+
+    def compare_finished(self, file_path, path, branches, digests, edits):
+        try:
+            tree_model = self.main_view.tree_view.tree_model
+            if edits != tree_model.edits:
+                # the tree was edited meanwhile, compare it again
+                self.start_compare(file_path, path)
+                return
+            # the digests of the tree are kept, the next compare only hashes
+            # what was edited since
+            install_digests(digests)
+            if self.compare_dialog is not None:
+                self.compare_dialog.close()
+            self.compare_dialog = CompareDialog(file_path, path, branches, self.main_view)
+            self.compare_dialog.path_activated.connect(self.go_to_var_id)
+            self.compare_dialog.show()
+        except Exception as e:
+            print("compare_finished failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def validate_clicked(self):
+        try:
+            # the issues of the last check, kept up to date along the edits
+            tree_view = self.main_view.tree_view
+            if self.issues_dialog is None:
+                self.issues_dialog = IssuesDialog(tree_view.tree_model.validator, self.main_view)
+                self.issues_dialog.issue_activated.connect(self.issue_activated)
+                self.issues_dialog.check_clicked.connect(tree_view.validate)
+            if not tree_view.tree_model.validator.active:
+                tree_view.validate()
+            self.issues_dialog.show()
+            self.issues_dialog.raise_()
+        except Exception as e:
+            print("validate_clicked failed: {}".format(e))
+            print(traceback.format_exc())
+
+    def issue_activated(self, issue):
+        try:
+            if not self.main_view.tree_view.select_issue(issue):
+                QtWidgets.QMessageBox.information(QtWidgets.QMessageBox(), "Validation",
+                                                  "The item is no longer in the tree.")
+        except Exception as e:
+            print("issue_activated failed: {}".format(e))
+            print(traceback.format_exc())
+
     def set_metadata_table_model(self):
         try:
-            self.main_view.metadata_table.setModel(MetadataTableModel())
+            self.main_view.metadata_table.setModel(self.metadata_model)
+            self.metadata_model.dataChanged.connect(self.metadata_changed)
             horizontal_header = self.main_view.metadata_table.horizontalHeader()
             horizontal_header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
             horizontal_header.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
@@ -274,7 +439,8 @@ class MainController:
 
     def set_source_table_model(self):
         try:
-            self.main_view.source_table.setModel(SourceTableModel())
+            self.main_view.source_table.setModel(self.source_model)
+            self.source_model.dataChanged.connect(self.source_changed)
             horizontal_header = self.main_view.source_table.horizontalHeader()
             horizontal_header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
             horizontal_header.setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeToContents)